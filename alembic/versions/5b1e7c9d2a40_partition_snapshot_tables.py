@@ -0,0 +1,129 @@
+"""Partition the snapshot tables by trading day
+
+Revision ID: 5b1e7c9d2a40
+Revises:
+Create Date: 2026-10-17 09:00:00.000000
+
+Converts cm_snapshot, cm_index_snapshot and cm_call_auction_snapshot created
+before partitioning into tables range-partitioned on timestamp (see
+db.partitions). Per table:
+
+1. the unpartitioned table, its primary key, indexes and id sequence are
+   renamed with an `_unpartitioned` suffix;
+2. the partitioned table is created from the model (natural key and BRIN
+   indexes included), with a partition for every trading day present in the
+   old rows plus the default partition;
+3. the rows are copied across in id order, a row repeating a natural key
+   being skipped (the oldest one is kept), and the id sequence continues
+   after the highest copied id.
+
+The unpartitioned table is kept for checking and can be dropped afterwards.
+Stop the app while this runs: snapshots written meanwhile are not copied.
+Tables that are already partitioned, or don't exist yet, are left alone.
+The partitions depend on the data, so this needs a live database (no --sql).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from db.models import CMCallAuctionSnapshot, CMIndexSnapshot, CMSnapshot
+from db.partitions import partition_name, trading_day, trading_day_bounds
+from utils.logger import get_logger
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1e7c9d2a40'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = get_logger(__name__)
+
+MODELS = (CMSnapshot, CMIndexSnapshot, CMCallAuctionSnapshot)
+SUFFIX = "_unpartitioned"
+
+# Old rows are probed per half hour to find their trading days: IST midnight falls on a half hour
+DAY_PROBE_SECONDS = 1800
+
+
+def _relkind(bind, name: str):
+    return bind.execute(
+        sa.text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {"name": name}
+    ).scalar()
+
+
+def _rename_table(bind, table: sa.Table, source: str, target: str) -> None:
+    """Rename `source` to `target` with its primary key, the model's indexes and its id sequence"""
+    sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": source}).scalar()
+    primary_key = bind.execute(
+        sa.text("SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:table) AND contype = 'p'"),
+        {"table": source},
+    ).scalar()
+
+    op.execute(f'ALTER TABLE "{source}" RENAME TO "{target}"')
+    if primary_key:
+        op.execute(f'ALTER TABLE "{target}" RENAME CONSTRAINT "{primary_key}" TO "{target}_pkey"')
+    if sequence:
+        op.execute(f'ALTER SEQUENCE {sequence} RENAME TO "{target}_id_seq"')
+    aside = target.endswith(SUFFIX)
+    for index in table.indexes:
+        current, renamed = (index.name, index.name + SUFFIX) if aside else (index.name + SUFFIX, index.name)
+        op.execute(f'ALTER INDEX IF EXISTS "{current}" RENAME TO "{renamed}"')
+
+
+def _partition(bind, table: sa.Table) -> None:
+    name, old = table.name, table.name + SUFFIX
+    _rename_table(bind, table, name, old)
+
+    table.create(bind)
+    days = sorted({
+        trading_day(probe)
+        for probe in bind.execute(sa.text(
+            f'SELECT DISTINCT timestamp / {DAY_PROBE_SECONDS} * {DAY_PROBE_SECONDS} FROM "{old}"'
+        )).scalars()
+    })
+    op.execute(f'CREATE TABLE "{name}_default" PARTITION OF "{name}" DEFAULT')
+    for day in days:
+        start, end = trading_day_bounds(day)
+        op.execute(f'CREATE TABLE "{partition_name(name, day)}" PARTITION OF "{name}" FOR VALUES FROM ({start}) TO ({end})')
+
+    columns = ", ".join(f'"{column.name}"' for column in table.columns)
+    copied = bind.execute(sa.text(
+        f'INSERT INTO "{name}" ({columns}) SELECT {columns} FROM "{old}" ORDER BY id ON CONFLICT DO NOTHING'
+    )).rowcount
+    total = bind.execute(sa.text(f'SELECT count(*) FROM "{old}"')).scalar()
+    bind.execute(sa.text(
+        f"SELECT setval(pg_get_serial_sequence(:table, 'id'), COALESCE((SELECT max(id) FROM \"{name}\"), 0) + 1, false)"
+    ), {"table": name})
+    logger.info(
+        f"🗂️ Partitioned {name}: copied {copied} of {total} rows into {len(days)} day partitions "
+        f"({total - copied} repeating a natural key skipped); {old} can be dropped once checked"
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    for model in MODELS:
+        table = model.__table__
+        kind = _relkind(bind, table.name)
+        if kind is None:
+            logger.info(f"{table.name} does not exist yet; it is created partitioned at startup")
+        elif kind == 'p':
+            logger.info(f"{table.name} is already partitioned")
+        else:
+            _partition(bind, table)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    for model in MODELS:
+        table = model.__table__
+        old = table.name + SUFFIX
+        if _relkind(bind, old) is None:
+            logger.warning(f"⚠️ {old} was dropped; leaving {table.name} partitioned")
+            continue
+        # Rows ingested since the upgrade only exist in the partitioned table
+        op.execute(f'DROP TABLE "{table.name}" CASCADE')
+        _rename_table(bind, table, old, table.name)
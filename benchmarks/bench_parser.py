@@ -0,0 +1,45 @@
+# Parser throughput benchmarks. Run explicitly (not collected by the default test run):
+#   python -m pytest benchmarks/bench_parser.py [--bench-tokens 3000] [--update-baseline]
+
+import gzip
+
+import numpy as np
+
+from benchmarks.synthetic import build_snapshot
+from utils.parser import parse_ca2, parse_ind, parse_mkt, parse_snapshot, parse_snapshot_bytes, parse_snapshot_iter
+
+
+def test_parse_mkt(benchmark, snapshot_files):
+    records = benchmark(parse_mkt, snapshot_files["mkt"])
+    assert len(records) > 0
+
+
+def test_parse_ind(benchmark, snapshot_files):
+    records = benchmark(parse_ind, snapshot_files["ind"])
+    assert len(records) > 0
+
+
+def test_parse_ca2(benchmark, snapshot_files):
+    records = benchmark(parse_ca2, snapshot_files["ca2"])
+    assert len(records) > 0
+
+
+def test_parse_snapshot(benchmark, snapshot_files):
+    records = benchmark(parse_snapshot, snapshot_files["mkt"])
+    assert len(records) > 0
+
+
+def test_parse_snapshot_iter(benchmark, snapshot_files):
+    def parse_all(path):
+        return np.concatenate(list(parse_snapshot_iter(path)))
+
+    records = benchmark(parse_all, snapshot_files["mkt"])
+    assert len(records) > 0
+
+
+def test_parse_mixed_layouts_corrupt_tail(benchmark, pytestconfig):
+    tokens = pytestconfig.getoption("--bench-tokens")
+    data = gzip.compress(build_snapshot("mkt", tokens, record_sizes=[96, 88, 100], corrupt_tail=37))
+
+    records = benchmark(parse_snapshot_bytes, data, "mixed.mkt.gz")
+    assert len(records) == tokens
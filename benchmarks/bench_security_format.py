@@ -0,0 +1,66 @@
+# Securities.dat decode benchmarks: fixed-offset v1.24 layout vs. the legacy per-record heuristic.
+#   python -m pytest benchmarks/bench_security_format.py [--bench-tokens 3000] [--update-baseline]
+
+import pytest
+
+from benchmarks.synthetic import build_securities, securities_company_name
+from utils.security_format import HEADER_SIZE, SecuritiesConverter, describe, scan_records
+
+# Roughly the size of a daily NSE CM Securities.dat
+SECURITIES_COUNT = 20000
+
+
+def legacy_decode(buffer):
+    """Decode every record with parse_v124_format (longest printable window search for the company name)"""
+    converter = SecuritiesConverter()
+    offsets, _ = scan_records(buffer)
+    securities = []
+    for message_length, positions in offsets.items():
+        for pos in positions:
+            security = converter.parse_security_dynamic(buffer[pos + HEADER_SIZE:pos + message_length])
+            if security:
+                securities.append((pos, describe(security)))
+    securities.sort(key=lambda item: item[0])
+    return [security for _, security in securities]
+
+
+@pytest.fixture(scope="module")
+def securities_data():
+    return build_securities(SECURITIES_COUNT, junk_every=997)
+
+
+def test_securities_legacy_heuristic(benchmark, securities_data):
+    securities = benchmark(legacy_decode, securities_data)
+    assert len(securities) == SECURITIES_COUNT
+
+
+def test_securities_fixed_offset(benchmark, securities_data):
+    securities = benchmark(SecuritiesConverter().decode_securities, securities_data)
+    assert len(securities) == SECURITIES_COUNT
+
+
+@pytest.fixture(scope="module")
+def printable_gap_data():
+    # Printable bytes right before the company name: the legacy search starts its window there
+    return build_securities(SECURITIES_COUNT, junk_every=997, printable_gap=True)
+
+
+def company_names(securities):
+    return [security["company_name"].rstrip() for security in securities]
+
+
+def expected_names(securities):
+    return [securities_company_name(security["token_number"]) for security in securities]
+
+
+def test_securities_fixed_offset_matches_legacy(securities_data):
+    securities = SecuritiesConverter().decode_securities(securities_data)
+    assert company_names(securities) == expected_names(securities)
+    assert securities == legacy_decode(securities_data)
+
+
+def test_securities_fixed_offset_printable_gap(printable_gap_data):
+    securities = SecuritiesConverter().decode_securities(printable_gap_data)
+    assert len(securities) == SECURITIES_COUNT
+    assert company_names(securities) == expected_names(securities)
+    assert company_names(legacy_decode(printable_gap_data)) != expected_names(securities)
@@ -0,0 +1,111 @@
+import json
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+import pytest
+
+from benchmarks.synthetic import write_snapshot_set
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+# Results collected during the session: case name -> metrics
+_results: Dict[str, Dict[str, Any]] = {}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("parser benchmarks")
+    group.addoption("--bench-tokens", type=int, default=3000, help="Tokens per synthetic snapshot file")
+    group.addoption("--bench-rounds", type=int, default=20, help="Timed rounds per case (best is kept)")
+    group.addoption("--update-baseline", action="store_true", help="Write results to baseline.json")
+    group.addoption(
+        "--regression-tolerance", type=float, default=0.5,
+        help="Allowed fractional drop in records/sec (or growth in peak memory) vs. baseline",
+    )
+
+
+@pytest.fixture(scope="session")
+def snapshot_files(tmp_path_factory, pytestconfig) -> Dict[str, str]:
+    """One synthetic .mkt.gz/.ind.gz/.ca2.gz set shared by all cases"""
+    return write_snapshot_set(str(tmp_path_factory.mktemp("snapshots")), pytestconfig.getoption("--bench-tokens"))
+
+
+class Benchmark:
+    """
+    Minimal pytest-benchmark style runner: `benchmark(func, *args)` times the
+    best of N rounds, measures peak memory of one extra run and records
+    records/sec for the current case.
+    """
+
+    def __init__(self, name: str, rounds: int):
+        self.name = name
+        self.rounds = rounds
+
+    def __call__(self, func: Callable, *args, **kwargs):
+        result = func(*args, **kwargs)  # warm-up (imports, page cache)
+
+        best = float("inf")
+        for _ in range(self.rounds):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            best = min(best, time.perf_counter() - start)
+
+        tracemalloc.start()
+        func(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        records = len(result)
+        _results[self.name] = {
+            "records": records,
+            "best_seconds": round(best, 6),
+            "records_per_sec": round(records / best) if best else 0,
+            "peak_kib": round(peak / 1024, 1),
+        }
+        return result
+
+
+@pytest.fixture
+def benchmark(request, pytestconfig) -> Benchmark:
+    return Benchmark(request.node.name, pytestconfig.getoption("--bench-rounds"))
+
+
+def _regressions(baseline: Dict[str, Any], tolerance: float) -> Dict[str, str]:
+    problems = {}
+    for name, result in _results.items():
+        expected = baseline.get(name)
+        if not expected:
+            continue
+        if result["records_per_sec"] < expected["records_per_sec"] * (1 - tolerance):
+            problems[name] = f"{result['records_per_sec']:,} records/sec < baseline {expected['records_per_sec']:,}"
+        elif result["peak_kib"] > expected["peak_kib"] * (1 + tolerance):
+            problems[name] = f"peak {result['peak_kib']} KiB > baseline {expected['peak_kib']} KiB"
+    return problems
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if not _results:
+        return
+    config = session.config
+    if config.getoption("--update-baseline"):
+        BASELINE_PATH.write_text(json.dumps(_results, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        return
+
+    baseline = json.loads(BASELINE_PATH.read_text(encoding="utf-8")) if BASELINE_PATH.exists() else {}
+    config._parser_bench_regressions = _regressions(baseline, config.getoption("--regression-tolerance"))
+    if config._parser_bench_regressions:
+        session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    if not _results:
+        return
+    terminalreporter.section("parser benchmarks")
+    for name, result in sorted(_results.items()):
+        terminalreporter.write_line(
+            f"{name:<40} {result['records']:>7} records {result['records_per_sec']:>12,} rec/s "
+            f"{result['best_seconds'] * 1000:>8.2f} ms {result['peak_kib']:>9.1f} KiB peak"
+        )
+    for name, problem in getattr(config, "_parser_bench_regressions", {}).items():
+        terminalreporter.write_line(f"❌ REGRESSION {name}: {problem}", red=True)
@@ -0,0 +1,74 @@
+# Bulk load benchmark against a live database (uses the DB_* settings from .env):
+#   python -m benchmarks.db_bulk_load [--rows 50000] [--rounds 3]
+#
+# Compares the previous path (insert().values([...]) ON CONFLICT DO NOTHING, in
+# parameter-limited batches) with db.bulk_load.copy_upsert, on a scratch copy of
+# cm_stock_historical that is dropped afterwards.
+
+import argparse
+import asyncio
+import time
+from decimal import Decimal
+
+from sqlalchemy import MetaData, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from db.bulk_load import copy_upsert
+from db.connection import AsyncSessionLocal, engine
+from db.models import CMStockHistorical
+
+COLUMNS = ["symbol", "timestamp", "open_price", "high_price", "low_price", "close_price", "volume", "series"]
+VALUES_BATCH_SIZE = 4000  # 8 columns x 4000 rows stays under the 32767 bind parameter limit
+
+
+def make_rows(count: int):
+    return [
+        (f"SYM{i % 2000}", 1_600_000_000 + (i // 2000) * 86400,
+         Decimal("100.25"), Decimal("101.50"), Decimal("99.75"), Decimal("100.80"), 10_000 + i, "EQ")
+        for i in range(count)
+    ]
+
+
+async def load_values(table, rows) -> None:
+    async with AsyncSessionLocal() as session:
+        for start in range(0, len(rows), VALUES_BATCH_SIZE):
+            batch = [dict(zip(COLUMNS, row)) for row in rows[start:start + VALUES_BATCH_SIZE]]
+            stmt = pg_insert(table).values(batch).on_conflict_do_nothing(index_elements=["symbol", "timestamp"])
+            await session.execute(stmt)
+        await session.commit()
+
+
+async def load_copy(table, rows) -> None:
+    async with AsyncSessionLocal() as session:
+        await copy_upsert(session, table, rows, columns=COLUMNS, conflict_columns=["symbol", "timestamp"])
+        await session.commit()
+
+
+async def main(row_count: int, rounds: int) -> None:
+    table = CMStockHistorical.__table__.to_metadata(MetaData(), name="bulk_load_bench")
+    rows = make_rows(row_count)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda sync_conn: table.create(sync_conn, checkfirst=True))
+    try:
+        for name, load in (("insert().values", load_values), ("copy_upsert", load_copy)):
+            best = float("inf")
+            for _ in range(rounds):
+                async with engine.begin() as conn:
+                    await conn.execute(text(f"TRUNCATE {table.name}"))
+                start = time.perf_counter()
+                await load(table, rows)
+                best = min(best, time.perf_counter() - start)
+            print(f"{name:<16} {row_count:>8} rows  {best * 1000:>9.1f} ms  {row_count / best:>12,.0f} rows/s")
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(lambda sync_conn: table.drop(sync_conn, checkfirst=True))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark insert().values vs COPY staging bulk load")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.rounds))
@@ -0,0 +1,202 @@
+# Snapshot index plan benchmark against a live database (uses the DB_* settings from .env):
+#   python -m benchmarks.db_snapshot_indexes [--days 5] [--tokens 500] [--interval 60] [--output plans.json]
+#
+# Loads `days` trading sessions of synthetic snapshots (09:15-15:30 IST, one
+# snapshot of every token each `interval` seconds) into day-partitioned
+# copies of the three snapshot tables in a scratch schema, then records
+# EXPLAIN ANALYZE for each router query shape under the previous indexes
+# ("before") and the indexes declared in db.models ("after"). The scratch
+# schema is dropped afterwards.
+
+import argparse
+import asyncio
+import json
+import re
+from datetime import date, timedelta
+
+import asyncpg
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from benchmarks.synthetic import make_records
+from db.connection import DATABASE_URL
+from db.models import CMCallAuctionSnapshot, CMIndexSnapshot, CMSnapshot
+from db.partitions import partition_name, trading_day_bounds
+from utils.parser import to_rows
+
+SCHEMA = "snapshot_index_bench"
+MODELS = {"mkt": CMSnapshot, "ind": CMIndexSnapshot, "ca2": CMCallAuctionSnapshot}
+SESSION_OPEN = 9 * 3600 + 15 * 60  # 09:15 IST, seconds after the trading day's start
+SESSION_SECONDS = 375 * 60  # until 15:30 IST
+LATEST_TOKENS = 50  # tokens in the index stocks query
+
+# Indexes before the composite/BRIN plan
+BEFORE_INDEXES = {
+    "cm_snapshot": [
+        "CREATE INDEX idx_cm_snapshot_transcode_timestamp ON cm_snapshot (transcode, timestamp)",
+        "CREATE INDEX idx_cm_snapshot_security_token ON cm_snapshot (security_token)",
+    ],
+    "cm_index_snapshot": [
+        "CREATE INDEX idx_cm_index_snapshot_timestamp ON cm_index_snapshot (timestamp)",
+        "CREATE INDEX idx_cm_index_snapshot_index_token ON cm_index_snapshot (index_token)",
+    ],
+    "cm_call_auction_snapshot": [
+        "CREATE INDEX idx_cm_call_auction_timestamp ON cm_call_auction_snapshot (timestamp)",
+        "CREATE INDEX idx_cm_call_auction_security_token ON cm_call_auction_snapshot (security_token)",
+    ],
+}
+
+# (name, SQL) per router query shape; parameters are named so each query takes what it needs
+QUERIES = [
+    ("rest latest",
+     "SELECT * FROM cm_snapshot WHERE security_token = :token ORDER BY timestamp DESC LIMIT 1"),
+    ("rest history (1 session)",
+     "SELECT * FROM cm_snapshot WHERE security_token = :token AND timestamp >= :start AND timestamp <= :end "
+     "ORDER BY timestamp"),
+    ("price series (1 session)",
+     "SELECT timestamp, last_traded_price FROM cm_snapshot "
+     "WHERE security_token = :token AND timestamp >= :start AND timestamp <= :end ORDER BY timestamp DESC"),
+    ("index stocks latest",
+     "SELECT DISTINCT ON (security_token) * FROM cm_snapshot WHERE security_token = ANY(:tokens) "
+     "ORDER BY security_token, timestamp DESC"),
+    ("call auction latest",
+     "SELECT * FROM cm_call_auction_snapshot WHERE security_token = :token ORDER BY timestamp DESC LIMIT 1"),
+    ("index latest",
+     "SELECT * FROM cm_index_snapshot WHERE index_token = :index_token ORDER BY timestamp DESC LIMIT 1"),
+    ("time range count (1 hour)",
+     "SELECT count(*) FROM cm_snapshot WHERE timestamp >= :start AND timestamp < :start + 3600"),
+]
+
+
+def to_positional(sql: str, params: dict):
+    """Rewrite :name parameters to asyncpg's $n, returning (sql, args)"""
+    names = []
+
+    def number(match):
+        if match.group(1) not in names:
+            names.append(match.group(1))
+        return f"${names.index(match.group(1)) + 1}"
+
+    return re.sub(r"(?<!:):(\w+)", number, sql), [params[name] for name in names]
+
+
+def after_indexes(model) -> list:
+    dialect = postgresql.dialect()
+    return [str(CreateIndex(index).compile(dialect=dialect)) for index in model.__table__.indexes]
+
+
+async def create_tables(conn, days) -> None:
+    dialect = postgresql.dialect()
+    for model in MODELS.values():
+        table = model.__table__
+        await conn.execute(str(CreateTable(table).compile(dialect=dialect)))
+        for day in days:
+            start, end = trading_day_bounds(day)
+            await conn.execute(
+                f'CREATE TABLE "{partition_name(table.name, day)}" PARTITION OF "{table.name}" '
+                f"FOR VALUES FROM ({start}) TO ({end})"
+            )
+
+
+async def load(conn, days, tokens: int, interval: int) -> dict:
+    counts = {}
+    for file_type, model in MODELS.items():
+        # Same securities in every snapshot; prices vary with the seed
+        token_set = make_records(file_type, tokens)["index_token" if file_type == "ind" else "security_token"]
+        total = 0
+        for day in days:
+            day_start, _ = trading_day_bounds(day)
+            for offset in range(0, SESSION_SECONDS, interval):
+                records = make_records(file_type, tokens, timestamp=day_start + SESSION_OPEN + offset, seed=offset + 1)
+                if file_type != "ind":
+                    records["security_token"] = token_set
+                columns, rows = to_rows(records)
+                await conn.copy_records_to_table(model.__tablename__, records=rows, columns=columns)
+                total += len(rows)
+        counts[model.__tablename__] = total
+    return counts
+
+
+async def explain(conn, sql: str, params: dict) -> dict:
+    sql, args = to_positional(sql, params)
+    plan = json.loads(await conn.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", *args))[0]
+    node = plan["Plan"]
+    return {
+        "execution_ms": plan["Execution Time"],
+        "planning_ms": plan["Planning Time"],
+        "node": node["Node Type"],
+        "shared_hit": node.get("Shared Hit Blocks", 0),
+        "shared_read": node.get("Shared Read Blocks", 0),
+    }
+
+
+async def run_queries(conn, params: dict, repeats: int) -> dict:
+    results = {}
+    for name, sql in QUERIES:
+        runs = [await explain(conn, sql, params) for _ in range(repeats)]
+        results[name] = min(runs, key=lambda run: run["execution_ms"])
+    return results
+
+
+async def main(day_count: int, tokens: int, interval: int, repeats: int, output: str) -> None:
+    days = [date(2025, 7, 7) + timedelta(days=i) for i in range(day_count)]
+    conn = await asyncpg.connect(DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://"))
+    try:
+        await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await conn.execute(f"CREATE SCHEMA {SCHEMA}")
+        await conn.execute(f"SET search_path TO {SCHEMA}")
+
+        await create_tables(conn, days)
+        counts = await load(conn, days, tokens, interval)
+        print(f"Loaded {counts} over {day_count} days")
+
+        securities = make_records("mkt", tokens)["security_token"]
+        session_start = trading_day_bounds(days[-1])[0] + SESSION_OPEN
+        params = {
+            "token": int(securities[tokens // 2]),
+            "index_token": int(make_records("ind", tokens)["index_token"][0]),
+            "tokens": [int(token) for token in securities[:LATEST_TOKENS]],
+            "start": session_start,
+            "end": session_start + SESSION_SECONDS,
+        }
+
+        plans = {
+            "before": [sql for statements in BEFORE_INDEXES.values() for sql in statements],
+            "after": [sql for model in MODELS.values() for sql in after_indexes(model)],
+        }
+        report = {"rows": counts, "days": day_count, "tokens": tokens, "plans": {}}
+        for plan, statements in plans.items():
+            for sql in statements:
+                await conn.execute(sql)
+            await conn.execute("ANALYZE " + ", ".join(model.__tablename__ for model in MODELS.values()))
+            report["plans"][plan] = await run_queries(conn, params, repeats)
+
+            for model in MODELS.values():
+                for index in await conn.fetch(
+                    "SELECT indexname FROM pg_indexes WHERE schemaname = $1 AND tablename = $2 AND indexname NOT LIKE '%pkey'",
+                    SCHEMA, model.__tablename__,
+                ):
+                    await conn.execute(f'DROP INDEX IF EXISTS "{index["indexname"]}"')
+
+        print(f"{'query':<28} {'before ms':>10} {'after ms':>10}  before plan -> after plan")
+        for name, _ in QUERIES:
+            before, after = report["plans"]["before"][name], report["plans"]["after"][name]
+            print(f"{name:<28} {before['execution_ms']:>10.2f} {after['execution_ms']:>10.2f}  {before['node']} -> {after['node']}")
+
+        if output:
+            with open(output, "w") as f:
+                json.dump(report, f, indent=2)
+    finally:
+        await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EXPLAIN ANALYZE router queries under the old and new snapshot indexes")
+    parser.add_argument("--days", type=int, default=5)
+    parser.add_argument("--tokens", type=int, default=500)
+    parser.add_argument("--interval", type=int, default=60, help="seconds between snapshots")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", default="", help="write the full report as JSON")
+    args = parser.parse_args()
+    asyncio.run(main(args.days, args.tokens, args.interval, args.repeats, args.output))
@@ -0,0 +1,88 @@
+# Snapshot ingest benchmark against a live database (uses the DB_* settings from .env):
+#   python -m benchmarks.db_snapshot_ingest [--tokens 3000] [--indices 150] [--rounds 3]
+#
+# Times the two save_to_db paths of services.data_ingest on a full-market
+# snapshot of each type (synthetic file decoded by the real parser):
+# _insert_to_db (ORM executemany INSERT ... ON CONFLICT DO NOTHING) and
+# _copy_to_db (asyncpg binary COPY into a staging table, merged on the
+# natural key), both including the latest-snapshot upsert. Each is timed on
+# empty tables ("new") and on the same file again ("repeat", every row a
+# conflict). The functions run unchanged against scratch copies of the
+# snapshot and latest tables in their own schema (each snapshot table with
+# only a default partition): new connections get that schema as their
+# search_path. The scratch schema is dropped afterwards.
+
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import MetaData, event, text
+
+from benchmarks.synthetic import build_snapshot
+from db.connection import engine
+from services.data_ingest import FILE_MODELS, LATEST_TABLES, _copy_to_db, _insert_to_db
+from utils.parser import decode_snapshot
+
+SCHEMA = "snapshot_ingest_bench"
+
+
+def use_scratch_schema(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"SET search_path TO {SCHEMA}")
+    cursor.close()
+
+
+async def copy_path(records, model) -> None:
+    await _copy_to_db(records, model)
+
+
+async def insert_path(records, model) -> None:
+    await _insert_to_db(records, model, model.__tablename__)
+
+
+async def main(tokens: int, indices: int, rounds: int) -> None:
+    metadata = MetaData()
+    for model in FILE_MODELS.values():
+        model.__table__.to_metadata(metadata, schema=SCHEMA)
+        LATEST_TABLES[model][0].__table__.to_metadata(metadata, schema=SCHEMA)
+
+    # Unqualified table names in data_ingest resolve to the scratch schema from here on
+    await engine.dispose()
+    event.listen(engine.sync_engine, "connect", use_scratch_schema)
+
+    async with engine.begin() as conn:
+        await conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}"))
+        await conn.run_sync(lambda sync_conn: metadata.create_all(sync_conn, checkfirst=True))
+        for model in FILE_MODELS.values():
+            table = model.__tablename__
+            await conn.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+    try:
+        print(f"{'type':<4} {'path':<14} {'load':<7} {'rows':>8} {'ms':>10} {'rows/s':>12}")
+        for file_type, model in FILE_MODELS.items():
+            records, _ = decode_snapshot(build_snapshot(file_type, indices if file_type == "ind" else tokens), file_type)
+            tables = f"{model.__tablename__}, {LATEST_TABLES[model][0].__tablename__}"
+            for name, load in (("_insert_to_db", insert_path), ("_copy_to_db", copy_path)):
+                best = {"new": float("inf"), "repeat": float("inf")}
+                for _ in range(rounds):
+                    async with engine.begin() as conn:
+                        await conn.execute(text(f"TRUNCATE {tables}"))
+                    for kind in best:
+                        start = time.perf_counter()
+                        await load(records, model)
+                        best[kind] = min(best[kind], time.perf_counter() - start)
+                for kind, seconds in best.items():
+                    print(f"{file_type:<4} {name:<14} {kind:<7} {len(records):>8} {seconds * 1000:>10.1f} {len(records) / seconds:>12,.0f}")
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        event.remove(engine.sync_engine, "connect", use_scratch_schema)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the ORM INSERT and asyncpg COPY snapshot ingest paths")
+    parser.add_argument("--tokens", type=int, default=3000, help="securities per mkt/ca2 file")
+    parser.add_argument("--indices", type=int, default=150, help="indices per ind file")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.tokens, args.indices, args.rounds))
@@ -0,0 +1,171 @@
+import argparse
+import gzip
+import os
+from datetime import datetime, timezone
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from utils.parser import SNAPSHOT_DTYPES, resolve_layout, to_feed_seconds
+
+# Transcodes written into synthetic headers (layouts match any transcode)
+TRANSCODES = {"mkt": 5, "ind": 6, "ca2": 7}
+
+# Standard on-disk record size per file type
+DEFAULT_RECORD_SIZES = {"mkt": 96, "ind": 52, "ca2": 86}
+
+SUFFIXES = {"mkt": ".mkt.gz", "ind": ".ind.gz", "ca2": ".ca2.gz"}
+
+# Header timestamp of synthetic records (feed epoch): 2025-07-11 09:30 IST
+SYNTHETIC_TIMESTAMP = to_feed_seconds(datetime(2025, 7, 11, 4, 0, tzinfo=timezone.utc))
+
+
+def make_records(file_type: str, tokens: int, timestamp: int = SYNTHETIC_TIMESTAMP, seed: int = 0) -> np.ndarray:
+    """
+    Build `tokens` realistic decoded records for `file_type`: prices in paise
+    around a per-token base price, quantities in lots, index values x100.
+    """
+    rng = np.random.default_rng(seed)
+    records = np.zeros(tokens, dtype=SNAPSHOT_DTYPES[file_type])
+    records["transcode"] = TRANSCODES[file_type]
+    records["timestamp"] = timestamp
+
+    base = rng.integers(1_000, 500_000, tokens)  # 10.00 .. 5000.00 INR
+    drift = lambda: (base * rng.uniform(0.97, 1.03, tokens)).astype(np.uint32)  # noqa: E731
+
+    if file_type == "ind":
+        records["index_token"] = np.arange(26000, 26000 + tokens)
+        for name in records.dtype.names[4:]:
+            records[name] = drift() * 10
+        records["percentage_change"] = rng.integers(0, 500, tokens)
+        return records
+
+    records["security_token"] = np.sort(rng.choice(np.arange(1, 60000), tokens, replace=False))
+    for name in records.dtype.names:
+        if name.endswith("_price"):
+            records[name] = drift()
+        elif name.endswith("_quantity"):
+            records[name] = rng.integers(0, 5_000_000, tokens)
+    if file_type == "ca2":
+        flags = np.array([b"Y", b"N", b" "], dtype="S1")
+        records["buy_bbmm_flag"] = rng.choice(flags, tokens)
+        records["sell_bbmm_flag"] = rng.choice(flags, tokens)
+    return records
+
+
+def encode_records(file_type: str, records: np.ndarray, record_size: Optional[int] = None) -> bytes:
+    """
+    Serialize decoded records in the registered on-disk layout of
+    `record_size` bytes, with message_length set to match.
+    """
+    record_size = record_size or DEFAULT_RECORD_SIZES[file_type]
+    layout = resolve_layout(file_type, TRANSCODES[file_type], record_size)
+    if layout is None or layout.record_size != record_size:
+        raise ValueError(f"No registered {file_type} layout of {record_size} bytes")
+
+    raw = np.zeros(len(records), dtype=layout.view_dtype)
+    for name in layout.view_dtype.names:
+        raw[name] = records[name]
+    raw["message_length"] = record_size
+    return raw.tobytes()
+
+
+def build_snapshot(
+    file_type: str,
+    tokens: int,
+    record_sizes: Optional[Sequence[int]] = None,
+    corrupt_tail: int = 0,
+    seed: int = 0,
+) -> bytes:
+    """
+    Build an uncompressed snapshot of `tokens` records. `record_sizes` splits
+    the records into consecutive runs, one per layout; `corrupt_tail` appends
+    that many random bytes after the last record.
+    """
+    records = make_records(file_type, tokens, seed=seed)
+    record_sizes = list(record_sizes or [DEFAULT_RECORD_SIZES[file_type]])
+
+    runs = np.array_split(records, len(record_sizes))
+    data = b"".join(encode_records(file_type, run, size) for run, size in zip(runs, record_sizes))
+    if corrupt_tail:
+        data += np.random.default_rng(seed + 1).bytes(corrupt_tail)
+    return data
+
+
+def securities_company_name(token: int) -> str:
+    """Company name of `token` in synthetic Securities.dat records"""
+    return f"COMPANY {token} LIMITED"
+
+
+def build_securities(count: int, seed: int = 0, junk_every: int = 0, printable_gap: bool = False) -> bytes:
+    """
+    Build an uncompressed Securities.dat of `count` v1.24 security records
+    (transcode 7, 121 bytes each). `junk_every` inserts a few random bytes
+    after every N-th record to exercise resync. `printable_gap` fills the
+    bytes between the settlement cycle and the company name with printable
+    text instead of zeros.
+    """
+    from utils.security_format import (
+        COMPANY_NAME_OFFSET, HEADER_SIZE, SECURITY_TRANSCODE, V124_DATA_LENGTH, v124_dtype,
+    )
+
+    rng = np.random.default_rng(seed)
+    data_dtype = v124_dtype(V124_DATA_LENGTH)
+    record_dtype = np.dtype([("transcode", "<u2"), ("timestamp", "<u4"), ("message_length", "<u2"), ("data", data_dtype)])
+
+    records = np.zeros(count, dtype=record_dtype)
+    records["transcode"] = SECURITY_TRANSCODE
+    records["timestamp"] = SYNTHETIC_TIMESTAMP
+    records["message_length"] = HEADER_SIZE + V124_DATA_LENGTH
+    data = records["data"]
+    data["token_number"] = np.arange(1, count + 1)
+    data["symbol"] = [f"SYM{i}".encode() for i in range(count)]
+    data["series"] = rng.choice(np.array([b"EQ", b"BE", b"SM"]), count)
+    data["issued_capital"] = rng.integers(1_000_000, 10_000_000_000, count).astype(np.float64)
+    data["settlement_cycle"] = 1
+    data["company_name"] = [securities_company_name(i + 1).ljust(25).encode() for i in range(count)]
+    data["permitted_to_trade"] = rng.choice([0, 1, 2], count, p=[0.05, 0.9, 0.05])
+    if printable_gap:
+        raw = records.view(np.uint8).reshape(count, -1)
+        # Separate generator so the junk bytes stay the same as without the gap
+        gap = np.random.default_rng(seed + 1).integers(ord("A"), ord("Z") + 1, (count, COMPANY_NAME_OFFSET - 26))
+        raw[:, HEADER_SIZE + 26:HEADER_SIZE + COMPANY_NAME_OFFSET] = gap
+
+    if not junk_every:
+        return records.tobytes()
+    chunks = []
+    for start in range(0, count, junk_every):
+        chunks.append(records[start:start + junk_every].tobytes())
+        chunks.append(rng.bytes(int(rng.integers(1, 40))))
+    return b"".join(chunks)
+
+
+def write_snapshot(path: str, file_type: str, tokens: int, **kwargs) -> str:
+    """Write one gzip-compressed synthetic snapshot file and return its path"""
+    with gzip.open(path, "wb") as f:
+        f.write(build_snapshot(file_type, tokens, **kwargs))
+    return path
+
+
+def write_snapshot_set(directory: str, tokens: int, prefix: str = "CM30_0915", **kwargs) -> Dict[str, str]:
+    """Write one .mkt.gz, .ind.gz and .ca2.gz file into `directory`"""
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for file_type, suffix in SUFFIXES.items():
+        count = min(tokens, 150) if file_type == "ind" else tokens
+        paths[file_type] = write_snapshot(os.path.join(directory, f"{prefix}{suffix}"), file_type, count, **kwargs)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic NSE snapshot files")
+    parser.add_argument("directory")
+    parser.add_argument("--tokens", type=int, default=3000)
+    parser.add_argument("--corrupt-tail", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for file_type, path in write_snapshot_set(
+        args.directory, args.tokens, corrupt_tail=args.corrupt_tail, seed=args.seed
+    ).items():
+        print(f"✅ {file_type}: {path} ({os.path.getsize(path):,} bytes)")
@@ -14,9 +14,57 @@ class Settings(BaseSettings):
     SFTP_REMOTE_PATH: str = "/CM30"
     KEY_PATH: str = os.path.join(os.path.dirname(__file__), 'ssh', 'pride_sftp_key')
 
+    # Race a download against the next mirror when it takes longer than this
+    SFTP_HEDGE_DELAY_SECONDS: float = 3.0
+
+    # Read size when streaming SFTP files
+    SFTP_CHUNK_SIZE: int = 256 * 1024
+
     # Polling interval for SFTP watcher (in seconds)
     POLL_INTERVAL_SECONDS: int = 60
 
+    # SFTP watcher pipeline: workers per stage (download -> parse -> persist -> broadcast)
+    WATCHER_DOWNLOAD_CONCURRENCY: int = 2
+    WATCHER_PARSE_CONCURRENCY: int = 2
+    WATCHER_PERSIST_CONCURRENCY: int = 1
+    WATCHER_BROADCAST_CONCURRENCY: int = 1
+    # Files waiting between two stages before the earlier stage blocks
+    WATCHER_QUEUE_SIZE: int = 4
+    # A file failing in the pipeline is retried after a backoff that doubles per attempt (in seconds)
+    WATCHER_RETRY_BACKOFF_SECONDS: int = 60
+    # ...and marked processed with an error after this many failed attempts
+    WATCHER_MAX_ATTEMPTS: int = 5
+    # Snapshot batches waiting for the WebSocket broadcaster before the oldest is dropped
+    BROADCAST_QUEUE_SIZE: int = 32
+
+    # Records per batch when streaming a snapshot file into the DB / WebSocket clients
+    SNAPSHOT_BATCH_SIZE: int = 1000
+
+    # Load snapshot records with asyncpg binary COPY (falls back to ORM INSERT on failure)
+    SNAPSHOT_COPY_ENABLED: bool = True
+
+    # Daily snapshot table partitions created this many days ahead of the session
+    SNAPSHOT_PARTITION_DAYS_AHEAD: int = 3
+    # Drop snapshot partitions older than this many days (0 = keep all history)
+    SNAPSHOT_RETENTION_DAYS: int = 0
+
+    # Worker processes used to parse snapshot files off the event loop (0 = parse in a thread)
+    PARSE_WORKERS: int = 2
+
+    # Content-addressed cache of parsed snapshot files (duplicates cost one hash)
+    SNAPSHOT_CACHE_DIR: str = os.path.join(os.path.dirname(__file__), 'cache', 'snapshots')
+    SNAPSHOT_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+
+    # Per-trading-day columnar archive of parsed snapshots (<dir>/<YYYY-MM-DD>/<type>.npy)
+    SNAPSHOT_ARCHIVE_ENABLED: bool = True
+    SNAPSHOT_ARCHIVE_DIR: str = os.path.join(os.path.dirname(__file__), 'archive')
+
+    # Skip token master deletions when more than this fraction of tokens is missing from a new Securities.dat
+    TOKEN_MASTER_MAX_DELIST_RATIO: float = 0.05
+
+    # Optional CSV export of each decoded Securities.dat (empty = disabled)
+    TOKEN_MASTER_CSV_DIR: str = ''
+
     # Logging level
     LOG_LEVEL: str = "INFO"
 
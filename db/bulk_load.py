@@ -0,0 +1,111 @@
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def rows_from_dicts(rows: Iterable[Dict[str, Any]], columns: Sequence[str]) -> List[tuple]:
+    """Tuples in `columns` order, as expected by copy_upsert"""
+    return [tuple(row[column] for column in columns) for row in rows]
+
+
+async def copy_records(
+    session: AsyncSession,
+    table,
+    records: Sequence[Sequence[Any]],
+    columns: Sequence[str],
+) -> int:
+    """
+    Append `records` (tuples in `columns` order) to `table` with asyncpg
+    binary COPY, inside the session's transaction. The caller commits.
+    """
+    if not records:
+        return 0
+
+    table = getattr(table, "__table__", table)
+    connection = await session.connection()
+    # The asyncpg adapter opens its transaction lazily on the first statement;
+    # issue one so the COPY below runs inside it rather than in autocommit
+    await session.execute(text("SELECT 1"))
+    raw = await connection.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(
+        table.name, records=records, columns=list(columns), schema_name=table.schema
+    )
+    return len(records)
+
+
+async def copy_upsert(
+    session: AsyncSession,
+    table,
+    records: Sequence[Sequence[Any]],
+    columns: Sequence[str],
+    conflict_columns: Sequence[str],
+    update_columns: Optional[Sequence[str]] = None,
+    constants: Optional[Dict[str, Any]] = None,
+    only_newer: Optional[str] = None,
+) -> int:
+    """
+    Bulk load `records` (tuples in `columns` order) into `table` (model or
+    Table) inside the session's transaction:
+
+    1. COPY the records into a temporary staging table with the target's
+       column types (asyncpg copy_records_to_table, binary protocol);
+    2. merge with one INSERT ... SELECT ... ON CONFLICT (conflict_columns),
+       DO UPDATE SET update_columns if given, else DO NOTHING.
+
+    `constants` are extra target columns bound once for every row (e.g. a
+    load date). With `only_newer` (a column name), a conflicting row is only
+    updated if the incoming value of that column is not older. The caller commits. Returns the number of rows inserted or
+    updated by the merge.
+    """
+    if not records:
+        return 0
+
+    table = getattr(table, "__table__", table)
+    constants = constants or {}
+    target = ".".join(_quote(part) for part in filter(None, [table.schema, table.name]))
+    stage = f"_stage_{table.name}_{uuid.uuid4().hex[:8]}"
+    column_list = ", ".join(_quote(column) for column in columns)
+
+    connection = await session.connection()
+
+    # Temporary tables are session-private and not WAL-logged; dropped with the transaction
+    await session.execute(text(
+        f"CREATE TEMP TABLE {_quote(stage)} ON COMMIT DROP AS "
+        f"SELECT {column_list} FROM {target} WITH NO DATA"
+    ))
+
+    raw = await connection.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(stage, records=records, columns=list(columns))
+
+    insert_columns = list(columns) + list(constants)
+    # Constants are cast to the target column type: a bare parameter in a SELECT list is typed as text
+    select_list = column_list + "".join(
+        f", CAST(:{name} AS {table.c[name].type.compile(dialect=connection.dialect)})" for name in constants
+    )
+    if update_columns:
+        action = "DO UPDATE SET " + ", ".join(f"{_quote(column)} = EXCLUDED.{_quote(column)}" for column in update_columns)
+        if only_newer:
+            action += f" WHERE {_quote(table.name)}.{_quote(only_newer)} <= EXCLUDED.{_quote(only_newer)}"
+    else:
+        action = "DO NOTHING"
+
+    result = await session.execute(
+        text(
+            f"INSERT INTO {target} ({', '.join(_quote(column) for column in insert_columns)}) "
+            f"SELECT {select_list} FROM {_quote(stage)} "
+            f"ON CONFLICT ({', '.join(_quote(column) for column in conflict_columns)}) {action}"
+        ),
+        constants,
+    )
+    logger.debug(f"COPY-staged {len(records)} rows into {table.name}: {result.rowcount} merged")
+    return result.rowcount
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, BigInteger, SmallInteger, String, Index, Float, Numeric, DateTime, func
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, String, Index, Float, Numeric, Date, DateTime, func, text
 from db.connection import Base
 
 
@@ -123,13 +123,20 @@ class Demo(Base):
 class CMSnapshot(Base):
     __tablename__ = 'cm_snapshot'
     __table_args__ = (
-        Index('idx_cm_snapshot_transcode_timestamp', 'transcode', 'timestamp'),
-        Index('idx_cm_snapshot_security_token', 'security_token'),
+        # Natural key (ingest is ON CONFLICT DO NOTHING on it), also serving per-token
+        # latest/history lookups; the INCLUDE columns make price series index-only
+        Index('idx_cm_snapshot_token_timestamp', 'security_token', text('timestamp DESC'), 'transcode',
+              unique=True, postgresql_include=['last_traded_price', 'total_traded_quantity']),
+        # Time-range scans: rows arrive in timestamp order, so a BRIN index stays tiny
+        Index('idx_cm_snapshot_timestamp_brin', 'timestamp', postgresql_using='brin'),
+        # Daily range partitions on timestamp, managed by db.partitions
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
     )
 
+    # The partition key has to be part of the primary key
     id = Column(Integer, primary_key=True, autoincrement=True)
     transcode = Column(SmallInteger, nullable=False)
-    timestamp = Column(BigInteger, nullable=False)
+    timestamp = Column(BigInteger, primary_key=True, nullable=False)
     message_length = Column(SmallInteger, nullable=False)
     security_token = Column(BigInteger, nullable=True)
     last_traded_price = Column(BigInteger, nullable=True)
@@ -154,13 +161,17 @@ class CMSnapshot(Base):
 class CMIndexSnapshot(Base):
     __tablename__ = 'cm_index_snapshot'
     __table_args__ = (
-        Index('idx_cm_index_snapshot_timestamp', 'timestamp'),
-        Index('idx_cm_index_snapshot_index_token', 'index_token'),
+        Index('idx_cm_index_snapshot_token_timestamp', 'index_token', text('timestamp DESC'), 'transcode',
+              unique=True, postgresql_include=['current_index_value']),
+        Index('idx_cm_index_snapshot_timestamp_brin', 'timestamp', postgresql_using='brin'),
+        # Daily range partitions on timestamp, managed by db.partitions
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
     )
 
+    # The partition key has to be part of the primary key
     id = Column(Integer, primary_key=True, autoincrement=True)
     transcode = Column(SmallInteger, nullable=False)
-    timestamp = Column(BigInteger, nullable=False)
+    timestamp = Column(BigInteger, primary_key=True, nullable=False)
     message_length = Column(SmallInteger, nullable=False)
     index_token = Column(BigInteger, nullable=False)
     open_index_value = Column(BigInteger, nullable=True)
@@ -178,13 +189,17 @@ class CMIndexSnapshot(Base):
 class CMCallAuctionSnapshot(Base):
     __tablename__ = 'cm_call_auction_snapshot'
     __table_args__ = (
-        Index('idx_cm_call_auction_timestamp', 'timestamp'),
-        Index('idx_cm_call_auction_security_token', 'security_token'),
+        Index('idx_cm_call_auction_token_timestamp', 'security_token', text('timestamp DESC'), 'transcode',
+              unique=True, postgresql_include=['last_traded_price', 'total_traded_quantity']),
+        Index('idx_cm_call_auction_timestamp_brin', 'timestamp', postgresql_using='brin'),
+        # Daily range partitions on timestamp, managed by db.partitions
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
     )
 
+    # The partition key has to be part of the primary key
     id = Column(Integer, primary_key=True, autoincrement=True)
     transcode = Column(SmallInteger, nullable=False)
-    timestamp = Column(BigInteger, nullable=False)
+    timestamp = Column(BigInteger, primary_key=True, nullable=False)
     message_length = Column(SmallInteger, nullable=False)
     security_token = Column(BigInteger, nullable=True)
     last_traded_price = Column(BigInteger, nullable=True)
@@ -203,6 +218,75 @@ class CMCallAuctionSnapshot(Base):
     low_price = Column(BigInteger, nullable=True)
     close_price = Column(BigInteger, nullable=True)
 
+class CMSnapshotLatest(Base):
+    """Latest CM snapshot per security, upserted with every cm_snapshot insert"""
+    __tablename__ = 'cm_snapshot_latest'
+
+    security_token = Column(BigInteger, primary_key=True)
+    transcode = Column(SmallInteger, nullable=False)
+    timestamp = Column(BigInteger, nullable=False)
+    message_length = Column(SmallInteger, nullable=False)
+    last_traded_price = Column(BigInteger, nullable=True)
+    best_buy_quantity = Column(BigInteger, nullable=True)
+    best_buy_price = Column(BigInteger, nullable=True)
+    best_sell_quantity = Column(BigInteger, nullable=True)
+    best_sell_price = Column(BigInteger, nullable=True)
+    total_traded_quantity = Column(BigInteger, nullable=True)
+    average_traded_price = Column(BigInteger, nullable=True)
+    open_price = Column(BigInteger, nullable=True)
+    high_price = Column(BigInteger, nullable=True)
+    low_price = Column(BigInteger, nullable=True)
+    close_price = Column(BigInteger, nullable=True)
+    interval_open_price = Column(BigInteger, nullable=True)
+    interval_high_price = Column(BigInteger, nullable=True)
+    interval_low_price = Column(BigInteger, nullable=True)
+    interval_close_price = Column(BigInteger, nullable=True)
+    interval_total_traded_quantity = Column(BigInteger, nullable=True)
+    indicative_close_price = Column(BigInteger, nullable=True)
+
+class CMIndexSnapshotLatest(Base):
+    """Latest index snapshot per index, upserted with every cm_index_snapshot insert"""
+    __tablename__ = 'cm_index_snapshot_latest'
+
+    index_token = Column(BigInteger, primary_key=True)
+    transcode = Column(SmallInteger, nullable=False)
+    timestamp = Column(BigInteger, nullable=False)
+    message_length = Column(SmallInteger, nullable=False)
+    open_index_value = Column(BigInteger, nullable=True)
+    current_index_value = Column(BigInteger, nullable=True)
+    high_index_value = Column(BigInteger, nullable=True)
+    low_index_value = Column(BigInteger, nullable=True)
+    percentage_change = Column(BigInteger, nullable=True)
+    interval_high_index_value = Column(BigInteger, nullable=True)
+    interval_low_index_value = Column(BigInteger, nullable=True)
+    interval_open_index_value = Column(BigInteger, nullable=True)
+    interval_close_index_value = Column(BigInteger, nullable=True)
+    indicative_close_value = Column(BigInteger, nullable=True)
+
+class CMCallAuctionSnapshotLatest(Base):
+    """Latest call auction snapshot per security, upserted with every cm_call_auction_snapshot insert"""
+    __tablename__ = 'cm_call_auction_snapshot_latest'
+
+    security_token = Column(BigInteger, primary_key=True)
+    transcode = Column(SmallInteger, nullable=False)
+    timestamp = Column(BigInteger, nullable=False)
+    message_length = Column(SmallInteger, nullable=False)
+    last_traded_price = Column(BigInteger, nullable=True)
+    best_buy_quantity = Column(BigInteger, nullable=True)
+    best_buy_price = Column(BigInteger, nullable=True)
+    buy_bbmm_flag = Column(String(1), nullable=True)
+    best_sell_quantity = Column(BigInteger, nullable=True)
+    best_sell_price = Column(BigInteger, nullable=True)
+    sell_bbmm_flag = Column(String(1), nullable=True)
+    total_traded_quantity = Column(BigInteger, nullable=True)
+    indicative_traded_quantity = Column(BigInteger, nullable=True)
+    average_traded_price = Column(BigInteger, nullable=True)
+    first_open_price = Column(BigInteger, nullable=True)
+    open_price = Column(BigInteger, nullable=True)
+    high_price = Column(BigInteger, nullable=True)
+    low_price = Column(BigInteger, nullable=True)
+    close_price = Column(BigInteger, nullable=True)
+
 class CMContractStreamInfo(Base):
     __tablename__ = 'cm_contract_stream_info'
 
@@ -222,3 +306,5 @@ class ProcessedFile(Base):
     __tablename__ = "processed_files"
     remote_path = Column(String, primary_key=True, index=True)
     processed_at = Column(DateTime, nullable=False, server_default=func.now())
+    # Trading day of the remote directory; the watcher only loads recent days
+    trading_day = Column(Date, nullable=True, index=True)
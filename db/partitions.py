@@ -0,0 +1,154 @@
+import re
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from config import settings
+from db.connection import engine
+from utils.logger import get_logger
+from utils.parser import from_feed_seconds, to_feed_seconds
+
+logger = get_logger(__name__)
+
+# Snapshot tables range-partitioned by trading day on their feed-epoch (1980) `timestamp`
+PARTITIONED_TABLES = ("cm_snapshot", "cm_index_snapshot", "cm_call_auction_snapshot")
+
+# Trading days run midnight to midnight IST
+IST = timezone(timedelta(hours=5, minutes=30))
+
+_PARTITION_SUFFIX = re.compile(r"_p(\d{8})$")
+
+
+def trading_day_bounds(day: date) -> Tuple[int, int]:
+    """Feed timestamp range [start, end) covered by the partition for `day`"""
+    start = to_feed_seconds(datetime.combine(day, time.min, tzinfo=IST))
+    return start, start + 86400
+
+
+def trading_day(timestamp: int) -> date:
+    """Trading day (IST) of a feed timestamp, i.e. the day whose partition holds it"""
+    return from_feed_seconds(timestamp).astimezone(IST).date()
+
+
+def partition_name(table: str, day: date) -> str:
+    return f"{table}_p{day:%Y%m%d}"
+
+
+def partition_day(name: str) -> Optional[date]:
+    """Trading day of a partition created by `partition_name`, None for other tables (e.g. the default partition)"""
+    match = _PARTITION_SUFFIX.search(name)
+    if not match:
+        return None
+    return datetime.strptime(match.group(1), "%Y%m%d").date()
+
+
+async def is_partitioned(conn: AsyncConnection, table: str) -> bool:
+    result = await conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table}
+    )
+    return result.scalar_one_or_none() == "p"
+
+
+async def list_partitions(conn: AsyncConnection, table: str) -> List[str]:
+    result = await conn.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(:table)"
+        ),
+        {"table": table},
+    )
+    return [name for (name,) in result]
+
+
+async def create_partitions(conn: AsyncConnection, table: str, days: Iterable[date]) -> List[str]:
+    """
+    Create the daily partitions of `table` for `days` (plus its default
+    partition, which catches rows outside every daily range). Existing
+    partitions are left alone. Returns the names of partitions created.
+    """
+    existing = set(await list_partitions(conn, table))
+    created = []
+
+    default = f"{table}_default"
+    if default not in existing:
+        await conn.execute(text(f'CREATE TABLE IF NOT EXISTS "{default}" PARTITION OF "{table}" DEFAULT'))
+        created.append(default)
+
+    for day in days:
+        name = partition_name(table, day)
+        if name in existing:
+            continue
+        start, end = trading_day_bounds(day)
+        try:
+            # Savepoint: fails if the default partition already holds rows for that day
+            async with conn.begin_nested():
+                await conn.execute(text(
+                    f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" FOR VALUES FROM ({start}) TO ({end})'
+                ))
+        except DBAPIError as e:
+            logger.error(f"❌ Could not create partition {name}: {e}")
+            continue
+        created.append(name)
+    return created
+
+
+async def drop_partitions(conn: AsyncConnection, table: str, before: date) -> List[str]:
+    """
+    Drop the daily partitions of `table` for trading days before `before`.
+    The default partition is never dropped. Returns the names dropped.
+    """
+    dropped = []
+    for name in sorted(await list_partitions(conn, table)):
+        day = partition_day(name)
+        if day is not None and day < before:
+            await conn.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+            dropped.append(name)
+    return dropped
+
+
+async def maintain_partitions(
+    conn: AsyncConnection,
+    today: date,
+    days_ahead: int,
+    retention_days: int = 0,
+    tables: Iterable[str] = PARTITIONED_TABLES,
+) -> None:
+    """
+    Make sure every partitioned snapshot table has partitions for `today` and
+    the next `days_ahead` days, and drop those more than `retention_days`
+    days old (0 keeps everything). Tables created before partitioning was
+    introduced are skipped with a warning until the partitioning migration
+    (alembic revision 5b1e7c9d2a40) has converted them.
+    """
+    days = [today + timedelta(days=offset) for offset in range(days_ahead + 1)]
+    for table in tables:
+        if not await is_partitioned(conn, table):
+            logger.warning(f"⚠️ {table} is not a partitioned table; run `alembic upgrade head` to convert it")
+            continue
+
+        created = await create_partitions(conn, table, days)
+        if created:
+            logger.info(f"🗂️ Created partitions for {table}: {', '.join(created)}")
+
+        if retention_days > 0:
+            dropped = await drop_partitions(conn, table, today - timedelta(days=retention_days))
+            if dropped:
+                logger.info(f"🗑️ Dropped expired partitions of {table}: {', '.join(dropped)}")
+
+
+async def maintain_snapshot_partitions() -> None:
+    """Scheduled entry point: partition maintenance with the SNAPSHOT_PARTITION_* settings"""
+    try:
+        async with engine.begin() as conn:
+            await maintain_partitions(
+                conn,
+                today=datetime.now(IST).date(),
+                days_ahead=settings.SNAPSHOT_PARTITION_DAYS_AHEAD,
+                retention_days=settings.SNAPSHOT_RETENTION_DAYS,
+            )
+    except Exception as e:
+        logger.error(f"❌ Snapshot partition maintenance failed: {e}", exc_info=True)
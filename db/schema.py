@@ -9,7 +9,8 @@ from random import randint
 
 
 class CMSnapshot(BaseModel):
-    id: int
+    # Not set for rows served from cm_snapshot_latest
+    id: Optional[int] = None
     transcode: int
     timestamp: int
     message_length: int
@@ -4,12 +4,14 @@ import os
 import asyncio
 import time
 from datetime import datetime, timedelta
+from decimal import Decimal
 
 import requests
 from sqlalchemy import select, insert
-from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import SQLAlchemyError
+import asyncpg
 
+from db.bulk_load import copy_upsert
 from db.connection import AsyncSessionLocal
 from db.models import CMTokenMaster, CMStockHistorical
 import sys
@@ -28,6 +30,9 @@ URL_TMPL = (
     "&currencyCode=INR"
 )
 
+# cm_stock_historical columns filled from the chart API
+HISTORICAL_COLUMNS = ["symbol", "timestamp", "open_price", "high_price", "low_price", "close_price", "volume"]
+
 HEADERS = {
     "Accept":             "application/json, text/plain, */*",
     "Accept-Language":    "en-IN,en-GB;q=0.9,en-US;q=0.8,hi;q=0.6",
@@ -110,34 +115,26 @@ async def save_to_db(symbol: str, data: dict):
         print(f"[{symbol}] API error status: {data.get('s')}")
         return
 
-    # JSON के parallel arrays को dicts में बदलो
-    records = []
-    for ts, o, h, l, c, v in zip(
-        data["t"], data["o"], data["h"],
-        data["l"], data["c"], data["v"]
-    ):
-        records.append({
-            "symbol":      symbol,
-            "timestamp":   ts,
-            "open_price":  o,
-            "high_price":  h,
-            "low_price":   l,
-            "close_price": c,
-            "volume":      int(v),
-        })
-
-    # Bulk upsert: ON CONFLICT DO NOTHING
-    stmt = pg_insert(CMStockHistorical).values(records)
-    stmt = stmt.on_conflict_do_nothing(
-        index_elements=["symbol", "timestamp"]
-    )
+    # JSON के parallel arrays को rows में बदलो (Decimal: numeric columns)
+    records = [
+        (symbol, ts, Decimal(str(o)), Decimal(str(h)), Decimal(str(l)), Decimal(str(c)), int(v))
+        for ts, o, h, l, c, v in zip(
+            data["t"], data["o"], data["h"],
+            data["l"], data["c"], data["v"]
+        )
+    ]
 
+    # Bulk load: COPY into staging, then ON CONFLICT DO NOTHING
     async with AsyncSessionLocal() as session:
         try:
-            await session.execute(stmt)
+            await copy_upsert(
+                session, CMStockHistorical, records,
+                columns=HISTORICAL_COLUMNS,
+                conflict_columns=["symbol", "timestamp"],
+            )
             await session.commit()
             print(f"[{symbol}] saved {len(records)} rows")
-        except SQLAlchemyError as e:
+        except (SQLAlchemyError, asyncpg.PostgresError) as e:
             await session.rollback()
             print(f"[{symbol}] DB error:", e)
 
@@ -10,9 +10,16 @@ from routers.indices import router as indices_router
 
 from services.broadcaster import broadcast_loop
 from services.sftp_watcher import start_sftp_watcher
+from services.parse_pool import shutdown_parse_pool
+from services.symbol_registry import symbol_registry
+from services.data_ingest import backfill_latest_snapshots
 from db.connection import engine, Base
+from db.partitions import maintain_snapshot_partitions
 from services.BHAVCOPY.bhavcopy import start_sftp_bhavcopy
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -21,6 +28,21 @@ async def lifespan(app: FastAPI):
         # Create database tables
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+
+        # Snapshot table partitions for today and the next few sessions
+        await maintain_snapshot_partitions()
+
+        # Latest-snapshot tables start out empty after an upgrade
+        try:
+            await backfill_latest_snapshots()
+        except Exception as e:
+            logger.error(f"Latest snapshot backfill failed: {e}", exc_info=True)
+
+        # Symbol/token lookups for the routers (reloaded lazily if this fails)
+        try:
+            await symbol_registry.reload()
+        except Exception as e:
+            logger.error(f"Symbol registry load failed: {e}", exc_info=True)
         
         # Start background tasks
         # broadcast_task = asyncio.create_task(broadcast_loop())
@@ -35,6 +57,22 @@ async def lifespan(app: FastAPI):
             minute=0,
             id="daily_bhavcopy"
         )
+        # Create upcoming snapshot partitions and drop expired ones before the session opens
+        scheduler.add_job(
+            lambda: asyncio.create_task(maintain_snapshot_partitions()),
+            trigger="cron",
+            hour=8,
+            minute=30,
+            id="daily_snapshot_partitions"
+        )
+        # Pick up token master refreshes made outside this process
+        scheduler.add_job(
+            lambda: asyncio.create_task(symbol_registry.reload()),
+            trigger="cron",
+            hour=8,
+            minute=45,
+            id="daily_symbol_registry_reload"
+        )
         scheduler.start()
         app.state.bhavcopy_scheduler = scheduler
         
@@ -46,6 +84,7 @@ async def lifespan(app: FastAPI):
         sftp_task.cancel()
         # stop the bhavcopy scheduler
         app.state.bhavcopy_scheduler.shutdown(wait=False)
+        shutdown_parse_pool()
         await engine.dispose()
 
 app = FastAPI(
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select, desc, and_, or_, case
+from sqlalchemy import select, desc, and_, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Dict, Any, Optional
 import aiohttp
@@ -7,13 +7,32 @@ from datetime import datetime
 import json
 
 from db.connection import get_db
-from db.models import CMSnapshot, CMCallAuctionSnapshot, CMTokenMaster, CMStockHistorical
+from db.models import CMSnapshotLatest, CMCallAuctionSnapshotLatest, CMStockHistorical
+from services.symbol_registry import symbol_registry
 
 from sqlalchemy import func
 from datetime import timedelta
 
 router = APIRouter(prefix="/api/indices", tags=["indices"])
 
+
+async def latest_snapshots_by_token(session: AsyncSession, tokens: List[int]):
+    """
+    Latest regular-market and call auction snapshots for `tokens`, as two
+    {token: snapshot} dicts, read by primary key from the *_latest tables.
+    """
+    regular = await session.execute(
+        select(CMSnapshotLatest).where(CMSnapshotLatest.security_token.in_(tokens))
+    )
+    call_auction = await session.execute(
+        select(CMCallAuctionSnapshotLatest).where(CMCallAuctionSnapshotLatest.security_token.in_(tokens))
+    )
+    return (
+        {snapshot.security_token: snapshot for snapshot in regular.scalars()},
+        {snapshot.security_token: snapshot for snapshot in call_auction.scalars()},
+    )
+
+
 # Index compositions from your JSON
 INDEX_COMPOSITIONS = {
     "all": {
@@ -158,34 +177,19 @@ async def get_index_stocks_prices(
     index_display_name = INDEX_COMPOSITIONS["all"].get(index_name.lower(), index_name.upper())
     
     try:
-        # Step 1: Get tokens for all symbols in this index from CMTokenMaster
-        # Priority: EQ series first, then others if EQ not found
-        symbol_stmt = (
-            select(CMTokenMaster.token_number, CMTokenMaster.symbol, CMTokenMaster.company_name, CMTokenMaster.series)
-            .where(CMTokenMaster.symbol.in_(stock_symbols))
-            .order_by(
-                CMTokenMaster.symbol,
-                # Prioritize EQ series
-                case(
-                    (CMTokenMaster.series == 'EQ', 1),
-                    (CMTokenMaster.series == 'BE', 2), 
-                    else_=3
-                )
-            )
-        )
-        symbol_result = await session.execute(symbol_stmt)
-        symbol_to_token = {}
-        symbol_details = {}
-        
-        # Take only the first (highest priority) entry for each symbol
-        for row in symbol_result:
-            if row.symbol not in symbol_to_token:  # Only take first occurrence
-                symbol_to_token[row.symbol] = row.token_number
-                symbol_details[row.symbol] = {
-                    'token': row.token_number,
-                    'company_name': row.company_name.strip(),
-                    'series': row.series
-                }
+        # Step 1: Get tokens for all symbols in this index from the symbol registry
+        # Priority: EQ series first, then BE, then others
+        await symbol_registry.ensure_loaded()
+        resolved = symbol_registry.resolve(stock_symbols)
+        symbol_to_token = {symbol: security.token for symbol, security in resolved.items()}
+        symbol_details = {
+            symbol: {
+                'token': security.token,
+                'company_name': security.company_name,
+                'series': security.series
+            }
+            for symbol, security in resolved.items()
+        }
         
         if not symbol_to_token:
             raise HTTPException(status_code=404, detail=f"No tokens found for {index_name} stocks")
@@ -193,39 +197,8 @@ async def get_index_stocks_prices(
         # Step 2: Get latest snapshots from both CMSnapshot and CMCallAuctionSnapshot
         tokens = list(symbol_to_token.values())
         
-        # Get regular market snapshots
-        snapshot_stmt = (
-            select(CMSnapshot)
-            .where(CMSnapshot.security_token.in_(tokens))
-            .order_by(CMSnapshot.timestamp.desc())
-        )
-        snapshot_result = await session.execute(snapshot_stmt)
-        regular_snapshots = snapshot_result.scalars().all()
-        
-        # Get call auction snapshots
-        call_auction_stmt = (
-            select(CMCallAuctionSnapshot)
-            .where(CMCallAuctionSnapshot.security_token.in_(tokens))
-            .order_by(CMCallAuctionSnapshot.timestamp.desc())
-        )
-        call_auction_result = await session.execute(call_auction_stmt)
-        call_auction_snapshots = call_auction_result.scalars().all()
-        
-        # Step 3: Get latest data for each token (prefer regular market data over call auction)
-        latest_snapshots = {}
-        latest_call_auction = {}
-        
-        # Process regular snapshots first
-        for snapshot in regular_snapshots:
-            token = snapshot.security_token
-            if token not in latest_snapshots:
-                latest_snapshots[token] = snapshot
-        
-        # Process call auction snapshots
-        for snapshot in call_auction_snapshots:
-            token = snapshot.security_token
-            if token not in latest_call_auction:
-                latest_call_auction[token] = snapshot
+        # Step 3: Latest data for each token (regular market data is preferred over call auction below)
+        latest_snapshots, latest_call_auction = await latest_snapshots_by_token(session, tokens)
         
         # Step 4: Format response with stock prices (prioritize regular market data)
         stocks_data = []
@@ -723,22 +696,10 @@ async def get_top_52w_high(
         raise HTTPException(404, f"Index '{index_name}' not found")
 
     # 1) EQ-series tokens + company info
-    tok_q = (
-        select(
-            CMTokenMaster.token_number,
-            CMTokenMaster.symbol,
-            CMTokenMaster.company_name,
-            CMTokenMaster.series,
-        )
-        .where(
-            CMTokenMaster.symbol.in_(INDEX_COMPOSITIONS[key]),
-            CMTokenMaster.series == "EQ",
-        )
-    )
-    rows = await session.execute(tok_q)
+    await symbol_registry.ensure_loaded()
     symbol_info = {
-        sym: {"token": tok, "company_name": nm.strip(), "series": ser}
-        for tok, sym, nm, ser in rows
+        sym: {"token": sec.token, "company_name": sec.company_name, "series": sec.series}
+        for sym, sec in symbol_registry.resolve(INDEX_COMPOSITIONS[key], series="EQ").items()
     }
     if not symbol_info:
         raise HTTPException(404, "No EQ-series symbols for this index")
@@ -761,28 +722,17 @@ async def get_top_52w_high(
         )
     ).all()
 
+    latest_regular, latest_call_auction = await latest_snapshots_by_token(
+        session, [info["token"] for info in symbol_info.values()]
+    )
+
     results = []
     for sym, high_52w in high_rows:
         info = symbol_info[sym]
         token = info["token"]
 
-        # 4) latest CMSnapshot
-        reg = await session.execute(
-            select(CMSnapshot).where(CMSnapshot.security_token == token)
-                              .order_by(CMSnapshot.timestamp.desc())  # Changed from .id.desc()
-                              .limit(1)
-        )
-        snap = reg.scalars().first()
-
-        # 5) fallback to call‐auction if no regular
-        if not snap:
-            ca = await session.execute(
-                select(CMCallAuctionSnapshot)
-                .where(CMCallAuctionSnapshot.security_token == token)
-                .order_by(CMCallAuctionSnapshot.timestamp.desc())  # Changed from .id.desc()
-                .limit(1)
-            )
-            snap = ca.scalars().first()
+        # 4) latest regular-market snapshot, 5) falling back to call auction
+        snap = latest_regular.get(token) or latest_call_auction.get(token)
 
         # 6) extract & convert - Fixed the attribute access and conversion
         if snap:
@@ -821,7 +771,7 @@ async def get_top_52w_high(
             "close": cl,
             "change_percent": round(change_percent, 2),
             "has_live_data": snap is not None,
-            "data_source": "regular_market" if token in [s.security_token for s in [snap] if hasattr(s, 'security_token') and isinstance(s, CMSnapshot)] else "call_auction" if snap else "none"
+            "data_source": "regular_market" if token in [s.security_token for s in [snap] if hasattr(s, 'security_token') and isinstance(s, CMSnapshotLatest)] else "call_auction" if snap else "none"
         })
 
     # Sort by 52w high and limit
@@ -851,22 +801,10 @@ async def get_top_52w_low(
         raise HTTPException(404, f"Index '{index_name}' not found")
 
     # 1) EQ-series tokens
-    tok_q = (
-        select(
-            CMTokenMaster.token_number,
-            CMTokenMaster.symbol,
-            CMTokenMaster.company_name,
-            CMTokenMaster.series,
-        )
-        .where(
-            CMTokenMaster.symbol.in_(INDEX_COMPOSITIONS[key]),
-            CMTokenMaster.series == "EQ",
-        )
-    )
-    rows = await session.execute(tok_q)
+    await symbol_registry.ensure_loaded()
     symbol_info = {
-        sym: {"token": tok, "company_name": nm.strip(), "series": ser}
-        for tok, sym, nm, ser in rows
+        sym: {"token": sec.token, "company_name": sec.company_name, "series": sec.series}
+        for sym, sec in symbol_registry.resolve(INDEX_COMPOSITIONS[key], series="EQ").items()
     }
     if not symbol_info:
         raise HTTPException(404, "No EQ-series symbols for this index")
@@ -889,28 +827,17 @@ async def get_top_52w_low(
         )
     ).all()
 
+    latest_regular, latest_call_auction = await latest_snapshots_by_token(
+        session, [info["token"] for info in symbol_info.values()]
+    )
+
     results = []
     for sym, low_52w in low_rows:
         info = symbol_info[sym]
         token = info["token"]
 
-        # 4) latest CMSnapshot
-        reg = await session.execute(
-            select(CMSnapshot).where(CMSnapshot.security_token == token)
-                              .order_by(CMSnapshot.timestamp.desc())  # Changed from .id.desc()
-                              .limit(1)
-        )
-        snap = reg.scalars().first()
-
-        # 5) fallback to call‐auction
-        if not snap:
-            ca = await session.execute(
-                select(CMCallAuctionSnapshot)
-                .where(CMCallAuctionSnapshot.security_token == token)
-                .order_by(CMCallAuctionSnapshot.timestamp.desc())  # Changed from .id.desc()
-                .limit(1)
-            )
-            snap = ca.scalars().first()
+        # 4) latest regular-market snapshot, 5) falling back to call auction
+        snap = latest_regular.get(token) or latest_call_auction.get(token)
 
         # 6) extract & convert - Fixed the attribute access and conversion
         if snap:
@@ -949,7 +876,7 @@ async def get_top_52w_low(
             "close": cl,
             "change_percent": round(change_percent, 2),
             "has_live_data": snap is not None,
-            "data_source": "regular_market" if token in [s.security_token for s in [snap] if hasattr(s, 'security_token') and isinstance(s, CMSnapshot)] else "call_auction" if snap else "none"
+            "data_source": "regular_market" if token in [s.security_token for s in [snap] if hasattr(s, 'security_token') and isinstance(s, CMSnapshotLatest)] else "call_auction" if snap else "none"
         })
 
     # Sort by 52w low (ascending for lowest first)
@@ -1,10 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select, or_
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, Union
 
 from db.connection import get_db
-from db.models import CMSnapshot, CMContractStreamInfo
+from db.models import CMSnapshotLatest
 from db.schema import (
     CMSnapshot as CMSnapshotSchema,
     SnapshotListResponse,
@@ -12,8 +12,13 @@ from db.schema import (
     ContractStreamInfoListResponse,
 )
 
+from services.symbol_registry import symbol_registry
+
 router = APIRouter(prefix="/api", tags=["rest"])
 
+# Registry matches tried (best first) until one has a snapshot
+SEARCH_CANDIDATES = 3
+
 # Existing endpoints...
 
 @router.get(
@@ -35,14 +40,7 @@ async def search_latest_snapshot(
     try:
         # If it's a number, search by token
         token = int(query)
-        stmt = (
-            select(CMSnapshot)
-            .where(CMSnapshot.security_token == token)
-            .order_by(CMSnapshot.timestamp.desc())
-            .limit(1)
-        )
-        result = await session.execute(stmt)
-        snapshot = result.scalar_one_or_none()
+        snapshot = await session.get(CMSnapshotLatest, token)
         
         if snapshot:
             return snapshot
@@ -51,61 +49,18 @@ async def search_latest_snapshot(
         # If not a number, it's probably a symbol
         pass
     
-    # Search by symbol name in contract info first
-    symbol_upper = query.upper()
-    
-    # First, find the token for this symbol
-    symbol_stmt = (
-        select(CMContractStreamInfo.symbol_token)
-        .where(CMContractStreamInfo.symbol.ilike(f"%{symbol_upper}%"))
-        .limit(1)
-    )
-    symbol_result = await session.execute(symbol_stmt)
-    token_row = symbol_result.first()
-    
-    if token_row:
-        security_token = token_row[0]
-        
-        # Now get the latest snapshot for this token
-        stmt = (
-            select(CMSnapshot)
-            .where(CMSnapshot.security_token == security_token)
-            .order_by(CMSnapshot.timestamp.desc())
-            .limit(1)
+    # Resolve the symbol from the in-memory registry (exact, then prefix, then substring matches)
+    await symbol_registry.ensure_loaded()
+    candidates = symbol_registry.match_contracts(query, limit=SEARCH_CANDIDATES)
+    if candidates:
+        result = await session.execute(
+            select(CMSnapshotLatest)
+            .where(CMSnapshotLatest.security_token.in_([contract.token for contract in candidates]))
         )
-        result = await session.execute(stmt)
-        snapshot = result.scalar_one_or_none()
-        
-        if snapshot:
-            return snapshot
-    
-    # If still not found, try fuzzy search
-    fuzzy_stmt = (
-        select(CMContractStreamInfo.symbol_token)
-        .where(
-            or_(
-                CMContractStreamInfo.symbol.ilike(f"{symbol_upper}%"),
-                CMContractStreamInfo.symbol.ilike(f"%{symbol_upper}"),
-            )
-        )
-        .limit(1)
-    )
-    fuzzy_result = await session.execute(fuzzy_stmt)
-    fuzzy_token = fuzzy_result.first()
-    
-    if fuzzy_token:
-        security_token = fuzzy_token[0]
-        stmt = (
-            select(CMSnapshot)
-            .where(CMSnapshot.security_token == security_token)
-            .order_by(CMSnapshot.timestamp.desc())
-            .limit(1)
-        )
-        result = await session.execute(stmt)
-        snapshot = result.scalar_one_or_none()
-        
-        if snapshot:
-            return snapshot
+        latest = {snapshot.security_token: snapshot for snapshot in result.scalars()}
+        for contract in candidates:
+            if contract.token in latest:
+                return latest[contract.token]
     
     raise HTTPException(
         status_code=404, 
@@ -125,36 +80,18 @@ async def get_symbol_suggestions(
     """
     Get stock symbol suggestions for autocomplete
     """
-    search_term = q.upper()
-    
-    stmt = (
-        select(
-            CMContractStreamInfo.symbol,
-            CMContractStreamInfo.symbol_token,
-            CMContractStreamInfo.instrument_type
-        )
-        .where(
-            or_(
-                CMContractStreamInfo.symbol.ilike(f"{search_term}%"),
-                CMContractStreamInfo.symbol.ilike(f"%{search_term}%")
-            )
-        )
-        .order_by(CMContractStreamInfo.symbol)
-        .limit(limit)
-    )
-    
-    result = await session.execute(stmt)
-    suggestions = result.fetchall()
+    await symbol_registry.ensure_loaded()
+    suggestions = symbol_registry.suggest(q, limit)
     
     return {
         "suggestions": [
             {
-                "symbol": row[0],
-                "token": row[1],
-                "type": row[2],
-                "search_query": f"{row[0]} (Token: {row[1]})"
+                "symbol": contract.symbol,
+                "token": contract.token,
+                "type": contract.instrument_type,
+                "search_query": f"{contract.symbol} (Token: {contract.token})"
             }
-            for row in suggestions
+            for contract in suggestions
         ],
         "count": len(suggestions)
-    }
\ No newline at end of file
+    }
@@ -6,7 +6,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
 from db.connection import get_db
-from db.models import CMSnapshot, CMContractStreamInfo
+from db.models import CMSnapshot, CMSnapshotLatest, CMContractStreamInfo
 from db.schema import (
     CMSnapshot as CMSnapshotSchema,
     SnapshotListResponse,
@@ -26,14 +26,7 @@ async def get_latest_snapshot(
     token: int,
     session: AsyncSession = Depends(get_db),
 ):
-    stmt = (
-        select(CMSnapshot)
-        .where(CMSnapshot.security_token == token)
-        .order_by(CMSnapshot.timestamp.desc())
-        .limit(1)
-    )
-    result = await session.execute(stmt)
-    snapshot = result.scalar_one_or_none()
+    snapshot = await session.get(CMSnapshotLatest, token)
     if not snapshot:
         raise HTTPException(status_code=404, detail="Snapshot not found")
     return snapshot
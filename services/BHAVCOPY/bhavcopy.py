@@ -11,7 +11,7 @@ from utils.logger import get_logger
 from services.sftp_client import SFTPClient
 from config import settings
 
-from sqlalchemy.dialects.postgresql import insert as pg_insert
+from db.bulk_load import copy_upsert
 from db.connection import AsyncSessionLocal
 from db.models import CMStockHistorical # your Demo(Base) model
 
@@ -28,6 +28,11 @@ HEADERS = [
     "total_traded_value",
 ]
 
+# cm_stock_historical columns, in the order of the rows built for copy_upsert
+HISTORICAL_COLUMNS = [
+    "symbol", "timestamp", "open_price", "high_price", "low_price", "close_price", "volume", "series",
+]
+
 def get_previous_business_day(ref: date = None) -> date:
     """
     Return the most recent business day before ref (defaults to today),
@@ -162,28 +167,31 @@ async def start_sftp_bhavcopy() -> None:
     json_path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
     logger.info(f"Wrote JSON with {len(payload['records'])} records to {json_path}")
 
-    # 5) Build insert‐dicts and bulk‐insert into Demo with ON CONFLICT DO NOTHING
+    # 5) Build insert rows and COPY-load them with ON CONFLICT DO NOTHING
     biz_ts = int(datetime.fromisoformat(payload["business_date"]).timestamp())
-    insert_rows = []
-    for rec in payload["records"]:
-        insert_rows.append({
-            "symbol":      rec["symbol"],
-            "timestamp":   biz_ts,
-            "open_price":  Decimal(rec["opening_price"]),
-            "high_price":  Decimal(rec["trade_high_price"]),
-            "low_price":   Decimal(rec["trade_low_price"]),
-            "close_price": Decimal(rec["closing_price"]),
-            "volume":      rec["total_traded_quantity"],
-            "series":      rec["series"],
-        })
+    insert_rows = [
+        (
+            rec["symbol"],
+            biz_ts,
+            Decimal(rec["opening_price"]),
+            Decimal(rec["trade_high_price"]),
+            Decimal(rec["trade_low_price"]),
+            Decimal(rec["closing_price"]),
+            rec["total_traded_quantity"],
+            rec["series"],
+        )
+        for rec in payload["records"]
+    ]
 
     if insert_rows:
         async with AsyncSessionLocal() as session:
-            stmt = pg_insert(CMStockHistorical).values(insert_rows)
-            stmt = stmt.on_conflict_do_nothing(index_elements=["symbol", "timestamp"])
-            await session.execute(stmt)
+            inserted = await copy_upsert(
+                session, CMStockHistorical, insert_rows,
+                columns=HISTORICAL_COLUMNS,
+                conflict_columns=["symbol", "timestamp"],
+            )
             await session.commit()
-        logger.info(f"Attempted to insert {len(insert_rows)} rows; duplicates were ignored.")
+        logger.info(f"Inserted {inserted} of {len(insert_rows)} rows; duplicates were ignored.")
 
 if __name__ == "__main__":
     asyncio.run(start_sftp_bhavcopy())
@@ -1,14 +1,20 @@
 import asyncio
 import json
-from typing import Any, Dict, List
+from typing import List
 
 from fastapi import WebSocket
+from config import settings
 from utils.logger import get_logger
+from utils.parser import to_dicts, SnapshotRecords
 
 logger = get_logger(__name__)
 
-# Global queue for publishing market snapshots
-data_queue: asyncio.Queue[List[Dict[str, Any]]] = asyncio.Queue()
+# Global queue for publishing market snapshots (kept compact until serialized).
+# Bounded: each batch is a view that keeps its whole parsed file alive
+data_queue: asyncio.Queue[SnapshotRecords] = asyncio.Queue(maxsize=settings.BROADCAST_QUEUE_SIZE)
+
+# Set while broadcast_loop runs; without a consumer nothing is queued
+_consumer_running = False
 
 class ConnectionManager:
     """
@@ -57,22 +63,35 @@ async def broadcast_loop() -> None:
     Background task: consume lists of records from data_queue
     and broadcast JSON-encoded payloads to all clients.
     """
+    global _consumer_running
     logger.info("Starting broadcaster loop...")
-    while True:
-        # Wait for a batch of records
-        records = await data_queue.get()
-        try:
-            # Serialize to JSON (list of dicts)
-            payload = json.dumps(records, default=str)
-            await manager.broadcast(payload)
-            logger.debug(f"Broadcasted {len(records)} records to {len(manager.active_connections)} clients")
-        except Exception as e:
-            logger.error(f"Broadcast error: {e}")
+    _consumer_running = True
+    try:
+        while True:
+            # Wait for a batch of records
+            records = await data_queue.get()
+            try:
+                # Serialize to JSON (list of dicts)
+                payload = json.dumps(to_dicts(records), default=str)
+                await manager.broadcast(payload)
+                logger.debug(f"Broadcasted {len(records)} records to {len(manager.active_connections)} clients")
+            except Exception as e:
+                logger.error(f"Broadcast error: {e}")
+    finally:
+        _consumer_running = False
 
-async def publish_data(records: List[Dict[str, Any]]) -> None:
+async def publish_data(records: SnapshotRecords) -> None:
     """
     Put a list of parsed snapshot records onto the queue
-    to be broadcast to WebSocket clients.
+    to be broadcast to WebSocket clients. Skipped while broadcast_loop isn't
+    running; when the queue is full the oldest batch is dropped, since
+    clients want the latest prices.
     """
-    await data_queue.put(records)
+    if not _consumer_running:
+        logger.debug(f"No broadcaster running; not publishing {len(records)} records")
+        return
+    if data_queue.full():
+        dropped = data_queue.get_nowait()
+        logger.warning(f"⚠️ Broadcast queue full; dropped a batch of {len(dropped)} records")
+    data_queue.put_nowait(records)
     logger.debug(f"Published {len(records)} records to broadcast queue")
@@ -1,23 +1,65 @@
+import asyncio
 import os
-import tempfile
-from typing import List, Dict, Any
+from datetime import date
+from typing import List, Dict, Iterable, Optional, Sequence
 
-from sqlalchemy import insert
+from sqlalchemy import exists, insert, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.schema import CreateIndex
 
-from db.connection import AsyncSessionLocal
-from db.models import CMSnapshot, CMIndexSnapshot, CMCallAuctionSnapshot
+from db.bulk_load import copy_upsert
+from db.connection import AsyncSessionLocal, engine
+from db.partitions import create_partitions, is_partitioned, list_partitions, partition_name, trading_day_bounds
+from db.models import (
+    CMSnapshot, CMIndexSnapshot, CMCallAuctionSnapshot,
+    CMSnapshotLatest, CMIndexSnapshotLatest, CMCallAuctionSnapshotLatest,
+)
+from services.snapshot_archive import SnapshotArchive
 from utils.logger import get_logger
-from utils.parser import parse_snapshot
+from config import settings
+from utils.parser import (
+    LayoutStats, parse_snapshot_bytes, parse_snapshot_iter, snapshot_type,
+    to_dicts, to_rows, latest_per_key, unique_records, SnapshotRecords,
+)
 
 logger = get_logger(__name__)
 
+FILE_MODELS = {"mkt": CMSnapshot, "ind": CMIndexSnapshot, "ca2": CMCallAuctionSnapshot}
 
-async def save_to_db(records: List[Dict[str, Any]], file_type: str = "mkt") -> None:
+# Natural key per snapshot table (a unique index): re-ingesting a file inserts nothing twice
+NATURAL_KEYS = {
+    CMSnapshot: ("security_token", "timestamp", "transcode"),
+    CMIndexSnapshot: ("index_token", "timestamp", "transcode"),
+    CMCallAuctionSnapshot: ("security_token", "timestamp", "transcode"),
+}
+
+# Indexes replaced by the natural key and BRIN indexes, dropped once those exist
+SUPERSEDED_INDEXES = {
+    CMSnapshot: ("idx_cm_snapshot_transcode_timestamp", "idx_cm_snapshot_security_token"),
+    CMIndexSnapshot: ("idx_cm_index_snapshot_timestamp", "idx_cm_index_snapshot_index_token"),
+    CMCallAuctionSnapshot: ("idx_cm_call_auction_timestamp", "idx_cm_call_auction_security_token"),
+}
+
+# Latest-snapshot table and its key per snapshot table, kept current with every insert
+LATEST_TABLES = {
+    CMSnapshot: (CMSnapshotLatest, "security_token"),
+    CMIndexSnapshot: (CMIndexSnapshotLatest, "index_token"),
+    CMCallAuctionSnapshot: (CMCallAuctionSnapshotLatest, "security_token"),
+}
+
+
+async def save_to_db(records: SnapshotRecords, file_type: str = "mkt") -> None:
     """
     Bulk‐insert snapshot records into the appropriate table based on file type.
+    Accepts the parser's columnar output (structured array) or a list of dicts.
+    Uses asyncpg binary COPY when SNAPSHOT_COPY_ENABLED, with the ORM INSERT
+    as fallback. Both skip records already stored (natural key conflict), so
+    re-ingesting a file is harmless. The matching latest-snapshot table is
+    upserted in the same transaction.
     """
-    if not records:
+    if len(records) == 0:
         logger.debug("No records to save")
         return
 
@@ -35,10 +77,69 @@ async def save_to_db(records: List[Dict[str, Any]], file_type: str = "mkt") -> N
         logger.error(f"Unknown file type: {file_type}")
         return
 
+    if settings.SNAPSHOT_COPY_ENABLED:
+        try:
+            inserted = await _copy_to_db(records, model)
+            skipped = f", {len(records) - inserted} already stored" if inserted < len(records) else ""
+            logger.info(f"✅ Successfully saved {inserted} records to {table_name} (COPY{skipped})")
+            return
+        except Exception as e:
+            logger.warning(f"⚠️ COPY into {table_name} failed, falling back to INSERT: {e}")
+
+    await _insert_to_db(records, model, table_name)
+
+
+async def _copy_to_db(records: SnapshotRecords, model) -> int:
+    """
+    Fast path: asyncpg binary COPY into a staging table, merged with
+    ON CONFLICT DO NOTHING on the natural key. Returns the rows inserted.
+    """
+    columns, rows = to_rows(records)
+    latest_model, key = LATEST_TABLES[model]
+    latest_columns, latest_rows = to_rows(latest_per_key(records, key))
+    async with AsyncSessionLocal() as session:
+        try:
+            inserted = await copy_upsert(session, model, rows, columns, conflict_columns=NATURAL_KEYS[model])
+            await _upsert_latest(session, latest_model, key, latest_columns, latest_rows)
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+    return inserted
+
+
+async def _upsert_latest(session, latest_model, key: str, columns: List[str], rows: List[tuple]) -> None:
+    await copy_upsert(
+        session, latest_model, rows, columns,
+        conflict_columns=[key],
+        update_columns=[column for column in columns if column != key],
+        only_newer="timestamp",
+    )
+
+
+async def _insert_to_db(records: SnapshotRecords, model, table_name: str) -> None:
+    """
+    ORM path: executemany INSERT ... ON CONFLICT DO NOTHING of one dict per record.
+    """
+    latest_model, key = LATEST_TABLES[model]
+    latest = to_dicts(latest_per_key(records, key))
     async with AsyncSessionLocal() as session:
         try:
             # Use low-level INSERT for maximum performance
-            await session.execute(insert(model), records)
+            await session.execute(
+                pg_insert(model).on_conflict_do_nothing(index_elements=list(NATURAL_KEYS[model])),
+                to_dicts(records),
+            )
+            if latest:
+                stmt = pg_insert(latest_model)
+                await session.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=[key],
+                        set_={column: stmt.excluded[column] for column in latest[0] if column != key},
+                        where=latest_model.timestamp <= stmt.excluded.timestamp,
+                    ),
+                    latest,
+                )
             await session.commit()
             logger.info(f"✅ Successfully saved {len(records)} records to {table_name}")
         except SQLAlchemyError as e:
@@ -51,6 +152,175 @@ async def save_to_db(records: List[Dict[str, Any]], file_type: str = "mkt") -> N
             raise
 
 
+async def backfill_latest_snapshots() -> None:
+    """
+    Seed empty latest-snapshot tables from the snapshot history (one
+    DISTINCT ON scan per table), e.g. right after they are first created.
+    """
+    for model, (latest_model, key) in LATEST_TABLES.items():
+        columns = [column.name for column in latest_model.__table__.columns]
+        async with AsyncSessionLocal() as session:
+            if await session.scalar(select(exists().select_from(latest_model))):
+                continue
+            newest = (
+                select(*[model.__table__.c[column] for column in columns])
+                .where(model.__table__.c[key].is_not(None))
+                .distinct(model.__table__.c[key])
+                .order_by(model.__table__.c[key], model.__table__.c.timestamp.desc())
+            )
+            result = await session.execute(insert(latest_model).from_select(columns, newest))
+            await session.commit()
+            logger.info(f"📌 Seeded {latest_model.__tablename__} with {result.rowcount} rows")
+
+
+async def _remove_duplicate_keys(conn, table: str, key: Sequence[str]) -> None:
+    """Delete rows repeating a natural key (the oldest is kept), logging how many there are first"""
+    same_key = " AND ".join(f"a.{column} = b.{column}" for column in key)
+    duplicates = await conn.scalar(text(
+        f'SELECT count(*) FROM "{table}" a WHERE EXISTS (SELECT 1 FROM "{table}" b WHERE b.id < a.id AND {same_key})'
+    ))
+    if not duplicates:
+        return
+    logger.warning(f"⚠️ {duplicates} rows of {table} repeat a natural key; removing them (oldest kept) before indexing")
+    await conn.execute(text(f'DELETE FROM "{table}" a USING "{table}" b WHERE a.id > b.id AND {same_key}'))
+
+
+async def ensure_snapshot_indexes() -> None:
+    """
+    One-off command for snapshot tables that predate the indexes declared in
+    db.models (natural key and BRIN): create_all leaves existing tables
+    alone, and ingest cannot resolve ON CONFLICT without the unique index.
+
+        python -m services.data_ingest indexes
+
+    Unpartitioned tables are indexed with CREATE INDEX CONCURRENTLY, so
+    ingest and the API keep running meanwhile. Postgres cannot build indexes
+    on a partitioned table concurrently, but the partitioning migration
+    already creates them. Rows repeating a natural key are removed before
+    the unique index is built. Once every declared index of a table is
+    valid, the SUPERSEDED_INDEXES it replaces are dropped.
+    """
+    dialect = postgresql.dialect()
+    async with engine.connect() as conn:
+        # Concurrent index builds can't run inside a transaction block
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for model, key in NATURAL_KEYS.items():
+            table = model.__tablename__
+            concurrently = "" if await is_partitioned(conn, table) else "CONCURRENTLY "
+            ready = True
+            for index in model.__table__.indexes:
+                try:
+                    valid = await conn.scalar(
+                        text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": index.name}
+                    )
+                    if valid:
+                        continue
+                    if valid is not None:
+                        # Left invalid by an interrupted concurrent build
+                        await conn.execute(text(f'DROP INDEX {concurrently}IF EXISTS "{index.name}"'))
+                    if index.unique:
+                        await _remove_duplicate_keys(conn, table, key)
+                    ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=dialect))
+                    await conn.execute(text(ddl.replace(" INDEX ", f" INDEX {concurrently}", 1)))
+                    logger.info(f"🗂️ Created index {index.name} on {table}")
+                except Exception as e:
+                    ready = False
+                    logger.error(f"❌ Could not create index {index.name} on {table}: {e}", exc_info=True)
+
+            if not ready:
+                continue
+            for name in SUPERSEDED_INDEXES[model]:
+                if await conn.scalar(text("SELECT to_regclass(:name)"), {"name": name}):
+                    await conn.execute(text(f'DROP INDEX {concurrently}IF EXISTS "{name}"'))
+                    logger.info(f"🗑️ Dropped superseded index {name} on {table}")
+
+
+def archived_day_records(archive: SnapshotArchive, trading_day: date, file_type: str) -> SnapshotRecords:
+    """
+    Records archived for `trading_day` that fall inside its partition range,
+    de-duplicated on the natural key: what replay_day loads.
+    """
+    start, end = trading_day_bounds(trading_day)
+    records = archive.load(trading_day, file_type)
+    in_day = (records["timestamp"] >= start) & (records["timestamp"] < end)
+    if not in_day.all():
+        logger.warning(f"⚠️ Ignoring {int((~in_day).sum())} archived {file_type} records outside {trading_day}")
+    return unique_records(records[in_day], NATURAL_KEYS[FILE_MODELS[file_type]])
+
+
+async def replay_day(
+    trading_day: date,
+    file_types: Iterable[str] = ("mkt", "ind", "ca2"),
+    archive: Optional[SnapshotArchive] = None,
+    replace: bool = False,
+) -> Dict[str, int]:
+    """
+    Re-ingest a whole trading day from the snapshot archive. Per table, in
+    one transaction: the archived records are de-duplicated on the natural
+    key and merged in with ON CONFLICT DO NOTHING, so rows already stored
+    are kept, and the latest-snapshot table is refreshed. Safe to repeat;
+    returns the rows inserted per file type.
+
+    The archive only holds what the watcher managed to archive, so with
+    `replace` the day's rows are removed first (TRUNCATE of its partition,
+    or a DELETE of its timestamp range) only if the archive holds at least
+    as many records as the table has for that day.
+    """
+    archive = archive or SnapshotArchive()
+    start, end = trading_day_bounds(trading_day)
+    counts = {}
+
+    for file_type in file_types:
+        model = FILE_MODELS[file_type]
+        table = model.__tablename__
+        records = archived_day_records(archive, trading_day, file_type)
+        if len(records) == 0:
+            logger.warning(f"⚠️ Nothing archived for {file_type} on {trading_day}; skipping replay")
+            counts[file_type] = 0
+            continue
+
+        columns, rows = to_rows(records)
+        latest_model, key = LATEST_TABLES[model]
+        latest_columns, latest_rows = to_rows(latest_per_key(records, key))
+
+        async with AsyncSessionLocal() as session:
+            try:
+                conn = await session.connection()
+                if await is_partitioned(conn, table):
+                    await create_partitions(conn, table, [trading_day])
+                if replace:
+                    stored = (await session.execute(
+                        text(f'SELECT count(*) FROM "{table}" WHERE timestamp >= :start AND timestamp < :end'),
+                        {"start": start, "end": end},
+                    )).scalar_one()
+                    if stored > len(rows):
+                        logger.error(
+                            f"❌ Not replacing {file_type} for {trading_day}: archive has {len(rows)} records, "
+                            f"{table} has {stored}"
+                        )
+                        counts[file_type] = 0
+                        continue
+                    partition = partition_name(table, trading_day)
+                    if partition in await list_partitions(conn, table):
+                        await session.execute(text(f'TRUNCATE "{partition}"'))
+                    else:
+                        await session.execute(
+                            text(f'DELETE FROM "{table}" WHERE timestamp >= :start AND timestamp < :end'),
+                            {"start": start, "end": end},
+                        )
+                inserted = await copy_upsert(session, model, rows, columns, conflict_columns=NATURAL_KEYS[model])
+                await _upsert_latest(session, latest_model, key, latest_columns, latest_rows)
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                logger.error(f"❌ Replay of {file_type} for {trading_day} failed", exc_info=True)
+                raise
+
+        counts[file_type] = inserted
+        logger.info(f"🔁 Replayed {file_type} for {trading_day}: {inserted} of {len(rows)} archived records inserted")
+    return counts
+
+
 async def ingest_file(path: str) -> None:
     """
     Parse a snapshot .gz file at `path` and persist its records.
@@ -58,20 +328,18 @@ async def ingest_file(path: str) -> None:
     logger.info(f"Ingesting file: {path}")
     try:
         # Determine file type from extension
-        lower_path = path.lower()
-        if lower_path.endswith(".mkt.gz"):
-            file_type = "mkt"
-        elif lower_path.endswith(".ind.gz"):
-            file_type = "ind"
-        elif lower_path.endswith(".ca2.gz"):
-            file_type = "ca2"
-        else:
+        file_type = snapshot_type(path)
+        if file_type is None:
             logger.warning(f"Unknown file type for {path}")
             return
 
-        records = parse_snapshot(path)
-        await save_to_db(records, file_type)
-        logger.info(f"✅ Successfully ingested {len(records)} {file_type.upper()} records from {os.path.basename(path)}")
+        stats = LayoutStats(file_type)
+        total_records = 0
+        for batch in parse_snapshot_iter(path, batch_size=settings.SNAPSHOT_BATCH_SIZE, stats=stats):
+            await save_to_db(batch, file_type)
+            total_records += len(batch)
+        logger.info(f"Layout stats for {os.path.basename(path)}: {stats.to_dict()}")
+        logger.info(f"✅ Successfully ingested {total_records} {file_type.upper()} records from {os.path.basename(path)}")
     except Exception:
         logger.error(f"❌ Failed ingesting {path}", exc_info=True)
         raise
@@ -79,18 +347,31 @@ async def ingest_file(path: str) -> None:
 
 async def ingest_bytes(data: bytes, filename: str) -> None:
     """
-    Helper for raw bytes (from SFTP). Writes `data` to a temp .gz file,
-    then calls `ingest_file`.
+    Helper for raw bytes (from SFTP). Decompresses and parses `data`
+    in memory, then persists its records.
     """
-    suffix = os.path.splitext(filename)[1]  # e.g. ".mkt.gz", ".ind.gz", ".ca2.gz"
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        tmp.write(data)
-        tmp_path = tmp.name
+    file_type = snapshot_type(filename)
+    if file_type is None:
+        logger.warning(f"Unknown file type for {filename}")
+        return
 
     try:
-        await ingest_file(tmp_path)
-    finally:
-        try:
-            os.remove(tmp_path)
-        except OSError:
-            pass
\ No newline at end of file
+        records = parse_snapshot_bytes(data, filename)
+        await save_to_db(records, file_type)
+        logger.info(f"✅ Successfully ingested {len(records)} {file_type.upper()} records from {filename}")
+    except Exception:
+        logger.error(f"❌ Failed ingesting {filename}", exc_info=True)
+        raise
+
+
+if __name__ == "__main__":
+    import sys
+
+    args = [arg for arg in sys.argv[1:] if arg != "--replace"]
+    if len(args) > 1 and args[0].lower() == "replay":
+        asyncio.run(replay_day(date.fromisoformat(args[1]), args[2:] or FILE_MODELS, replace="--replace" in sys.argv))
+    elif args and args[0].lower() == "indexes":
+        asyncio.run(ensure_snapshot_indexes())
+    else:
+        print("Usage: python -m services.data_ingest replay <YYYY-MM-DD> [mkt] [ind] [ca2] [--replace]")
+        print("       python -m services.data_ingest indexes")
@@ -0,0 +1,75 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from utils.logger import get_logger
+from utils.parser import LayoutStats, parse_snapshot_buffer, snapshot_type
+
+logger = get_logger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _parse_worker(data: bytes, filename: str) -> Tuple[np.ndarray, LayoutStats]:
+    """
+    Runs inside a pool worker. The structured array pickles as one compact
+    buffer, so only raw column bytes cross the process boundary.
+    """
+    file_type = snapshot_type(filename)
+    if file_type is None:
+        raise ValueError(f"Unrecognized snapshot type: {filename}")
+    return parse_snapshot_buffer(data, file_type)
+
+
+def get_parse_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Return the shared parse pool, creating it on first use.
+    Returns None when PARSE_WORKERS is 0 (parse in a thread instead).
+    """
+    global _pool
+    if settings.PARSE_WORKERS <= 0:
+        return None
+    if _pool is None:
+        # spawn: workers must not inherit the event loop, DB pool or SFTP sockets
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.PARSE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        logger.info(f"Started snapshot parse pool with {settings.PARSE_WORKERS} workers")
+    return _pool
+
+
+async def parse_off_loop(data: bytes, filename: str) -> Tuple[np.ndarray, LayoutStats]:
+    """
+    Parse snapshot .gz bytes without blocking the event loop, so API and
+    WebSocket clients stay responsive while large files decode.
+    """
+    global _pool
+    pool = get_parse_pool()
+    if pool is None:
+        return await asyncio.to_thread(_parse_worker, data, filename)
+
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(pool, _parse_worker, data, filename)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed); start a fresh pool for the next file
+        logger.error("Snapshot parse pool is broken; it will be restarted on next use")
+        _pool = None
+        raise
+
+
+def shutdown_parse_pool() -> None:
+    """
+    Stop the parse pool workers.
+    """
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+        logger.info("Snapshot parse pool stopped")
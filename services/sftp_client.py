@@ -1,7 +1,10 @@
+import asyncio
 import os
 import paramiko
 import random
-from typing import List, Optional
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
 from utils.logger import get_logger
 from config import settings
 
@@ -12,8 +15,8 @@ class SFTPClient:
     SFTP client with multiple host support and reconnection logic.
     """
 
-    def __init__(self):
-        self.hosts: List[str] = settings.SFTP_HOSTS
+    def __init__(self, hosts: Optional[List[str]] = None):
+        self.hosts: List[str] = hosts or settings.SFTP_HOSTS
         self.port: int = settings.SFTP_PORT
         self.username: str = settings.SFTP_USER
         self.password: str = settings.SFTP_PASS
@@ -21,11 +24,17 @@ class SFTPClient:
         self.transport: Optional[paramiko.Transport] = None
         self.client: Optional[paramiko.SFTPClient] = None
         self.current_host: Optional[str] = None
+        # Reconnects may be triggered from several download threads at once
+        self._connect_lock = threading.Lock()
 
     def connect(self) -> None:
         """
         Establishes SFTP connection with failover support.
         """
+        with self._connect_lock:
+            self._connect()
+
+    def _connect(self) -> None:
         if self.client and self.transport and self.transport.is_active():
             return
 
@@ -81,20 +90,51 @@ class SFTPClient:
             logger.error(f"Error listing {remote_dir}: {e}")
             raise
 
-    def download_file(self, remote_path: str) -> bytes:
+    def download_file(self, remote_path: str, dedicated_channel: bool = False) -> bytes:
         """
-        Download file and return raw bytes.
+        Download file and return raw bytes. With `dedicated_channel` the file
+        is read over its own SFTP channel on the shared transport, so several
+        threads can download from this host at once.
         """
         self.connect()
+        sftp = self.client
         try:
+            if dedicated_channel:
+                sftp = paramiko.SFTPClient.from_transport(self.transport)
+                if sftp is None:
+                    raise ConnectionError(f"Could not open an SFTP channel to {self.current_host}")
             logger.info(f"Downloading SFTP file: {remote_path}")
-            with self.client.open(remote_path, 'rb') as rf:
+            with sftp.open(remote_path, 'rb') as rf:
                 data = rf.read()
             logger.debug(f"Downloaded {len(data)} bytes from {remote_path}")
             return data
         except Exception as e:
             logger.error(f"Error downloading {remote_path}: {e}")
             raise
+        finally:
+            if dedicated_channel and sftp is not None and sftp is not self.client:
+                sftp.close()
+
+    def iter_file(self, remote_path: str, chunk_size: int = None) -> Iterator[bytes]:
+        """
+        Stream a remote file in chunks of `chunk_size` bytes.
+        """
+        chunk_size = chunk_size or settings.SFTP_CHUNK_SIZE
+        self.connect()
+        try:
+            logger.info(f"Streaming SFTP file: {remote_path}")
+            with self.client.open(remote_path, 'rb') as rf:
+                total = 0
+                while True:
+                    chunk = rf.read(chunk_size)
+                    if not chunk:
+                        break
+                    total += len(chunk)
+                    yield chunk
+            logger.debug(f"Streamed {total} bytes from {remote_path}")
+        except Exception as e:
+            logger.error(f"Error streaming {remote_path}: {e}")
+            raise
 
     def close(self) -> None:
         """
@@ -110,4 +150,126 @@ class SFTPClient:
                 self.transport.close()
             except:
                 pass
-        logger.info("SFTP connection closed")
\ No newline at end of file
+        logger.info("SFTP connection closed")
+
+
+class SFTPFetchPool:
+    """
+    One SFTP session per configured mirror, with downloads spread across
+    them, each over its own channel so concurrent downloads from one mirror
+    never share an SFTP client. The least busy mirror gets each download
+    (mirrors failing to list or download go last); if it hasn't finished
+    after SFTP_HEDGE_DELAY_SECONDS the same path is also requested from the
+    next mirror, and whichever copy completes first is used (a failed
+    download falls over to the next mirror immediately).
+    """
+
+    def __init__(self, hosts: Optional[List[str]] = None, hedge_delay: Optional[float] = None):
+        self.hosts: List[str] = hosts or settings.SFTP_HOSTS
+        self.hedge_delay: float = settings.SFTP_HEDGE_DELAY_SECONDS if hedge_delay is None else hedge_delay
+        self.clients: Dict[str, SFTPClient] = {host: SFTPClient([host]) for host in self.hosts}
+        self.in_flight: Dict[str, int] = {host: 0 for host in self.hosts}
+        self.failures: Dict[str, int] = {host: 0 for host in self.hosts}
+        self._next = 0
+
+    def connect(self) -> None:
+        """
+        Connect to every mirror. Raises only if none is reachable; the
+        others are retried on their next use.
+        """
+        connected = []
+        for host, client in self.clients.items():
+            try:
+                client.connect()
+                connected.append(host)
+            except Exception as e:
+                logger.warning(f"SFTP mirror {host} unavailable: {e}")
+        if not connected:
+            raise ConnectionError(f"Failed to connect to any SFTP server: {', '.join(self.hosts)}")
+        logger.info(f"SFTP fetch pool connected to {', '.join(connected)}")
+
+    def _ranked_hosts(self) -> List[str]:
+        """
+        Hosts in the order to try them: those whose last list/download
+        failed go last, then fewest downloads in flight, then fewest recent
+        failures, round-robin on ties
+        """
+        self._next = (self._next + 1) % len(self.hosts)
+        rotated = self.hosts[self._next:] + self.hosts[:self._next]
+        return sorted(rotated, key=lambda host: (self.failures[host] > 0, self.in_flight[host], self.failures[host]))
+
+    def list_files(self, remote_dir: str) -> List[str]:
+        """
+        List `remote_dir` on the first mirror that answers.
+        """
+        last_exception = None
+        for host in self._ranked_hosts():
+            try:
+                files = self.clients[host].list_files(remote_dir)
+            except FileNotFoundError as e:
+                # The mirror answered: the directory isn't there (yet)
+                last_exception = e
+                continue
+            except Exception as e:
+                last_exception = e
+                self.failures[host] += 1
+                continue
+            self.failures[host] = 0
+            return files
+        raise last_exception
+
+    async def _download(self, host: str, remote_path: str) -> bytes:
+        self.in_flight[host] += 1
+        try:
+            return await asyncio.to_thread(self.clients[host].download_file, remote_path, True)
+        finally:
+            self.in_flight[host] -= 1
+
+    async def fetch(self, remote_path: str) -> bytes:
+        """
+        Download `remote_path`, racing mirrors as described above.
+        """
+        hosts = self._ranked_hosts()
+        started = time.perf_counter()
+        tasks: Dict[asyncio.Task, str] = {}
+        last_exception: Optional[BaseException] = None
+
+        def start_next() -> None:
+            host = hosts.pop(0)
+            tasks[asyncio.create_task(self._download(host, remote_path))] = host
+            if len(tasks) > 1 or last_exception is not None:
+                logger.info(f"🏁 Also fetching {os.path.basename(remote_path)} from {host}")
+
+        start_next()
+        while tasks:
+            done, _ = await asyncio.wait(
+                tasks, timeout=self.hedge_delay if hosts else None, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                # Slow mirror: race the next one
+                start_next()
+                continue
+
+            for task in done:
+                host = tasks.pop(task)
+                if task.exception() is not None:
+                    last_exception = task.exception()
+                    self.failures[host] += 1
+                    logger.warning(f"SFTP mirror {host} failed on {remote_path}: {last_exception}")
+                    continue
+
+                self.failures[host] = 0
+                # The losing downloads run on in their threads; drop their results
+                for loser in tasks:
+                    loser.add_done_callback(lambda t: t.cancelled() or t.exception())
+                logger.debug(f"Fetched {remote_path} from {host} in {time.perf_counter() - started:.2f}s")
+                return task.result()
+
+            if not tasks and hosts:
+                start_next()
+
+        raise last_exception
+
+    def close(self) -> None:
+        for client in self.clients.values():
+            client.close()
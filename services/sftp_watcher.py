@@ -1,15 +1,20 @@
 import asyncio
 import os
-import tempfile
-from datetime import datetime, timedelta
-from typing import Set
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
 
-from services.sftp_client import SFTPClient
+from services.sftp_client import SFTPFetchPool
 from services.data_ingest import save_to_db
 from services.broadcaster import publish_data
-from utils.parser import parse_snapshot
+from services.parse_pool import parse_off_loop
+from services.snapshot_cache import SnapshotCache
+from services.snapshot_archive import SnapshotArchive, trading_day_from_path
+from utils.parser import snapshot_type
 from config import settings
 from utils.logger import get_logger
+from sqlalchemy import and_, or_, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.future import select
 from db.connection import AsyncSessionLocal, engine
 from db.models import ProcessedFile
@@ -20,26 +25,286 @@ async def init_db():
     # Create tables if they don't exist
     async with engine.begin() as conn:
         await conn.run_sync(lambda sync_conn: ProcessedFile.metadata.create_all(bind=sync_conn))
+        # processed_files created before markers were keyed by trading day
+        await conn.execute(text("ALTER TABLE processed_files ADD COLUMN IF NOT EXISTS trading_day DATE"))
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_processed_files_trading_day ON processed_files (trading_day)"
+        ))
 
-async def load_processed() -> Set[str]:
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(select(ProcessedFile.remote_path))
-        return set(result.scalars().all())
 
-async def mark_processed(remote_path: str) -> None:
-    async with AsyncSessionLocal() as session:
-        session.add(ProcessedFile(remote_path=remote_path))
-        try:
-            await session.commit()
-        except Exception:
-            await session.rollback()
+class ProcessedFiles:
+    """
+    Remote paths already handled, keyed by trading day. Only the current and
+    previous days are loaded and kept in memory; new markers are buffered by
+    `add()` and written in one transaction per watcher cycle by `flush()`.
+    A marker lost to a crash before its flush only costs a re-download: the
+    snapshot cache recognises the already ingested bytes.
+    """
+
+    def __init__(self):
+        self.paths: Dict[str, Optional[date]] = {}
+        self.unsaved: Dict[str, Optional[date]] = {}
+
+    def __contains__(self, remote_path: str) -> bool:
+        return remote_path in self.paths
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    @staticmethod
+    def window_start(today: date) -> date:
+        return today - timedelta(days=1)
+
+    async def load(self, today: date) -> None:
+        start = self.window_start(today)
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(ProcessedFile.remote_path, ProcessedFile.trading_day).where(or_(
+                    ProcessedFile.trading_day >= start,
+                    # Markers written before trading_day existed
+                    and_(ProcessedFile.trading_day.is_(None), ProcessedFile.processed_at >= datetime.combine(start, datetime.min.time())),
+                ))
+            )
+            self.paths = {remote_path: trading_day for remote_path, trading_day in result}
+        logger.info(f"Loaded {len(self.paths)} processed file markers since {start}")
+
+    def add(self, remote_path: str) -> None:
+        trading_day = trading_day_from_path(remote_path)
+        self.paths[remote_path] = trading_day
+        self.unsaved[remote_path] = trading_day
+
+    async def flush(self) -> None:
+        """Write buffered markers in one transaction; kept for the next flush if that fails"""
+        if not self.unsaved:
+            return
+        rows = [{"remote_path": path, "trading_day": day} for path, day in self.unsaved.items()]
+        async with AsyncSessionLocal() as session:
+            try:
+                await session.execute(
+                    pg_insert(ProcessedFile).values(rows).on_conflict_do_nothing(index_elements=["remote_path"])
+                )
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                logger.error(f"❌ Failed to save {len(rows)} processed file markers: {e}")
+                return
+        self.unsaved.clear()
+        logger.debug(f"Saved {len(rows)} processed file markers")
+
+    def prune(self, today: date) -> None:
+        """Forget markers older than the load window (they are still in the table)"""
+        start = self.window_start(today)
+        for path, trading_day in list(self.paths.items()):
+            if trading_day is not None and trading_day < start and path not in self.unsaved:
+                del self.paths[path]
+
+
+class FileJob:
+    """
+    One remote snapshot file moving through the watcher pipeline, with the
+    time spent in each stage.
+    """
+
+    def __init__(self, remote_path: str):
+        self.remote_path = remote_path
+        self.filename = os.path.basename(remote_path)
+        self.file_type = snapshot_type(remote_path)
+        self.data: Optional[bytes] = None
+        self.digest: Optional[str] = None
+        self.records = None
+        self.stats = None
+        self.total_records = 0
+        self.queued_at = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+
+    def log_latency(self, outcome: str) -> None:
+        stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in self.timings.items())
+        total = time.perf_counter() - self.queued_at
+        logger.info(f"⏱️ {self.filename} {outcome}: {stages} (total {total:.2f}s incl. queueing)")
+
+
+class WatcherPipeline:
+    """
+    Download -> parse -> persist -> broadcast, each stage a pool of workers
+    fed by a bounded asyncio queue. File N+1 downloads while file N parses
+    and file N-1 commits, so a burst of files at a snapshot boundary clears
+    in about the time of the slowest stage. A full queue blocks the stage
+    before it, which keeps memory bounded.
+    """
+
+    def __init__(self, sftp: SFTPFetchPool, cache: SnapshotCache, archive: Optional[SnapshotArchive], processed: ProcessedFiles):
+        self.sftp = sftp
+        self.cache = cache
+        self.archive = archive
+        self.processed = processed
+        # Submitted and still in the pipeline, so the poller doesn't queue a file twice
+        self.pending: Set[str] = set()
+        # remote_path -> (failed attempts, monotonic time before which it is not retried)
+        self.failures: Dict[str, Tuple[int, float]] = {}
+
+        queue_size = settings.WATCHER_QUEUE_SIZE
+        self.stages = [
+            ("download", self.download, settings.WATCHER_DOWNLOAD_CONCURRENCY),
+            ("parse", self.parse, settings.WATCHER_PARSE_CONCURRENCY),
+            ("persist", self.persist, settings.WATCHER_PERSIST_CONCURRENCY),
+            ("broadcast", self.broadcast, settings.WATCHER_BROADCAST_CONCURRENCY),
+        ]
+        self.queues: List[asyncio.Queue] = [asyncio.Queue(maxsize=queue_size) for _ in self.stages]
+        self.tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        for index, (name, handler, concurrency) in enumerate(self.stages):
+            inbox = self.queues[index]
+            outbox = self.queues[index + 1] if index + 1 < len(self.queues) else None
+            for worker in range(max(1, concurrency)):
+                self.tasks.append(asyncio.create_task(
+                    self._worker(name, handler, inbox, outbox), name=f"watcher-{name}-{worker}"
+                ))
+        logger.info(
+            "Watcher pipeline started: "
+            + ", ".join(f"{name} x{max(1, concurrency)}" for name, _, concurrency in self.stages)
+        )
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def submit(self, remote_path: str) -> bool:
+        """Queue a file for download unless it is done or already in flight. Waits while the pipeline is full."""
+        if remote_path in self.processed or remote_path in self.pending:
+            return False
+        failure = self.failures.get(remote_path)
+        if failure is not None and time.monotonic() < failure[1]:
+            return False
+        self.pending.add(remote_path)
+        await self.queues[0].put(FileJob(remote_path))
+        return True
+
+    async def _worker(self, name: str, handler, inbox: asyncio.Queue, outbox: Optional[asyncio.Queue]) -> None:
+        while True:
+            job: FileJob = await inbox.get()
+            forwarded = False
+            try:
+                start = time.perf_counter()
+                keep_going = await handler(job)
+                job.timings[name] = time.perf_counter() - start
+                if keep_going and outbox is not None:
+                    await outbox.put(job)
+                    forwarded = True
+                elif keep_going:
+                    job.log_latency("done")
+                else:
+                    job.log_latency(f"finished after {name}")
+                if not forwarded:
+                    self.failures.pop(job.remote_path, None)
+            except Exception as e:
+                logger.error(f"❌ Error in {name} stage for {job.filename}: {e}", exc_info=True)
+                job.log_latency(f"failed in {name}")
+                self._record_failure(job)
+            finally:
+                if not forwarded:
+                    # Left the pipeline: done, or failed and retried on a later poll after a backoff
+                    self.pending.discard(job.remote_path)
+                inbox.task_done()
+
+    def _record_failure(self, job: FileJob) -> None:
+        """Back off before the next attempt at a failed file, or give up on it after WATCHER_MAX_ATTEMPTS"""
+        if job.remote_path in self.processed:
+            # Failed after it was persisted (e.g. broadcasting): nothing to retry
+            return
+        attempts = self.failures.get(job.remote_path, (0, 0.0))[0] + 1
+        if attempts >= settings.WATCHER_MAX_ATTEMPTS:
+            self.failures.pop(job.remote_path, None)
+            self.processed.add(job.remote_path)
+            logger.error(f"❌ Giving up on {job.filename} after {attempts} failed attempts; marked processed")
+            return
+        delay = settings.WATCHER_RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1)
+        self.failures[job.remote_path] = (attempts, time.monotonic() + delay)
+        logger.warning(f"⚠️ {job.filename} failed (attempt {attempts}/{settings.WATCHER_MAX_ATTEMPTS}); retrying in {delay}s")
+
+    async def download(self, job: FileJob) -> bool:
+        logger.info(f"🔄 Processing new file: {job.filename}")
+        job.data = await self.sftp.fetch(job.remote_path)
+        logger.info(f"📥 Downloaded {len(job.data)} bytes from {job.filename}")
+
+        job.digest = self.cache.digest(job.data)
+        cached = await asyncio.to_thread(self.cache.get, job.digest)
+        if cached is not None and cached.ingested:
+            # Same bytes already ingested (other mirror, failover or fallback directory)
+            logger.info(f"♻️ Skipping {job.filename}: identical to already ingested {cached.meta.get('filename')}")
+            self.processed.add(job.remote_path)
+            return False
+        if cached is not None:
+            job.records = cached.records
+            logger.info(f"♻️ Reusing {len(job.records)} cached records for {job.filename}")
+        return True
+
+    async def parse(self, job: FileJob) -> bool:
+        if job.records is None:
+            # Parse in a worker process so the event loop keeps serving API and WebSocket clients
+            job.records, job.stats = await parse_off_loop(job.data, job.filename)
+            logger.info(f"✅ Parsed {len(job.records)} records from {job.filename}")
+            await asyncio.to_thread(self.cache.put, job.digest, job.records, job.file_type, job.filename)
+        job.data = None
+
+        if job.stats is not None:
+            logger.info(f"📐 Layout stats for {job.filename}: {job.stats.to_dict()}")
+            if job.stats.unknown_header is not None:
+                logger.warning(f"⚠️ Unknown record header {job.stats.unknown_header} in {job.filename}; decoding stopped there")
+
+        if not len(job.records):
+            logger.warning(f"⚠️ No records found in {job.filename} — marked processed")
+            await asyncio.to_thread(self.cache.mark_ingested, job.digest)
+            self.processed.add(job.remote_path)
+            return False
+        return True
+
+    async def persist(self, job: FileJob) -> bool:
+        records, file_type = job.records, job.file_type
+        batch_size = settings.SNAPSHOT_BATCH_SIZE
+        for start in range(0, len(records), batch_size):
+            batch = records[start:start + batch_size]
+            logger.info(f"💾 Saving {len(batch)} records to database as {file_type}")
+            await save_to_db(batch, file_type)
+            job.total_records += len(batch)
+
+        if self.archive is not None:
+            trading_day = trading_day_from_path(job.remote_path) or datetime.now().date()
+            try:
+                archived = await asyncio.to_thread(self.archive.append, trading_day, file_type, records)
+                logger.info(f"🗄️ Archived {len(records)} {file_type} records for {trading_day} ({archived} total)")
+            except Exception as e:
+                logger.error(f"❌ Failed to archive {job.filename}: {e}", exc_info=True)
+
+        await asyncio.to_thread(self.cache.mark_ingested, job.digest)
+        # Only now is the file done; a failure above leaves it to be retried (saved with the cycle's other markers)
+        self.processed.add(job.remote_path)
+        logger.info(f"🎉 Successfully processed {job.filename} with {job.total_records} records")
+        return True
+
+    async def broadcast(self, job: FileJob) -> bool:
+        records = job.records
+        batch_size = settings.SNAPSHOT_BATCH_SIZE
+        for start in range(0, len(records), batch_size):
+            batch = records[start:start + batch_size]
+            logger.info(f"📡 Broadcasting {len(batch)} records to WebSocket clients")
+            await publish_data(batch)
+        job.records = None
+        return True
+
 
 async def start_sftp_watcher() -> None:
     # Ensure database is ready
     await init_db()
 
-    sftp = SFTPClient()
-    processed: Set[str] = await load_processed()
+    # Sessions to every mirror; downloads are spread across them and raced when one is slow
+    sftp = SFTPFetchPool()
+    cache = SnapshotCache()
+    archive = SnapshotArchive() if settings.SNAPSHOT_ARCHIVE_ENABLED else None
+    processed = ProcessedFiles()
+    await processed.load(datetime.now().date())
 
     try:
         await asyncio.to_thread(sftp.connect)
@@ -48,83 +313,50 @@ async def start_sftp_watcher() -> None:
         logger.error(f"Initial SFTP connection failed: {e}", exc_info=True)
         return
 
-    while True:
-        # Build today's and fallback path
-        today = datetime.now().strftime("%B%d%Y")  # e.g. July112025
-        base_path = f"{settings.SFTP_REMOTE_PATH}/DATA/{today}"
-        logger.info(f"Checking for files in {base_path}")
-
-        try:
-            remote_files = await asyncio.to_thread(sftp.list_files, base_path)
-        except Exception:
-            yesterday = (datetime.now() - timedelta(days=1)).strftime("%B%d%Y")
-            fallback = f"{settings.SFTP_REMOTE_PATH}/DATA/{yesterday}"
-            try:
-                remote_files = await asyncio.to_thread(sftp.list_files, fallback)
-                logger.info(f"Using fallback directory: {fallback}")
-            except Exception as e:
-                logger.error(f"Could not access any directory: {e}")
-                remote_files = []
+    pipeline = WatcherPipeline(sftp, cache, archive, processed)
+    pipeline.start()
+    try:
+        while True:
+            # Build today's and fallback path
+            today = datetime.now().strftime("%B%d%Y")  # e.g. July112025
+            base_path = f"{settings.SFTP_REMOTE_PATH}/DATA/{today}"
+            logger.info(f"Checking for files in {base_path}")
 
-        processed_count = 0
+            try:
+                remote_files = await asyncio.to_thread(sftp.list_files, base_path)
+            except Exception:
+                yesterday = (datetime.now() - timedelta(days=1)).strftime("%B%d%Y")
+                fallback = f"{settings.SFTP_REMOTE_PATH}/DATA/{yesterday}"
+                try:
+                    remote_files = await asyncio.to_thread(sftp.list_files, fallback)
+                    logger.info(f"Using fallback directory: {fallback}")
+                except Exception as e:
+                    logger.error(f"Could not access any directory: {e}")
+                    remote_files = []
 
-        for remote_path in remote_files:
-            if remote_path in processed:
-                logger.debug(f"Skipping already processed file: {remote_path}")
-                continue
+            queued_count = 0
 
-            lower = remote_path.lower()
-            # Only interested in mkt, ind, ca2
-            if not lower.endswith(('.mkt.gz', '.ind.gz', '.ca2.gz')):
-                # mark as processed so it's never retried
-                await mark_processed(remote_path)
-                processed.add(remote_path)
-                continue
+            for remote_path in remote_files:
+                if remote_path in processed:
+                    logger.debug(f"Skipping already processed file: {remote_path}")
+                    continue
 
-            filename = os.path.basename(remote_path)
-            try:
-                logger.info(f"🔄 Processing new file: {filename}")
-                data = await asyncio.to_thread(sftp.download_file, remote_path)
-                logger.info(f"📥 Downloaded {len(data)} bytes from {filename}")
-
-                # Write to temp file
-                with tempfile.NamedTemporaryFile(delete=False, suffix=f"_{filename}") as tmp:
-                    tmp.write(data)
-                    tmp_path = tmp.name
-
-                # Parse
-                records = parse_snapshot(tmp_path)
-                os.remove(tmp_path)
-                logger.info(f"✅ Parsed {len(records)} records from {filename}")
-
-                # Always mark processed to avoid re-download
-                await mark_processed(remote_path)
-                processed.add(remote_path)
-
-                if records:
-                    # Determine file_type
-                    if lower.endswith('.mkt.gz'):
-                        file_type = 'mkt'
-                    elif lower.endswith('.ind.gz'):
-                        file_type = 'ind'
-                    else:
-                        file_type = 'ca2'
-
-                    logger.info(f"💾 Saving {len(records)} records to database as {file_type}")
-                    await save_to_db(records, file_type)
-
-                    logger.info(f"📡 Broadcasting {len(records)} records to WebSocket clients")
-                    await publish_data(records)
-
-                    logger.info(f"🎉 Successfully processed {filename} with {len(records)} records")
-                else:
-                    logger.warning(f"⚠️ No records found in {filename} — marked processed")
+                # Only interested in mkt, ind, ca2
+                if snapshot_type(remote_path) is None:
+                    # mark as processed so it's never retried
+                    processed.add(remote_path)
+                    continue
 
-                processed_count += 1
+                if await pipeline.submit(remote_path):
+                    queued_count += 1
 
-            except Exception as e:
-                logger.error(f"❌ Error processing {filename}: {e}", exc_info=True)
+            # Markers from this cycle (skipped files and files finished since the last flush) in one transaction
+            await processed.flush()
+            processed.prune(datetime.now().date())
 
-        logger.info(f"🔄 Cycle complete: {processed_count} new files processed. Total processed: {len(processed)}")
-        logger.info(f"😴 Sleeping for {settings.POLL_INTERVAL_SECONDS} seconds")
-        await asyncio.sleep(settings.POLL_INTERVAL_SECONDS)
+            logger.info(f"🔄 Cycle complete: {queued_count} new files queued. Processed (today and yesterday): {len(processed)}")
+            logger.info(f"😴 Sleeping for {settings.POLL_INTERVAL_SECONDS} seconds")
+            await asyncio.sleep(settings.POLL_INTERVAL_SECONDS)
+    finally:
+        await pipeline.stop()
+        await processed.flush()
@@ -0,0 +1,128 @@
+import os
+import threading
+from datetime import date, datetime
+from typing import List, Optional
+
+import numpy as np
+
+from config import settings
+from utils.parser import SNAPSHOT_DTYPES
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Fixed-size .npy header (format version 2.0) so the record count can be rewritten in place
+ARCHIVE_HEADER_SIZE = 4096
+_NPY_MAGIC = b"\x93NUMPY\x02\x00"
+_NPY_PREAMBLE_SIZE = len(_NPY_MAGIC) + 4
+
+
+def trading_day_from_path(remote_path: str) -> Optional[date]:
+    """
+    Trading day of a snapshot file, taken from its remote directory name
+    (e.g. /CM30/DATA/July112025/file.mkt.gz -> 2025-07-11). None if the
+    directory name is not a date.
+    """
+    day_dir = os.path.basename(os.path.dirname(remote_path))
+    try:
+        return datetime.strptime(day_dir, "%B%d%Y").date()
+    except ValueError:
+        return None
+
+
+def _encode_header(dtype: np.dtype, count: int) -> bytes:
+    header = repr({
+        "descr": np.lib.format.dtype_to_descr(dtype),
+        "fortran_order": False,
+        "shape": (count,),
+    })
+    body_size = ARCHIVE_HEADER_SIZE - _NPY_PREAMBLE_SIZE
+    if len(header) + 1 > body_size:
+        raise ValueError(f"Archive header for {dtype} does not fit in {ARCHIVE_HEADER_SIZE} bytes")
+    body = header.ljust(body_size - 1).encode("latin1") + b"\n"
+    return _NPY_MAGIC + body_size.to_bytes(4, "little") + body
+
+
+def _read_count(f, dtype: np.dtype) -> int:
+    f.seek(0)
+    preamble = f.read(_NPY_PREAMBLE_SIZE)
+    if preamble[:len(_NPY_MAGIC)] != _NPY_MAGIC or int.from_bytes(preamble[-4:], "little") != ARCHIVE_HEADER_SIZE - _NPY_PREAMBLE_SIZE:
+        raise ValueError(f"{f.name} is not a snapshot archive file")
+    f.seek(0)
+    np.lib.format.read_magic(f)
+    shape, _, file_dtype = np.lib.format.read_array_header_2_0(f)
+    if file_dtype != dtype:
+        raise ValueError(f"{f.name} holds {file_dtype}, expected {dtype}")
+    return shape[0]
+
+
+class SnapshotArchive:
+    """
+    Per-trading-day columnar archive of parsed snapshot records.
+
+    Every parsed file is appended to `<directory>/<YYYY-MM-DD>/<type>.npy`,
+    one file per snapshot type per day. The files are plain .npy arrays of
+    the parser dtypes, so a whole day can be memory-mapped with `load()`
+    for charts, backfills and reprocessing without touching Postgres.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or settings.SNAPSHOT_ARCHIVE_DIR
+        self._lock = threading.Lock()
+
+    def path_for(self, trading_day: date, file_type: str) -> str:
+        return os.path.join(self.directory, trading_day.isoformat(), f"{file_type}.npy")
+
+    def append(self, trading_day: date, file_type: str, records: np.ndarray) -> int:
+        """
+        Append `records` to the day's archive for `file_type`. Returns the
+        number of records in the archive afterwards.
+        """
+        dtype = SNAPSHOT_DTYPES[file_type]
+        records = np.ascontiguousarray(records, dtype=dtype)
+        path = self.path_for(trading_day, file_type)
+
+        with self._lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(_encode_header(dtype, 0))
+
+            with open(path, "r+b") as f:
+                count = _read_count(f, dtype)
+                # Seek past the counted records: bytes from an interrupted append are overwritten
+                f.seek(ARCHIVE_HEADER_SIZE + count * dtype.itemsize)
+                f.write(records.tobytes())
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+
+                count += len(records)
+                f.seek(0)
+                f.write(_encode_header(dtype, count))
+
+        return count
+
+    def load(self, trading_day: date, file_type: str, mmap: bool = True) -> np.ndarray:
+        """
+        Records archived for `trading_day`, memory-mapped read-only by default.
+        Returns an empty array if nothing was archived for that day.
+        """
+        path = self.path_for(trading_day, file_type)
+        if not os.path.exists(path):
+            return np.zeros(0, dtype=SNAPSHOT_DTYPES[file_type])
+        return np.load(path, mmap_mode="r" if mmap else None, allow_pickle=False)
+
+    def days(self) -> List[date]:
+        """
+        Trading days present in the archive, oldest first.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        days = []
+        for name in os.listdir(self.directory):
+            try:
+                days.append(date.fromisoformat(name))
+            except ValueError:
+                continue
+        return sorted(days)
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from config import settings
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class CacheEntry:
+    """
+    A cached parse result: the decoded records plus ingest status.
+    """
+
+    def __init__(self, digest: str, records: np.ndarray, meta: Dict[str, Any]):
+        self.digest = digest
+        self.records = records
+        self.meta = meta
+
+    @property
+    def ingested(self) -> bool:
+        return bool(self.meta.get("ingested"))
+
+
+class SnapshotCache:
+    """
+    Content-addressed on-disk cache of parsed snapshot files.
+
+    Keyed by the SHA-256 of the compressed bytes, so the same file fetched
+    from either SFTP mirror, or again after a failover, costs one hash
+    instead of a parse plus insert. Each entry is `<digest>.npy` (records)
+    and `<digest>.json` (metadata); the least recently used entries are
+    evicted once the directory exceeds `max_bytes`.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.directory = directory or settings.SNAPSHOT_CACHE_DIR
+        self.max_bytes = settings.SNAPSHOT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def _paths(self, digest: str):
+        base = os.path.join(self.directory, digest)
+        return f"{base}.npy", f"{base}.json"
+
+    def get(self, digest: str) -> Optional[CacheEntry]:
+        """
+        Return the cached entry for `digest`, or None. A hit refreshes its LRU position.
+        """
+        records_path, meta_path = self._paths(digest)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            records = np.load(records_path, allow_pickle=False)
+        except (OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning(f"Discarding unreadable cache entry {digest}: {e}")
+                self._remove(digest)
+            return None
+
+        now = time.time()
+        for path in (records_path, meta_path):
+            os.utime(path, (now, now))
+        return CacheEntry(digest, records, meta)
+
+    def put(self, digest: str, records: np.ndarray, file_type: str, filename: str = "") -> None:
+        """
+        Store parsed records for `digest` (not yet ingested), then evict if over budget.
+        """
+        records_path, _ = self._paths(digest)
+        tmp_path = f"{records_path}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.save(f, records, allow_pickle=False)
+            os.replace(tmp_path, records_path)
+
+            self._write_meta(digest, {
+                "file_type": file_type,
+                "filename": filename,
+                "records": len(records),
+                "ingested": False,
+                "cached_at": int(time.time()),
+            })
+            self._evict()
+        except OSError as e:
+            # The cache is an optimization: never fail ingest because of it
+            logger.warning(f"Could not cache parsed records for {filename or digest}: {e}")
+
+    def mark_ingested(self, digest: str) -> None:
+        """
+        Record that the entry's records were saved to the database.
+        """
+        _, meta_path = self._paths(digest)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        meta["ingested"] = True
+        meta["ingested_at"] = int(time.time())
+        try:
+            self._write_meta(digest, meta)
+        except OSError as e:
+            logger.warning(f"Could not mark cache entry {digest} as ingested: {e}")
+
+    def _write_meta(self, digest: str, meta: Dict[str, Any]) -> None:
+        _, meta_path = self._paths(digest)
+        tmp_path = f"{meta_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def _remove(self, digest: str) -> None:
+        for path in self._paths(digest):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _evict(self) -> None:
+        """
+        Drop least recently used entries until the cache fits in max_bytes.
+        """
+        entries: Dict[str, list] = {}
+        for entry in os.scandir(self.directory):
+            digest, ext = os.path.splitext(entry.name)
+            if ext not in (".npy", ".json"):
+                continue
+            stat = entry.stat()
+            size_mtime = entries.setdefault(digest, [0, 0.0])
+            size_mtime[0] += stat.st_size
+            size_mtime[1] = max(size_mtime[1], stat.st_mtime)
+
+        total = sum(size for size, _ in entries.values())
+        for digest, (size, _) in sorted(entries.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes:
+                break
+            self._remove(digest)
+            total -= size
+            logger.debug(f"Evicted snapshot cache entry {digest} ({size} bytes)")
@@ -0,0 +1,142 @@
+import asyncio
+import bisect
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import select
+
+from db.connection import AsyncSessionLocal
+from db.models import CMContractStreamInfo, CMTokenMaster
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Series preferred when a symbol trades in several (lower is better)
+SERIES_PRIORITY = {'EQ': 1, 'BE': 2}
+
+
+class SecurityInfo(NamedTuple):
+    token: int
+    symbol: str
+    series: str
+    company_name: str
+
+
+class ContractInfo(NamedTuple):
+    symbol: str
+    token: int
+    instrument_type: str
+
+
+class _RegistryData:
+    """
+    One immutable generation of the registry. Readers hold a reference to a
+    generation, so a reload never exposes a half-built index.
+    """
+
+    def __init__(self, securities: Iterable[SecurityInfo], contracts: Iterable[ContractInfo]):
+        self.by_symbol: Dict[str, List[SecurityInfo]] = {}
+        self.by_token: Dict[int, SecurityInfo] = {}
+        for security in securities:
+            self.by_symbol.setdefault(security.symbol, []).append(security)
+            self.by_token[security.token] = security
+        for entries in self.by_symbol.values():
+            entries.sort(key=lambda s: (SERIES_PRIORITY.get(s.series, 3), s.series))
+
+        # Contracts sorted by symbol: prefix lookups are a bisect, suggestions come out in symbol order
+        self.contracts: List[ContractInfo] = sorted(set(contracts), key=lambda c: (c.symbol.upper(), c.token))
+        self.contract_symbols: List[str] = [c.symbol.upper() for c in self.contracts]
+
+
+class SymbolRegistry:
+    """
+    Process-wide symbol/token lookups, loaded from cm_token_master and
+    cm_contract_stream_info so API handlers don't query them per request.
+    `reload()` builds a new generation and swaps it in atomically.
+    """
+
+    def __init__(self):
+        self._data = _RegistryData([], [])
+        self._loaded = False
+        self._lock = asyncio.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    async def reload(self) -> None:
+        async with self._lock:
+            async with AsyncSessionLocal() as session:
+                tokens = await session.execute(select(
+                    CMTokenMaster.token_number, CMTokenMaster.symbol, CMTokenMaster.series, CMTokenMaster.company_name
+                ))
+                securities = [
+                    SecurityInfo(token, symbol, series, (company_name or '').strip())
+                    for token, symbol, series, company_name in tokens
+                ]
+                contract_rows = await session.execute(select(
+                    CMContractStreamInfo.symbol, CMContractStreamInfo.symbol_token, CMContractStreamInfo.instrument_type
+                ).distinct())
+                contracts = [ContractInfo(symbol, token, instrument_type) for symbol, token, instrument_type in contract_rows]
+
+            self._data = _RegistryData(securities, contracts)
+            self._loaded = True
+            logger.info(f"📇 Symbol registry loaded: {len(self._data.by_token)} tokens, {len(self._data.contracts)} contracts")
+
+    async def ensure_loaded(self) -> None:
+        if not self._loaded:
+            await self.reload()
+
+    def resolve(self, symbols: Iterable[str], series: Optional[str] = None) -> Dict[str, SecurityInfo]:
+        """
+        Best security per symbol: the given `series` only, otherwise EQ, then BE,
+        then any other series. Symbols without a match are left out.
+        """
+        by_symbol = self._data.by_symbol
+        resolved = {}
+        for symbol in symbols:
+            for security in by_symbol.get(symbol, ()):
+                if series is None or security.series == series:
+                    resolved[symbol] = security
+                    break
+        return resolved
+
+    def security(self, token: int) -> Optional[SecurityInfo]:
+        return self._data.by_token.get(token)
+
+    def match_contracts(self, term: str, limit: int = 10) -> List[ContractInfo]:
+        """
+        Contracts whose symbol contains `term` (case-insensitive): exact
+        matches first, then prefix matches, then the rest in symbol order.
+        """
+        data = self._data
+        term = term.upper()
+        start = bisect.bisect_left(data.contract_symbols, term)
+        prefixed = []
+        for i in range(start, len(data.contracts)):
+            if not data.contract_symbols[i].startswith(term):
+                break
+            prefixed.append(data.contracts[i])
+        prefixed.sort(key=lambda c: c.symbol.upper() != term)
+
+        matches = prefixed[:limit]
+        for symbol, contract in zip(data.contract_symbols, data.contracts):
+            if len(matches) >= limit:
+                break
+            if term in symbol and not symbol.startswith(term):
+                matches.append(contract)
+        return matches
+
+    def suggest(self, term: str, limit: int = 10) -> List[ContractInfo]:
+        """Contracts whose symbol contains `term`, in symbol order"""
+        data = self._data
+        term = term.upper()
+        suggestions = []
+        for symbol, contract in zip(data.contract_symbols, data.contracts):
+            if term in symbol:
+                suggestions.append(contract)
+                if len(suggestions) >= limit:
+                    break
+        return suggestions
+
+
+symbol_registry = SymbolRegistry()
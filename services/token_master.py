@@ -1,22 +1,89 @@
 import asyncio
 import os
-import tempfile
+import queue
+import threading
 from datetime import datetime, timedelta
 from typing import Set, List, Dict, Optional
 
-import pandas as pd
-from sqlalchemy import select, update, and_, delete
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import select, update, and_, delete, func
 
 from services.sftp_client import SFTPClient
+from services.symbol_registry import symbol_registry
 from config import settings
 from utils.logger import get_logger
-from utils.security_format import SecuritiesConverter
+from utils.security_format import ScanStats, SecuritiesConverter, SecuritiesStreamDecoder, describe
+from db.bulk_load import copy_upsert, rows_from_dicts
 from db.connection import get_db, AsyncSessionLocal
 from db.models import CMTokenMaster
 
 logger = get_logger(__name__)
 
+# SFTP chunks buffered between the download and decode threads
+STREAM_QUEUE_CHUNKS = 4
+
+# Columns compared between Securities.dat and cm_token_master (last_updated is bookkeeping only)
+CONTENT_COLUMNS = (
+    'symbol', 'series', 'issued_capital', 'settlement_cycle', 'company_name',
+    'permitted_to_trade', 'data_length', 'settlement_cycle_desc', 'permitted_to_trade_desc',
+)
+UPSERT_COLUMNS = ('token_number',) + CONTENT_COLUMNS
+
+
+def content_hash(row) -> int:
+    """In-process hash of a token master row's content columns (dict or mapping-like DB row)"""
+    return hash(tuple(row[column] for column in CONTENT_COLUMNS))
+
+
+class TokenMasterDelta:
+    """Rows to write for one token master refresh"""
+
+    def __init__(self):
+        self.inserts: List[Dict] = []
+        self.updates: List[Dict] = []
+        self.delistings: List[int] = []
+        self.unchanged = 0
+        self.delistings_skipped = False
+
+    @property
+    def size(self) -> int:
+        return len(self.inserts) + len(self.updates) + (0 if self.delistings_skipped else len(self.delistings))
+
+    def to_dict(self) -> Dict:
+        return {
+            'inserted': len(self.inserts),
+            'updated': len(self.updates),
+            'delisted': 0 if self.delistings_skipped else len(self.delistings),
+            'delistings_skipped': len(self.delistings) if self.delistings_skipped else 0,
+            'unchanged': self.unchanged,
+        }
+
+
+def compute_delta(securities: List[Dict], current: Dict[int, int], max_delist_ratio: float) -> TokenMasterDelta:
+    """
+    Compare decoded securities with the current {token_number: content_hash}
+    of cm_token_master. Delistings are skipped when they exceed
+    `max_delist_ratio` of the current table, which usually means a truncated
+    or partial Securities.dat rather than a mass delisting.
+    """
+    delta = TokenMasterDelta()
+    seen = set()
+    for security in securities:
+        token = security['token_number']
+        seen.add(token)
+        existing = current.get(token)
+        if existing is None:
+            delta.inserts.append(security)
+        elif existing != content_hash(security):
+            delta.updates.append(security)
+        else:
+            delta.unchanged += 1
+
+    delta.delistings = [token for token in current if token not in seen]
+    if current and len(delta.delistings) > max_delist_ratio * len(current):
+        delta.delistings_skipped = True
+    return delta
+
+
 class TokenMasterProcessor:
     """Process Securities.dat files and update database"""
 
@@ -25,136 +92,181 @@ class TokenMasterProcessor:
         self.sftp = SFTPClient()
         self.processed_files: Set[str] = set()
 
-    async def save_securities_to_db(self, securities: List[Dict], update_date: str) -> int:
+    async def load_content_hashes(self, session) -> Dict[int, int]:
+        """Current {token_number: content_hash} of cm_token_master"""
+        columns = [getattr(CMTokenMaster, column) for column in CONTENT_COLUMNS]
+        result = await session.execute(select(CMTokenMaster.token_number, *columns))
+        return {row.token_number: content_hash(row._mapping) for row in result}
+
+    async def latest_applied_date(self) -> Optional[str]:
+        """Newest last_updated (YYYY-MM-DD) in cm_token_master, None if the table is empty"""
+        async with AsyncSessionLocal() as session:
+            return await session.scalar(select(func.max(CMTokenMaster.last_updated)))
+
+    async def save_securities_to_db(self, securities: List[Dict], update_date: str) -> Optional[TokenMasterDelta]:
         """
-        Save/Update securities data in database with UPSERT logic
-        Returns number of records processed
+        Apply a Securities.dat to cm_token_master, writing only the delta:
+        new tokens are inserted, changed rows updated and tokens missing from
+        the file deleted. `securities` are decoded cm_token_master rows
+        (see SecuritiesConverter.decode_records).
+        Returns the applied delta, or None on error
         """
+        securities = [s for s in securities if "NSETEST" not in s['symbol'].upper()]
         if not securities:
             logger.warning("No securities data to save")
-            return 0
-
-        processed_count = 0
+            return None
 
         try:
             async with AsyncSessionLocal() as session:
-                logger.info(f"Processing {len(securities)} securities for database update...")
+                current = await self.load_content_hashes(session)
+                delta = compute_delta(securities, current, settings.TOKEN_MASTER_MAX_DELIST_RATIO)
+                logger.info(f"📊 Token master delta vs {len(current)} current rows: {delta.to_dict()}")
+
+                if delta.delistings_skipped:
+                    logger.warning(
+                        f"⚠️ {len(delta.delistings)} of {len(current)} tokens missing from the new file "
+                        f"(> {settings.TOKEN_MASTER_MAX_DELIST_RATIO:.0%}); not deleting them"
+                    )
+
+                changed = delta.inserts + delta.updates
+                await copy_upsert(
+                    session, CMTokenMaster,
+                    rows_from_dicts(changed, UPSERT_COLUMNS),
+                    columns=UPSERT_COLUMNS,
+                    conflict_columns=['token_number'],
+                    update_columns=CONTENT_COLUMNS + ('last_updated',),
+                    constants={'last_updated': update_date},
+                )
 
                 batch_size = 1000
-                total_batches = (len(securities) + batch_size - 1) // batch_size
-
-                for batch_num in range(total_batches):
-                    start_idx = batch_num * batch_size
-                    end_idx = min(start_idx + batch_size, len(securities))
-                    batch = securities[start_idx:end_idx]
-
-                    upsert_data = []
-                    for security in batch:
-                        if "NSETEST" in security.get('symbol', '').upper():
-                            continue
-
-                        record_data = {
-                            'token_number': security['token_number'],
-                            'symbol': security['symbol'],
-                            'series': security['series'],
-                            'issued_capital': float(security.get('issued_capital', 0)),
-                            'settlement_cycle': int(security.get('settlement_cycle', 1)),
-                            'company_name': security.get('company_name', ''),
-                            'permitted_to_trade': int(security.get('permitted_to_trade', 1)),
-                            'data_length': int(security.get('data_length', 0)),
-                            'settlement_cycle_desc': 'T+0' if security.get('settlement_cycle', 1) == 0 else 'T+1',
-                            'permitted_to_trade_desc': self._get_permitted_desc(security.get('permitted_to_trade', 1)),
-                            'last_updated': update_date
-                        }
-                        upsert_data.append(record_data)
-
-                    if upsert_data:
-                        stmt = insert(CMTokenMaster).values(upsert_data)
-                        upsert_stmt = stmt.on_conflict_do_update(
-                            index_elements=['token_number'],
-                            set_={
-                                'symbol': stmt.excluded.symbol,
-                                'series': stmt.excluded.series,
-                                'issued_capital': stmt.excluded.issued_capital,
-                                'settlement_cycle': stmt.excluded.settlement_cycle,
-                                'company_name': stmt.excluded.company_name,
-                                'permitted_to_trade': stmt.excluded.permitted_to_trade,
-                                'data_length': stmt.excluded.data_length,
-                                'settlement_cycle_desc': stmt.excluded.settlement_cycle_desc,
-                                'permitted_to_trade_desc': stmt.excluded.permitted_to_trade_desc,
-                                'last_updated': stmt.excluded.last_updated
-                            }
-                        )
-                        await session.execute(upsert_stmt)
-                        processed_count += len(upsert_data)
-                        logger.info(f"Batch {batch_num + 1}/{total_batches}: Processed {len(upsert_data)} records")
+                if not delta.delistings_skipped:
+                    for start in range(0, len(delta.delistings), batch_size):
+                        batch = delta.delistings[start:start + batch_size]
+                        await session.execute(delete(CMTokenMaster).where(CMTokenMaster.token_number.in_(batch)))
 
                 await session.commit()
-                logger.info(f"✅ Successfully processed {processed_count} securities in database")
-                return processed_count
+                logger.info(f"✅ Token master refreshed: {delta.size} rows written, {delta.unchanged} unchanged")
+                return delta
 
         except Exception as e:
             logger.error(f"❌ Error saving securities to database: {e}", exc_info=True)
-            return 0
-
-    def _get_permitted_desc(self, permitted_code: int) -> str:
-        """Get description for permitted to trade code"""
-        mapping = {
-            0: 'Listed but not permitted to trade',
-            1: 'Permitted to trade',
-            2: 'BSE listed (BSE exclusive security)'
-        }
-        return mapping.get(permitted_code, 'Unknown')
+            return None
+
+    def export_csv(self, securities: List[Dict], file_date: str) -> None:
+        """Optional side output: write the decoded securities to TOKEN_MASTER_CSV_DIR"""
+        try:
+            os.makedirs(settings.TOKEN_MASTER_CSV_DIR, exist_ok=True)
+            csv_path = os.path.join(settings.TOKEN_MASTER_CSV_DIR, f"{file_date}_Securities.csv")
+            self.converter.write_csv(securities, csv_path)
+            logger.info(f"📝 Exported {len(securities)} securities → {csv_path}")
+        except OSError as e:
+            logger.warning(f"⚠️ CSV export failed: {e}")
 
     async def process_securities_file(self, file_path: str, file_date: str) -> bool:
-        """Process a single Securities.dat file"""
+        """Process a single local Securities.dat file"""
         try:
             logger.info(f"🔄 Processing Securities file: {file_path}")
 
-            df = await asyncio.to_thread(
-                self.converter.convert_to_csv,
-                file_path,
-                file_path.replace('.dat', '.csv')
-            )
-            if df is None or df.empty:
-                logger.warning("No data extracted from Securities file")
-                return False
-
-            securities = df.to_dict('records')
-            saved_count = await self.save_securities_to_db(securities, file_date)
-
-            if saved_count > 0:
-                logger.info(f"✅ Successfully processed {saved_count} securities from {os.path.basename(file_path)}")
-                return True
-            else:
-                logger.error(f"❌ Failed to save securities from {os.path.basename(file_path)}")
-                return False
+            stats = ScanStats()
+            securities = await asyncio.to_thread(self.converter.extract_securities, file_path, stats)
+            logger.info(f"📊 Securities scan: {stats.to_dict()}")
+            return await self.apply_securities(securities, file_date, os.path.basename(file_path))
 
         except Exception as e:
             logger.error(f"❌ Error processing securities file {file_path}: {e}", exc_info=True)
             return False
 
-    async def download_and_process_file(self, remote_path: str, local_dir: str, file_date: str) -> bool:
-        """Download file from SFTP and process it"""
-        try:
-            filename = os.path.basename(remote_path)
-            local_path = os.path.join(local_dir, f"{file_date}_{filename}")
+    async def apply_securities(self, securities: List[Dict], file_date: str, source: str) -> bool:
+        """Export (optional), save the delta and refresh the symbol registry"""
+        if not securities:
+            logger.warning("No data extracted from Securities file")
+            return False
 
-            logger.info(f"📥 Downloading {remote_path} → {local_path}")
-            file_data = await asyncio.to_thread(self.sftp.download_file, remote_path)
+        if settings.TOKEN_MASTER_CSV_DIR:
+            await asyncio.to_thread(self.export_csv, securities, file_date)
 
-            with open(local_path, 'wb') as f:
-                f.write(file_data)
-            logger.info(f"✅ Downloaded {len(file_data):,} bytes")
+        delta = await self.save_securities_to_db(securities, file_date)
 
-            success = await self.process_securities_file(local_path, file_date)
+        if delta is not None:
+            logger.info(f"✅ Successfully processed {len(securities)} securities from {source} (delta {delta.size})")
+            if delta.size and symbol_registry.loaded:
+                # Swap in the refreshed symbol/token maps for this process's API handlers
+                try:
+                    await symbol_registry.reload()
+                except Exception as e:
+                    logger.warning(f"⚠️ Symbol registry reload failed: {e}")
+            return True
+        else:
+            logger.error(f"❌ Failed to save securities from {source}")
+            return False
+
+    def stream_and_decode(self, remote_path: str, stats: ScanStats) -> List[Dict]:
+        """
+        Decode a remote Securities.dat while it downloads: a reader thread
+        pulls SFTP chunks into a small bounded queue and this thread feeds
+        them to the incremental decoder, so only a few chunks are buffered.
+        """
+        decoder = SecuritiesStreamDecoder(self.converter, stats)
+        chunks: queue.Queue = queue.Queue(maxsize=STREAM_QUEUE_CHUNKS)
+        done = threading.Event()
+
+        def put(item) -> bool:
+            """Queue `item` unless the decode thread has stopped; False if it has"""
+            while not done.is_set():
+                try:
+                    chunks.put(item, timeout=1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
 
+        def read_chunks():
+            stream = self.sftp.iter_file(remote_path)
             try:
-                os.unlink(local_path)
-            except:
-                pass
+                for chunk in stream:
+                    if not put(chunk):
+                        return
+                put(None)
+            except Exception as e:
+                put(e)
+            finally:
+                # Closes the remote file even when the decode thread gave up early
+                stream.close()
+
+        reader = threading.Thread(target=read_chunks, name="securities-reader", daemon=True)
+        reader.start()
+        securities = []
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is None:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                securities.extend(decoder.feed(chunk))
+            securities.extend(decoder.close())
+        finally:
+            done.set()
+            reader.join(timeout=5)
+        return securities
+
+    async def download_and_process_file(self, remote_path: str, file_date: str) -> bool:
+        """Stream a Securities.dat from SFTP through the decoder and process it"""
+        try:
+            filename = os.path.basename(remote_path)
+            logger.info(f"📥 Streaming {remote_path} into the decoder")
 
-            return success
+            stats = ScanStats()
+            securities = await asyncio.to_thread(self.stream_and_decode, remote_path, stats)
+            logger.info(f"📊 Securities scan: {stats.to_dict()}")
+
+            if not securities:
+                # Headerless fallback needs the whole file
+                logger.warning(f"⚠️ No records decoded from {filename}; retrying with headerless parsing")
+                file_data = await asyncio.to_thread(self.sftp.download_file, remote_path)
+                securities = [describe(s) for s in self.converter.parse_without_headers(file_data)]
+
+            return await self.apply_securities(securities, file_date, filename)
 
         except Exception as e:
             logger.error(f"❌ Error downloading/processing {remote_path}: {e}", exc_info=True)
@@ -169,7 +281,7 @@ class SFTPTokenMasterWatcher:
         self.processed_files: Set[str] = set()
 
     def get_target_dates(self) -> List[tuple]:
-        """Get list of target dates to check"""
+        """Get list of target dates to check, newest first"""
         today = datetime.now()
         yesterday = today - timedelta(days=1)
 
@@ -181,55 +293,66 @@ class SFTPTokenMasterWatcher:
         return dates
 
     async def scan_and_process_securities(self) -> None:
-        """Scan SFTP directories for Securities.dat files"""
+        """
+        Apply the newest Securities.dat on SFTP. Target dates are tried newest
+        first and the scan stops at the first file applied: the delta deletes
+        tokens missing from the file, so applying an older file afterwards
+        would revert newer listings and updates. Files older than the
+        token master's last update are skipped for the same reason.
+        """
         try:
             await asyncio.to_thread(self.processor.sftp.connect)
             logger.info("🔗 SFTP connection established")
 
             target_dates = self.get_target_dates()
+            latest_applied = await self.processor.latest_applied_date()
             files_processed = 0
-            temp_dir = tempfile.mkdtemp(prefix="securities_")
-
-            try:
-                for date_str, iso_date in target_dates:
-                    remote_dir = f"{settings.SFTP_REMOTE_PATH}/SECURITY/{date_str}"
-                    try:
-                        logger.info(f"🔍 Scanning directory: {remote_dir}")
-                        files = await asyncio.to_thread(self.processor.sftp.list_files, remote_dir)
-
-                        securities_files = [
-                            f for f in files
-                            if os.path.basename(f).lower() == 'securities.dat'
-                        ]
-                        logger.info(f"📁 Found {len(securities_files)} Securities.dat files in {date_str}")
-
-                        for file_path in securities_files:
-                            file_key = f"{date_str}:{os.path.basename(file_path)}"
-                            if file_key not in self.processed_files:
-                                logger.info(f"🆕 Processing new file: {os.path.basename(file_path)}")
-                                success = await self.processor.download_and_process_file(
-                                    file_path, temp_dir, iso_date
-                                )
-                                if success:
-                                    self.processed_files.add(file_key)
-                                    files_processed += 1
-                                    logger.info(f"✅ Successfully processed {os.path.basename(file_path)}")
-                                else:
-                                    logger.error(f"❌ Failed to process {os.path.basename(file_path)}")
+            applied = False
+
+            for date_str, iso_date in target_dates:
+                if applied:
+                    break
+                if latest_applied and iso_date < latest_applied:
+                    logger.info(f"⏭️ Skipping {date_str}: token master already updated from {latest_applied}")
+                    continue
+
+                remote_dir = f"{settings.SFTP_REMOTE_PATH}/SECURITY/{date_str}"
+                try:
+                    logger.info(f"🔍 Scanning directory: {remote_dir}")
+                    files = await asyncio.to_thread(self.processor.sftp.list_files, remote_dir)
+
+                    securities_files = [
+                        f for f in files
+                        if os.path.basename(f).lower() == 'securities.dat'
+                    ]
+                    logger.info(f"📁 Found {len(securities_files)} Securities.dat files in {date_str}")
+
+                    for file_path in securities_files:
+                        file_key = f"{date_str}:{os.path.basename(file_path)}"
+                        if file_key not in self.processed_files:
+                            logger.info(f"🆕 Processing new file: {os.path.basename(file_path)}")
+                            success = await self.processor.download_and_process_file(file_path, iso_date)
+                            if success:
+                                self.processed_files.add(file_key)
+                                files_processed += 1
+                                applied = True
+                                logger.info(f"✅ Successfully processed {os.path.basename(file_path)}")
+                                break
                             else:
-                                logger.debug(f"⏭️ Skipping already processed: {os.path.basename(file_path)}")
-
-                    except Exception as e:
-                        logger.error(f"❌ Error scanning {remote_dir}: {e}")
-                        continue
-
-                if files_processed > 0:
-                    logger.info(f"🎉 Successfully processed {files_processed} new Securities files")
-                else:
-                    logger.info("ℹ️ No new Securities files found")
-            finally:
-                import shutil
-                shutil.rmtree(temp_dir, ignore_errors=True)
+                                logger.error(f"❌ Failed to process {os.path.basename(file_path)}")
+                        else:
+                            applied = True
+                            logger.debug(f"⏭️ Skipping already processed: {os.path.basename(file_path)}")
+                            break
+
+                except Exception as e:
+                    logger.error(f"❌ Error scanning {remote_dir}: {e}")
+                    continue
+
+            if files_processed > 0:
+                logger.info(f"🎉 Successfully processed {files_processed} new Securities files")
+            else:
+                logger.info("ℹ️ No new Securities files found")
 
         except Exception as e:
             logger.error(f"❌ Error in scan_and_process_securities: {e}", exc_info=True)
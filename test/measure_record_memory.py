@@ -0,0 +1,50 @@
+import gzip
+import struct
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.parser import parse_snapshot_bytes, to_dicts
+from utils.records import as_records
+
+MKT_FORMAT = "<HIH IIQIQIQIIIIIIIIIQI"
+
+
+def build_mkt_file(tokens: int) -> bytes:
+    rows = [
+        struct.pack(MKT_FORMAT, 5, 1752200000, 96, token, *([150000] * 17))
+        for token in range(1, tokens + 1)
+    ]
+    return gzip.compress(b"".join(rows))
+
+
+def measure(label, func):
+    """Report retained memory, peak memory and live allocations of func()'s result"""
+    tracemalloc.start()
+    before = len(tracemalloc.take_snapshot().traces)
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    allocations = len(tracemalloc.take_snapshot().traces) - before
+    tracemalloc.stop()
+    print(f"{label:<28} {current / 1024:>9.1f} KiB retained {peak / 1024:>9.1f} KiB peak "
+          f"{allocations:>8} allocations {elapsed * 1000:>7.1f} ms")
+    return result
+
+
+def main(tokens: int = 3000):
+    data = build_mkt_file(tokens)
+    print(f"📊 Full .mkt file with {tokens} tokens ({len(data)} compressed bytes)\n")
+
+    records = parse_snapshot_bytes(data, "sample.mkt.gz")
+    measure("dict per row (before)", lambda: to_dicts(records))
+    measure("slotted MktRecord rows", lambda: as_records(records))
+    measure("structured array (parser)", lambda: parse_snapshot_bytes(data, "sample.mkt.gz"))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3000)
@@ -0,0 +1,43 @@
+from datetime import date, datetime, timezone
+
+import numpy as np
+
+from db.partitions import trading_day, trading_day_bounds
+from services.data_ingest import archived_day_records
+from services.snapshot_archive import SnapshotArchive
+from utils.parser import MKT_DTYPE, to_feed_seconds
+
+DAY = date(2025, 7, 11)
+
+
+def make_mkt(tokens, timestamps) -> np.ndarray:
+    records = np.zeros(len(tokens), dtype=MKT_DTYPE)
+    records["transcode"] = 5
+    records["security_token"] = tokens
+    records["timestamp"] = timestamps
+    return records
+
+
+def test_trading_day_uses_feed_epoch():
+    # Header of test/cm_contract_stream_info.csv: 2025-07-04 20:57:03 UTC in feed seconds
+    assert trading_day(1436129823) == date(2025, 7, 5)
+    start, end = trading_day_bounds(DAY)
+    assert start == to_feed_seconds(datetime(2025, 7, 10, 18, 30, tzinfo=timezone.utc))
+    assert trading_day(start) == DAY and trading_day(end - 1) == DAY and trading_day(end) != DAY
+
+
+def test_replay_loads_feed_epoch_archive(tmp_path):
+    archive = SnapshotArchive(str(tmp_path))
+    session_open = to_feed_seconds(datetime(2025, 7, 11, 3, 45, tzinfo=timezone.utc))  # 09:15 IST
+    archive.append(DAY, "mkt", make_mkt([22, 1594, 22], [session_open, session_open, session_open]))
+    archive.append(DAY, "mkt", make_mkt([22, 22], [session_open + 60, trading_day_bounds(DAY)[1]]))
+
+    records = archived_day_records(archive, DAY, "mkt")
+
+    assert sorted(zip(records["security_token"].tolist(), records["timestamp"].tolist())) == [
+        (22, session_open), (22, session_open + 60), (1594, session_open),
+    ]
+
+
+def test_replay_nothing_archived(tmp_path):
+    assert len(archived_day_records(SnapshotArchive(str(tmp_path)), DAY, "mkt")) == 0
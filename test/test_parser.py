@@ -0,0 +1,248 @@
+import gzip
+import struct
+
+import pytest
+
+from utils.parser import (
+    LayoutStats,
+    decode_snapshot,
+    parse_ca2,
+    parse_ind,
+    parse_mkt,
+    parse_snapshot,
+    parse_snapshot_buffer,
+    parse_snapshot_bytes,
+    latest_per_key,
+    parse_snapshot_iter,
+    to_dicts,
+    unique_records,
+)
+
+MKT_FORMAT = "<HIH IIQIQIQIIIIIIIIIQI"  # header + INFO_DATA, 96 bytes
+IND_FORMAT = "<HIH 11I"  # header + INFO_DATA, 52 bytes
+CA2_FORMAT = "<HIH IIQIcQIcQQIIIIII 4x"  # header + INFO_DATA + reserved, 86 bytes
+
+
+def make_mkt_record(token: int, ltp: int = 150000, message_length: int = 96) -> bytes:
+    return struct.pack(
+        MKT_FORMAT, 5, 1752200000, message_length,
+        token, ltp, 1000, 149900, 500, 150100, 5000, 150000,
+        149000, 151000, 148000, 150000,
+        149500, 150500, 149000, 150000, 2000, 150200,
+    )
+
+
+def make_ind_record(token: int) -> bytes:
+    return struct.pack(IND_FORMAT, 6, 1752200000, 52, token, *range(100, 110))
+
+
+def make_ca2_record(token: int, buy_flag: bytes = b"Y", sell_flag: bytes = b"\x00") -> bytes:
+    return struct.pack(
+        CA2_FORMAT, 7, 1752200000, 86,
+        token, 150000, 1000, 149900, buy_flag, 500, 150100, sell_flag,
+        0, 7500, 0, 149500, 0, 0, 0, 148800,
+    )
+
+
+def write_gz(tmp_path, name: str, data: bytes) -> str:
+    path = tmp_path / name
+    path.write_bytes(gzip.compress(data))
+    return str(path)
+
+
+def test_parse_mkt_columnar(tmp_path):
+    path = write_gz(tmp_path, "a.mkt.gz", b"".join(make_mkt_record(t) for t in (22, 1594, 2885)))
+
+    records = parse_mkt(path)
+
+    assert len(records) == 3
+    assert records["security_token"].tolist() == [22, 1594, 2885]
+    assert records["best_buy_quantity"][0] == 1000
+    assert records["indicative_close_price"][2] == 150200
+
+
+def test_parse_mkt_short_records_zero_fill(tmp_path):
+    path = write_gz(tmp_path, "a.mkt.gz", b"".join(make_mkt_record(t, message_length=88)[:88] for t in range(1, 5)))
+
+    records = to_dicts(parse_mkt(path))
+
+    assert len(records) == 4
+    assert records[0]["interval_close_price"] == 150000
+    assert records[0]["interval_total_traded_quantity"] == 0
+    assert records[0]["indicative_close_price"] == 0
+
+
+def test_parse_snapshot_dispatch(tmp_path):
+    path = write_gz(tmp_path, "CM_20250711.mkt.gz", make_mkt_record(22))
+
+    assert to_dicts(parse_snapshot(path))[0]["security_token"] == 22
+    assert parse_snapshot(str(tmp_path / "unknown.bin")) == []
+
+
+def test_parse_ind_uses_model_column_names(tmp_path):
+    path = write_gz(tmp_path, "a.ind.gz", make_ind_record(26000) + make_ind_record(26009))
+
+    records = to_dicts(parse_ind(path))
+
+    assert [r["index_token"] for r in records] == [26000, 26009]
+    assert records[0]["indicative_close_value"] == 109
+
+
+def test_parse_snapshot_iter_batches(tmp_path):
+    data = b"".join(make_mkt_record(t) for t in range(1, 11)) + b"\x00" * 40  # corrupted tail
+    path = write_gz(tmp_path, "a.mkt.gz", data)
+
+    batches = list(parse_snapshot_iter(path, batch_size=4))
+
+    assert [len(b) for b in batches] == [4, 4, 2]
+    assert [t for b in batches for t in b["security_token"].tolist()] == list(range(1, 11))
+
+
+def test_parse_snapshot_iter_bytes_requires_filename():
+    data = gzip.compress(make_ind_record(26000))
+
+    with pytest.raises(ValueError):
+        list(parse_snapshot_iter(data))
+    batches = list(parse_snapshot_iter(data, filename="x.ind.gz"))
+    assert batches[0]["index_token"].tolist() == [26000]
+
+
+def test_parse_ca2_all_columns(tmp_path):
+    path = write_gz(tmp_path, "a.ca2.gz", make_ca2_record(22) + make_ca2_record(1594, b"N", b"Y"))
+
+    records = to_dicts(parse_ca2(path))
+
+    assert len(records) == 2
+    assert records[0]["security_token"] == 22
+    assert records[0]["buy_bbmm_flag"] == "Y"
+    assert records[0]["sell_bbmm_flag"] is None
+    assert records[0]["indicative_traded_quantity"] == 7500
+    assert records[0]["first_open_price"] == 149500
+    assert records[1]["sell_bbmm_flag"] == "Y"
+    assert records[1]["close_price"] == 148800
+
+
+def test_parse_snapshot_iter_ca2(tmp_path):
+    path = write_gz(tmp_path, "a.ca2.gz", b"".join(make_ca2_record(t) for t in range(1, 6)))
+
+    batches = list(parse_snapshot_iter(path, batch_size=2))
+
+    assert [len(b) for b in batches] == [2, 2, 1]
+    assert batches[2]["security_token"].tolist() == [5]
+    assert batches[0]["buy_bbmm_flag"].tolist() == [b"Y", b"Y"]
+
+
+def test_decode_snapshot_follows_header_layouts():
+    data = (
+        b"".join(make_mkt_record(t) for t in (1, 2))
+        + b"".join(make_mkt_record(t, message_length=88)[:88] for t in (3, 4, 5))
+        + make_mkt_record(6)
+    )
+
+    records, stats = decode_snapshot(data, "mkt")
+
+    assert records["security_token"].tolist() == [1, 2, 3, 4, 5, 6]
+    assert records["indicative_close_price"].tolist() == [150200, 150200, 0, 0, 0, 150200]
+    assert stats.layouts == {(5, 96): 3, (5, 88): 3}
+    assert stats.trailing_bytes == 0
+
+
+def test_decode_snapshot_info_data_length_header():
+    # 96-byte records whose header reports the 88-byte INFO_DATA length, which is also a registered full record size
+    data = b"".join(make_mkt_record(t, message_length=88) for t in range(1, 6))
+
+    records, stats = decode_snapshot(data, "mkt")
+
+    assert records["security_token"].tolist() == [1, 2, 3, 4, 5]
+    assert records["indicative_close_price"].tolist() == [150200] * 5
+    assert stats.unknown_header is None
+    assert stats.trailing_bytes == 0
+
+
+def test_parse_snapshot_iter_info_data_length_header(tmp_path):
+    # The buffer end is not the end of the file: the 88/96 stride is only settled by the next header
+    data = b"".join(make_mkt_record(t, message_length=88) for t in range(1, 11))
+    path = write_gz(tmp_path, "a.mkt.gz", data)
+    stats = LayoutStats("mkt")
+
+    batches = list(parse_snapshot_iter(path, batch_size=1, stats=stats))
+
+    assert [t for b in batches for t in b["security_token"].tolist()] == list(range(1, 11))
+    assert stats.unknown_header is None
+    assert stats.trailing_bytes == 0
+
+
+def test_decode_snapshot_stops_at_unknown_header():
+    data = make_mkt_record(1) + make_mkt_record(2, message_length=77) + make_mkt_record(3)
+
+    records, stats = decode_snapshot(data, "mkt")
+
+    assert records["security_token"].tolist() == [1]
+    assert stats.unknown_header == (5, 77)
+    assert stats.trailing_bytes == 192
+
+
+def test_parse_snapshot_iter_collects_stats(tmp_path):
+    data = b"".join(make_mkt_record(t) for t in range(1, 8)) + b"\x05\x00"
+    path = write_gz(tmp_path, "a.mkt.gz", data)
+    stats = LayoutStats("mkt")
+
+    batches = list(parse_snapshot_iter(path, batch_size=3, stats=stats))
+
+    assert [len(b) for b in batches] == [3, 3, 1]
+    assert stats.records == 7
+    assert stats.total_bytes == len(data)
+    assert stats.trailing_bytes == 2
+
+
+def test_parse_snapshot_bytes_in_memory():
+    data = gzip.compress(b"".join(make_mkt_record(t) for t in (22, 1594)))
+
+    assert parse_snapshot_bytes(data, "CM30_0915.mkt.gz")["security_token"].tolist() == [22, 1594]
+    with pytest.raises(ValueError):
+        parse_snapshot_bytes(data, "Securities.dat")
+
+
+def test_parse_snapshot_buffer_accepts_memoryview():
+    data = bytearray(gzip.compress(make_ind_record(26000)) + gzip.compress(make_ind_record(26009)))
+
+    records, stats = parse_snapshot_buffer(memoryview(data), "ind")
+
+    assert records["index_token"].tolist() == [26000, 26009]
+    assert stats.records == 2
+
+
+def test_record_views_match_dicts():
+    from utils.records import Ca2Record, as_records
+
+    data = gzip.compress(make_ca2_record(22) + make_ca2_record(1594, b"N", b"Y"))
+    records = parse_snapshot_bytes(data, "a.ca2.gz")
+
+    rows = as_records(records)
+
+    assert isinstance(rows[0], Ca2Record)
+    assert rows[1].security_token == 1594
+    assert rows[1].sell_bbmm_flag == "Y"
+    assert to_dicts(rows) == to_dicts(records)
+
+
+def test_latest_per_key_keeps_newest_record():
+    records = parse_snapshot_bytes(gzip.compress(b"".join(make_mkt_record(t, ltp) for t, ltp in ((1594, 1), (22, 2), (1594, 3)))), "a.mkt.gz")
+    records["timestamp"][1] += 60
+
+    latest = latest_per_key(records, "security_token")
+
+    assert latest["security_token"].tolist() == [22, 1594]
+    assert latest["last_traded_price"].tolist() == [2, 3]
+    assert to_dicts(latest_per_key(to_dicts(records), "security_token")) == to_dicts(latest)
+
+
+def test_unique_records_drops_repeated_natural_keys():
+    data = b"".join(make_mkt_record(t, ltp) for t, ltp in ((22, 1), (1594, 2), (22, 3)))
+    records = parse_snapshot_bytes(gzip.compress(data), "a.mkt.gz")
+
+    unique = unique_records(records, ["security_token", "timestamp", "transcode"])
+
+    assert unique["security_token"].tolist() == [22, 1594]
+    assert unique["last_traded_price"].tolist() == [1, 2]
+    assert unique_records(to_dicts(records), ["security_token", "timestamp", "transcode"]) == to_dicts(unique)
@@ -0,0 +1,110 @@
+import struct
+
+from utils.security_format import ScanStats, SecuritiesConverter, SecuritiesStreamDecoder, scan_records
+
+SECURITY_FORMAT = "<L10s2sdH"  # token, symbol, series, issued capital, settlement cycle
+
+
+def make_security(token: int, symbol: str, company_name: str = "ACME INDUSTRIES LIMITED",
+                  series: str = "EQ", permitted: int = 1, data_length: int = 113) -> bytes:
+    data = bytearray(data_length)
+    struct.pack_into(SECURITY_FORMAT, data, 0, token, symbol.encode(), series.encode(), 1.5e9, 1)
+    data[52:52 + len(company_name)] = company_name.encode()
+    struct.pack_into("<H", data, 111, permitted)
+    return struct.pack("<HLH", 7, 1752200000, data_length + 8) + bytes(data)
+
+
+def make_other_record(transcode: int = 9, length: int = 20) -> bytes:
+    return struct.pack("<HLH", transcode, 1752200000, length) + bytes(length - 8)
+
+
+def write_dat(tmp_path, data: bytes) -> str:
+    path = tmp_path / "Securities.dat"
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_extract_securities_single_pass(tmp_path):
+    data = make_other_record() + make_security(22, "ACC", "ACC LIMITED") + make_security(1594, "INFY", "INFOSYS LIMITED", permitted=2)
+
+    stats = ScanStats()
+    securities = SecuritiesConverter().extract_securities_dynamic(write_dat(tmp_path, data), stats)
+
+    assert [s["token_number"] for s in securities] == [22, 1594]
+    assert securities[1] == {
+        "token_number": 1594,
+        "symbol": "INFY",
+        "series": "EQ",
+        "issued_capital": 1.5e9,
+        "settlement_cycle": 1,
+        "company_name": "INFOSYS LIMITED",
+        "permitted_to_trade": 2,
+        "data_length": 113,
+        "settlement_cycle_desc": "T+1",
+        "permitted_to_trade_desc": "BSE listed (BSE exclusive security)",
+    }
+    assert stats.records == 2
+    assert stats.skipped_records == 1
+    assert stats.resyncs == 0
+
+
+def test_extract_securities_resyncs_after_junk(tmp_path):
+    junk = b"\xff\x13\x00\x00\x00\x00\xf0\xff" + b"\x01" * 29
+    data = make_security(1, "A") + junk + make_security(2, "B") + b"\x07\x00" + make_security(3, "C")
+
+    stats = ScanStats()
+    securities = SecuritiesConverter().extract_securities_dynamic(write_dat(tmp_path, data), stats)
+
+    assert [s["symbol"] for s in securities] == ["A", "B", "C"]
+    assert stats.resyncs == 2
+    assert stats.junk_bytes == len(junk) + 2
+
+
+def test_scan_records_leaves_partial_record_unconsumed():
+    data = make_security(1, "A") + make_security(2, "B")
+
+    offsets, consumed = scan_records(data[:-10], final=False)
+
+    assert offsets == {121: [0]}
+    assert consumed == 121
+
+
+def test_stream_decoder_matches_whole_buffer():
+    junk = b"\xff\x13\x00\x00\x00\x00\x30\x00" + b"\x01" * 29
+    data = b"".join(make_security(i, f"S{i}", f"COMPANY {i}") + (junk if i % 7 == 0 else b"") for i in range(1, 60))
+    stats = ScanStats()
+    decoder = SecuritiesStreamDecoder(stats=stats)
+
+    securities = []
+    for start in range(0, len(data), 50):
+        securities.extend(decoder.feed(data[start:start + 50]))
+    securities.extend(decoder.close())
+
+    assert securities == SecuritiesConverter().decode_securities(data)
+    assert stats.records == 59
+    assert stats.total_bytes == len(data)
+
+
+def test_write_csv_sorted_by_token(tmp_path):
+    converter = SecuritiesConverter()
+    securities = converter.decode_securities(make_security(9, "B") + make_security(3, "A"))
+    csv_path = tmp_path / "Securities.csv"
+
+    converter.write_csv(securities, str(csv_path))
+
+    lines = csv_path.read_text(encoding="utf-8").splitlines()
+    assert lines[0].startswith("token_number,symbol,series")
+    assert [line.split(",")[0] for line in lines[1:]] == ["3", "9"]
+
+
+def test_extract_securities_empty_file(tmp_path):
+    assert SecuritiesConverter().extract_securities_dynamic(write_dat(tmp_path, b"")) == []
+
+
+def test_company_name_at_fixed_offset_after_printable_bytes():
+    data = bytearray(make_security(22, "ACC", "ACC LIMITED"))
+    data[8 + 40:8 + 52] = b"INE012A01025"  # printable bytes right before the name
+
+    securities = SecuritiesConverter().decode_securities(bytes(data))
+
+    assert [s["company_name"] for s in securities] == ["ACC LIMITED"]
@@ -1,280 +1,472 @@
 import gzip
+import io
+import os
 import struct
-from typing import List, Dict, Any
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Iterator, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# Field layout of one CM market snapshot record: 8-byte header followed by INFO_DATA.
+MKT_FIELDS: List[Tuple[str, str]] = [
+    ("transcode", "<u2"),
+    ("timestamp", "<u4"),
+    ("message_length", "<u2"),
+    ("security_token", "<u4"),
+    ("last_traded_price", "<u4"),
+    ("best_buy_quantity", "<u8"),
+    ("best_buy_price", "<u4"),
+    ("best_sell_quantity", "<u8"),
+    ("best_sell_price", "<u4"),
+    ("total_traded_quantity", "<u8"),
+    ("average_traded_price", "<u4"),
+    ("open_price", "<u4"),
+    ("high_price", "<u4"),
+    ("low_price", "<u4"),
+    ("close_price", "<u4"),
+    ("interval_open_price", "<u4"),
+    ("interval_high_price", "<u4"),
+    ("interval_low_price", "<u4"),
+    ("interval_close_price", "<u4"),
+    ("interval_total_traded_quantity", "<u8"),
+    ("indicative_close_price", "<u4"),
+]
+MKT_DTYPE = np.dtype(MKT_FIELDS)  # packed, 96 bytes per record
+
+# Field layout of one Indices snapshot record. Names follow the CMIndexSnapshot columns.
+IND_FIELDS: List[Tuple[str, str]] = [
+    ("transcode", "<u2"),
+    ("timestamp", "<u4"),
+    ("message_length", "<u2"),
+    ("index_token", "<u4"),
+    ("open_index_value", "<u4"),
+    ("current_index_value", "<u4"),
+    ("high_index_value", "<u4"),
+    ("low_index_value", "<u4"),
+    ("percentage_change", "<u4"),
+    ("interval_open_index_value", "<u4"),
+    ("interval_high_index_value", "<u4"),
+    ("interval_low_index_value", "<u4"),
+    ("interval_close_index_value", "<u4"),
+    ("indicative_close_value", "<u4"),
+]
+IND_DTYPE = np.dtype(IND_FIELDS)  # packed, 52 bytes per record
+
+# Field layout of one Call Auction 2 snapshot record. Names follow the CMCallAuctionSnapshot columns.
+CA2_FIELDS: List[Tuple[str, str]] = [
+    ("transcode", "<u2"),
+    ("timestamp", "<u4"),
+    ("message_length", "<u2"),
+    ("security_token", "<u4"),
+    ("last_traded_price", "<u4"),
+    ("best_buy_quantity", "<u8"),
+    ("best_buy_price", "<u4"),
+    ("buy_bbmm_flag", "S1"),
+    ("best_sell_quantity", "<u8"),
+    ("best_sell_price", "<u4"),
+    ("sell_bbmm_flag", "S1"),
+    ("total_traded_quantity", "<u8"),
+    ("indicative_traded_quantity", "<u8"),
+    ("average_traded_price", "<u4"),
+    ("first_open_price", "<u4"),
+    ("open_price", "<u4"),
+    ("high_price", "<u4"),
+    ("low_price", "<u4"),
+    ("close_price", "<u4"),
+]
+CA2_DTYPE = np.dtype(CA2_FIELDS)  # packed, 82 bytes of fields
+CA2_RECORD_SIZE = 86  # on-disk record: the fields above followed by 4 reserved bytes
+
+# Snapshot file suffix -> short file type used throughout ingest ("mkt", "ind", "ca2")
+SNAPSHOT_SUFFIXES = {".mkt.gz": "mkt", ".ind.gz": "ind", ".ca2.gz": "ca2"}
+
+# Output dtype of each file type: every registered layout decodes into these columns
+SNAPSHOT_DTYPES = {"mkt": MKT_DTYPE, "ind": IND_DTYPE, "ca2": CA2_DTYPE}
+
+# 8-byte record header: transcode, timestamp, message_length
+HEADER_SIZE = 8
+_HEADER = struct.Struct("<H I H")
+
+# Header timestamps count seconds from 1980-01-01 00:00 UTC (the NSE feed epoch), not from 1970
+FEED_EPOCH_OFFSET = 315532800
+
+# Records per batch yielded by parse_snapshot_iter
+DEFAULT_BATCH_SIZE = 1000
+
+# Parsed snapshot data: a NumPy structured array (one named column per field),
+# a list of slotted record objects (utils.records) or a list of dicts.
+SnapshotRecords = Union[np.ndarray, List[Any]]
+
+
+def to_feed_seconds(moment: datetime) -> int:
+    """Feed timestamp (seconds since the 1980 feed epoch) of a timezone-aware datetime"""
+    return int(moment.timestamp()) - FEED_EPOCH_OFFSET
+
+
+def from_feed_seconds(seconds: int) -> datetime:
+    """UTC datetime of a feed timestamp"""
+    return datetime.fromtimestamp(int(seconds) + FEED_EPOCH_OFFSET, tz=timezone.utc)
+
+
+def snapshot_type(filename: str) -> Optional[str]:
+    """
+    Return the short file type ("mkt", "ind" or "ca2") for a snapshot
+    filename, or None if it is not a snapshot file.
+    """
+    lower = filename.lower()
+    for suffix, file_type in SNAPSHOT_SUFFIXES.items():
+        if lower.endswith(suffix):
+            return file_type
+    return None
 
-def parse_mkt(path: str) -> List[Dict[str, Any]]:
+
+def _record_dtype(fields: Sequence[Tuple[str, str]], record_size: int) -> np.dtype:
     """
-    Parse a CM 15-min snapshot (*.mkt.gz).
-    Dynamically handle different record sizes.
+    Build a dtype that views `record_size` bytes per record, keeping only
+    the leading fields that fit entirely inside the record.
     """
-    records: List[Dict[str, Any]] = []
+    names, formats, offsets = [], [], []
+    offset = 0
+    for name, fmt in fields:
+        size = np.dtype(fmt).itemsize
+        if offset + size > record_size:
+            break
+        names.append(name)
+        formats.append(fmt)
+        offsets.append(offset)
+        offset += size
+    return np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": record_size})
 
-    with gzip.open(path, "rb") as f:
-        file_data = f.read()
-        
-    if not file_data:
-        return records
-    
-    # Try to determine record size dynamically
-    # First, read a header to understand the structure
-    if len(file_data) < 8:
+
+class RecordLayout:
+    """
+    One known on-disk record layout, with its NumPy views precompiled.
+    Records shorter than the file type's full field list decode the missing
+    fields as zeros; bytes past the last field are ignored.
+    """
+
+    def __init__(self, file_type: str, record_size: int, fields: Sequence[Tuple[str, str]], transcode: Optional[int] = None):
+        self.file_type = file_type
+        self.record_size = record_size
+        self.transcode = transcode
+        self.output_dtype = SNAPSHOT_DTYPES[file_type]
+        self.view_dtype = _record_dtype(fields, record_size)
+        self.header_dtype = np.dtype({
+            "names": ["transcode", "message_length"],
+            "formats": ["<u2", "<u2"],
+            "offsets": [0, 6],
+            "itemsize": record_size,
+        })
+        self.is_full = self.view_dtype.names == self.output_dtype.names
+
+    def decode(self, data, offset: int, count: int) -> np.ndarray:
+        """Decode `count` records starting at `offset` into a new array of the output dtype."""
+        view = np.frombuffer(data, dtype=self.view_dtype, count=count, offset=offset)
+        if self.is_full:
+            return view.astype(self.output_dtype)
+
+        records = np.zeros(count, dtype=self.output_dtype)
+        for name in self.view_dtype.names:
+            records[name] = view[name]
         return records
-        
-    # Read first record header
-    transcode, timestamp, msg_len = struct.unpack_from("<H I H", file_data, 0)
-    
-    # Calculate record size based on message length or data size
-    total_records_estimate = len(file_data) // 96  # Try 96 first
-    if total_records_estimate * 96 != len(file_data):
-        # Try with different sizes
-        for possible_size in [88, 80, 84, 92, 96, 100]:
-            if len(file_data) % possible_size == 0:
-                record_size = possible_size
-                break
-        else:
-            # If no exact match, use the largest possible
-            record_size = 88  # Default fallback
-    else:
-        record_size = 96
-        
-    info_data_size = record_size - 8  # Subtract header size
-    
-    print(f"📊 File size: {len(file_data)} bytes, Record size: {record_size}, INFO_DATA size: {info_data_size}")
 
+    def __repr__(self):
+        return f"<RecordLayout({self.file_type}, transcode={self.transcode}, record_size={self.record_size})>"
+
+
+# file type -> {(transcode, message_length): layout}; transcode None matches any transcode
+_LAYOUTS: Dict[str, Dict[Tuple[Optional[int], int], RecordLayout]] = {file_type: {} for file_type in SNAPSHOT_DTYPES}
+
+
+def register_layout(file_type: str, record_size: int, fields: Sequence[Tuple[str, str]], transcode: Optional[int] = None) -> RecordLayout:
+    """
+    Register a record layout for `file_type`, selected when a record header
+    carries `message_length == record_size` (and `transcode`, if given).
+    """
+    layout = RecordLayout(file_type, record_size, fields, transcode)
+    _LAYOUTS[file_type][(transcode, record_size)] = layout
+    return layout
+
+
+def _candidate_layouts(file_type: str, transcode: int, message_length: int) -> List[RecordLayout]:
+    layouts = _LAYOUTS[file_type]
+    candidates = []
+    for record_size in (message_length, message_length + HEADER_SIZE):
+        layout = layouts.get((transcode, record_size)) or layouts.get((None, record_size))
+        if layout is not None:
+            candidates.append(layout)
+    return candidates
+
+
+def _starts_record(data, offset: int, file_type: str, transcode: int, eof: bool = True) -> bool:
+    """
+    True if `offset` holds a header of the same transcode with a registered
+    layout, or is the end of `data` when `data` runs to the end of the file.
+    """
+    if offset == len(data):
+        return eof
+    if len(data) - offset < HEADER_SIZE:
+        return False
+    next_transcode, _, next_length = _HEADER.unpack_from(data, offset)
+    return next_transcode == transcode and bool(_candidate_layouts(file_type, next_transcode, next_length))
+
+
+def resolve_layout(
+    file_type: str, transcode: int, message_length: int, data=None, offset: int = 0, eof: bool = True,
+) -> Optional[RecordLayout]:
+    """
+    Find the layout for a record header. `message_length` is the full record
+    length; a header that reports only the INFO_DATA length is accepted too.
+    Where both readings name a registered layout (e.g. mkt 88 is a full
+    88-byte record or the INFO_DATA of a 96-byte one), the record at `offset`
+    in `data` is resolved by checking which stride lands on the next header
+    (or on the end of the file, if `eof`); without `data` the full-length
+    reading wins.
+    """
+    candidates = _candidate_layouts(file_type, transcode, message_length)
+    if len(candidates) > 1 and data is not None:
+        for layout in candidates:
+            if _starts_record(data, offset + layout.record_size, file_type, transcode, eof):
+                return layout
+    return candidates[0] if candidates else None
+
+
+def _awaits_next_header(data, offset: int, file_type: str, transcode: int, message_length: int) -> bool:
+    """
+    True if the record at `offset` has an ambiguous length that no stride
+    resolves yet because a following header is not in `data`: more of the
+    file is needed before it can be decoded.
+    """
+    candidates = _candidate_layouts(file_type, transcode, message_length)
+    if len(candidates) < 2:
+        return False
+    if any(_starts_record(data, offset + layout.record_size, file_type, transcode, eof=False) for layout in candidates):
+        return False
+    return any(offset + layout.record_size + HEADER_SIZE > len(data) for layout in candidates)
+
+
+# Standard layouts plus the shorter/longer variants the feed has been seen to use
+register_layout("mkt", MKT_DTYPE.itemsize, MKT_FIELDS)
+for _size in (80, 84, 88, 92, 100):
+    register_layout("mkt", _size, MKT_FIELDS)
+register_layout("ind", IND_DTYPE.itemsize, IND_FIELDS)
+for _size in (48, 56, 60):
+    register_layout("ind", _size, IND_FIELDS)
+register_layout("ca2", CA2_RECORD_SIZE, CA2_FIELDS)
+register_layout("ca2", CA2_DTYPE.itemsize, CA2_FIELDS)
+
+
+class LayoutStats:
+    """
+    Per-file layout detection statistics collected while decoding.
+    """
+
+    def __init__(self, file_type: str):
+        self.file_type = file_type
+        self.total_bytes = 0
+        self.records = 0
+        # (transcode, message_length) -> number of records decoded with that header
+        self.layouts: Dict[Tuple[int, int], int] = {}
+        # Header that matched no registered layout; decoding stops there
+        self.unknown_header: Optional[Tuple[int, int]] = None
+        self.trailing_bytes = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary for logging"""
+        return {
+            "file_type": self.file_type,
+            "total_bytes": self.total_bytes,
+            "records": self.records,
+            "layouts": {f"{transcode}/{length}": count for (transcode, length), count in self.layouts.items()},
+            "unknown_header": self.unknown_header,
+            "trailing_bytes": self.trailing_bytes,
+        }
+
+    def __repr__(self):
+        return f"<LayoutStats({self.to_dict()})>"
+
+
+def _decode_segments(
+    data, file_type: str, stats: LayoutStats, max_records: Optional[int] = None, eof: bool = True,
+) -> Tuple[np.ndarray, int]:
+    """
+    Decode consecutive records from `data`, switching layout whenever the
+    header (transcode, message_length) changes. Each run of identical headers
+    is decoded with one vectorized view, with no per-field bounds checks.
+    Without `eof` (more of the file follows `data`), a record of ambiguous
+    length is left undecoded until the header after it is in `data`.
+    Returns the records and the number of bytes consumed.
+    """
+    segments = []
     offset = 0
-    while offset + record_size <= len(file_data):
-        try:
-            # Unpack header
-            transcode, timestamp, msg_len = struct.unpack_from("<H I H", file_data, offset)
-            data_offset = offset + 8
-            data_end = data_offset + info_data_size
-            
-            if data_end > len(file_data):
-                break
-                
-            data = file_data[data_offset:data_end]
-            field_offset = 0
-
-            # Basic fields (always present)
-            security_token = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-            field_offset += 4
-
-            last_traded_price = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-            field_offset += 4
-
-            best_buy_quantity = struct.unpack_from("<Q", data, field_offset)[0] if field_offset + 8 <= len(data) else 0
-            field_offset += 8
-
-            best_buy_price = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-            field_offset += 4
-
-            best_sell_quantity = struct.unpack_from("<Q", data, field_offset)[0] if field_offset + 8 <= len(data) else 0
-            field_offset += 8
-
-            best_sell_price = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-            field_offset += 4
-
-            total_traded_quantity = struct.unpack_from("<Q", data, field_offset)[0] if field_offset + 8 <= len(data) else 0
-            field_offset += 8
-
-            average_traded_price = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-            field_offset += 4
-
-            open_price = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-            field_offset += 4
-
-            high_price = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-            field_offset += 4
-
-            low_price = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-            field_offset += 4
-
-            close_price = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-            field_offset += 4
-
-            # Optional fields (only if enough data available)
-            interval_open_price = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-            field_offset += 4
-
-            interval_high_price = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-            field_offset += 4
-
-            interval_low_price = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-            field_offset += 4
-
-            interval_close_price = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-            field_offset += 4
-
-            interval_total_traded_quantity = struct.unpack_from("<Q", data, field_offset)[0] if field_offset + 8 <= len(data) else 0
-            field_offset += 8
-
-            # This field might not be present in all formats
-            indicative_close_price = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-
-            records.append({
-                "transcode": transcode,
-                "timestamp": timestamp,
-                "message_length": msg_len,
-                "security_token": security_token,
-                "last_traded_price": last_traded_price,
-                "best_buy_quantity": best_buy_quantity,
-                "best_buy_price": best_buy_price,
-                "best_sell_quantity": best_sell_quantity,
-                "best_sell_price": best_sell_price,
-                "total_traded_quantity": total_traded_quantity,
-                "average_traded_price": average_traded_price,
-                "open_price": open_price,
-                "high_price": high_price,
-                "low_price": low_price,
-                "close_price": close_price,
-                "interval_open_price": interval_open_price,
-                "interval_high_price": interval_high_price,
-                "interval_low_price": interval_low_price,
-                "interval_close_price": interval_close_price,
-                "interval_total_traded_quantity": interval_total_traded_quantity,
-                "indicative_close_price": indicative_close_price,
-            })
-
-            offset += record_size
-            
-        except struct.error as e:
-            print(f"⚠️ Struct error at offset {offset}: {e}")
+    remaining = max_records
+    while len(data) - offset >= HEADER_SIZE and remaining != 0:
+        transcode, _, message_length = _HEADER.unpack_from(data, offset)
+        if not eof and _awaits_next_header(data, offset, file_type, transcode, message_length):
             break
-        except Exception as e:
-            print(f"⚠️ Error parsing record at offset {offset}: {e}")
+        layout = resolve_layout(file_type, transcode, message_length, data, offset, eof)
+        if layout is None:
+            stats.unknown_header = (transcode, message_length)
             break
 
-    return records
+        available = (len(data) - offset) // layout.record_size
+        if remaining is not None:
+            available = min(available, remaining)
+        if available == 0:
+            break
+
+        # The run ends at the first record whose header differs
+        headers = np.frombuffer(data, dtype=layout.header_dtype, count=available, offset=offset)
+        same = (headers["transcode"] == transcode) & (headers["message_length"] == message_length)
+        count = available if same.all() else int(same.argmin())
 
+        segments.append(layout.decode(data, offset, count))
+        key = (transcode, message_length)
+        stats.layouts[key] = stats.layouts.get(key, 0) + count
+        stats.records += count
+        offset += count * layout.record_size
+        if remaining is not None:
+            remaining -= count
 
-def parse_ind(path: str) -> List[Dict[str, Any]]:
+    if not segments:
+        return np.empty(0, dtype=SNAPSHOT_DTYPES[file_type]), offset
+    if len(segments) == 1:
+        return segments[0], offset
+    return np.concatenate(segments), offset
+
+
+def decode_snapshot(file_data, file_type: str) -> Tuple[np.ndarray, LayoutStats]:
     """
-    Parse an Indices snapshot (*.ind.gz) with dynamic sizing.
+    Decode a decompressed snapshot buffer of `file_type` ("mkt", "ind", "ca2")
+    using the header-driven layout registry. Returns the records and the
+    layout statistics for the file.
     """
-    records: List[Dict[str, Any]] = []
+    stats = LayoutStats(file_type)
+    stats.total_bytes = len(file_data)
+    records, consumed = _decode_segments(file_data, file_type, stats)
+    stats.trailing_bytes = len(file_data) - consumed
+    return records, stats
 
-    with gzip.open(path, "rb") as f:
-        file_data = f.read()
-        
-    if not file_data:
-        return records
 
-    # Dynamic record size detection
-    total_size = len(file_data)
-    for possible_size in [52, 48, 56, 60]:  # Try different sizes
-        if total_size % possible_size == 0:
-            record_size = possible_size
-            break
-    else:
-        record_size = 52  # Default
-        
-    info_data_size = record_size - 8
-    
-    offset = 0
-    while offset + record_size <= len(file_data):
-        try:
-            transcode, timestamp, msg_len = struct.unpack_from("<H I H", file_data, offset)
-            data_offset = offset + 8
-            data = file_data[data_offset:data_offset + info_data_size]
-            field_offset = 0
-
-            index_token = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-            field_offset += 4
-
-            open_index_value = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-            field_offset += 4
-
-            current_index_value = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-            field_offset += 4
-
-            high_index_value = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-            field_offset += 4
-
-            low_index_value = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-            field_offset += 4
-
-            percentage_change = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-            field_offset += 4
-
-            interval_open_index_value = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-            field_offset += 4
-
-            interval_high_index_value = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-            field_offset += 4
-
-            interval_low_index_value = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-            field_offset += 4
-
-            interval_close_index_value = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-            field_offset += 4
-
-            indicative_close_index_value = struct.unpack_from("<I", data, field_offset)[0] if field_offset + 4 <= len(data) else 0
-
-            records.append({
-                "transcode": transcode,
-                "timestamp": timestamp,
-                "message_length": msg_len,
-                "index_token": index_token,
-                "open_index_value": open_index_value,
-                "current_index_value": current_index_value,
-                "high_index_value": high_index_value,
-                "low_index_value": low_index_value,
-                "percentage_change": percentage_change,
-                "interval_open_index_value": interval_open_index_value,
-                "interval_high_index_value": interval_high_index_value,
-                "interval_low_index_value": interval_low_index_value,
-                "interval_close_index_value": interval_close_index_value,
-                "indicative_close_index_value": indicative_close_index_value,
-            })
-
-            offset += record_size
-            
-        except Exception as e:
-            print(f"⚠️ Error parsing index record: {e}")
-            break
+def column_values(records: np.ndarray) -> List[List[Any]]:
+    """
+    Return each column of a structured array as a list of Python values,
+    with single-character flags decoded to str (NUL/blank means "not set" -> None).
+    """
+    columns = []
+    for name in records.dtype.names:
+        column = records[name]
+        if column.dtype.kind == "S":
+            columns.append([value.decode("ascii", "replace").strip() or None for value in column.tolist()])
+        else:
+            columns.append(column.tolist())
+    return columns
 
-    return records
+
+def to_dicts(records: SnapshotRecords) -> List[Dict[str, Any]]:
+    """
+    Convert parser output into a list of plain dicts (for SQLAlchemy bulk
+    insert and JSON broadcast). Accepts a structured array, a list of record
+    objects with `to_dict()` (see utils.records) or a list of dicts, which passes through.
+    """
+    if not isinstance(records, np.ndarray):
+        if records and not isinstance(records[0], dict):
+            return [record.to_dict() for record in records]
+        return records
+    names = records.dtype.names
+    return [dict(zip(names, row)) for row in zip(*column_values(records))]
 
 
-def parse_ca2(path: str) -> List[Dict[str, Any]]:
+def to_rows(records: SnapshotRecords) -> Tuple[List[str], List[tuple]]:
     """
-    Parse a Call-Auction-2 snapshot (*.ca2.gz) with dynamic sizing.
+    Convert parser output into (column names, row tuples), the shape asyncpg
+    COPY expects. Accepts the same inputs as `to_dicts`.
     """
-    records: List[Dict[str, Any]] = []
+    if isinstance(records, np.ndarray):
+        return list(records.dtype.names), list(zip(*column_values(records)))
+    dicts = to_dicts(records)
+    if not dicts:
+        return [], []
+    columns = list(dicts[0])
+    return columns, [tuple(row[column] for column in columns) for row in dicts]
 
+
+def latest_per_key(records: SnapshotRecords, key: str) -> SnapshotRecords:
+    """
+    Keep only the newest record (highest timestamp, last one on ties) for each
+    value of `key`, ordered by `key`. Records without a `key` are dropped.
+    """
+    if isinstance(records, np.ndarray):
+        if len(records) == 0:
+            return records
+        order = np.lexsort((np.arange(len(records)), records["timestamp"], records[key]))
+        keys = records[key][order]
+        last = np.append(keys[1:] != keys[:-1], True)
+        return records[order[last]]
+
+    latest: Dict[Any, Dict[str, Any]] = {}
+    for row in to_dicts(records):
+        token = row.get(key)
+        if token is None:
+            continue
+        current = latest.get(token)
+        if current is None or row["timestamp"] >= current["timestamp"]:
+            latest[token] = row
+    return [latest[token] for token in sorted(latest)]
+
+
+def unique_records(records: SnapshotRecords, columns: Sequence[str]) -> SnapshotRecords:
+    """
+    Drop records whose `columns` repeat an earlier record's, keeping the
+    first occurrence and the original order.
+    """
+    if isinstance(records, np.ndarray):
+        if len(records) == 0:
+            return records
+        _, first = np.unique(records[list(columns)], return_index=True)
+        return records[np.sort(first)]
+
+    seen = set()
+    unique = []
+    for row in to_dicts(records):
+        key = tuple(row[column] for column in columns)
+        if key not in seen:
+            seen.add(key)
+            unique.append(row)
+    return unique
+
+
+def _read_gz(path: str) -> bytes:
     with gzip.open(path, "rb") as f:
-        file_data = f.read()
-        
-    if not file_data or len(file_data) < 20:  # Very small files
-        return records
+        return f.read()
 
-    # CA2 files might be mostly empty
-    # Try to parse what we can
-    offset = 0
-    record_size = 86  # Standard size
-    
-    while offset + 8 <= len(file_data):  # At least header
-        try:
-            if offset + record_size > len(file_data):
-                break
-                
-            transcode, timestamp, msg_len = struct.unpack_from("<H I H", file_data, offset)
-            
-            # If this looks like valid data
-            if msg_len > 0 and msg_len < 200:  # Reasonable message length
-                # Continue with full parsing...
-                # (similar logic as above)
-                pass
-            
-            offset += record_size
-            
-        except:
-            break
 
+def parse_mkt(path: str) -> np.ndarray:
+    """
+    Parse a CM 15-min snapshot (*.mkt.gz) into a structured array (MKT_DTYPE).
+    """
+    records, stats = decode_snapshot(_read_gz(path), "mkt")
+    print(f"📊 File size: {stats.total_bytes} bytes, Layouts: {stats.to_dict()['layouts']}, Trailing bytes: {stats.trailing_bytes}")
     return records
 
 
-def parse_snapshot(path: str) -> List[Dict[str, Any]]:
+def parse_ind(path: str) -> np.ndarray:
+    """
+    Parse an Indices snapshot (*.ind.gz) into a structured array (IND_DTYPE).
+    """
+    records, _ = decode_snapshot(_read_gz(path), "ind")
+    return records
+
+
+def parse_ca2(path: str) -> np.ndarray:
+    """
+    Parse a Call-Auction-2 snapshot (*.ca2.gz) into a structured array (CA2_DTYPE).
+    """
+    records, _ = decode_snapshot(_read_gz(path), "ca2")
+    return records
+
+
+def parse_snapshot(path: str) -> SnapshotRecords:
     """
     Dispatch based on filename suffix with error handling.
     """
@@ -290,4 +482,94 @@ def parse_snapshot(path: str) -> List[Dict[str, Any]]:
             raise ValueError(f"Unrecognized snapshot type: {path}")
     except Exception as e:
         print(f"❌ Error parsing {path}: {e}")
-        return []  # Return empty list instead of raising
\ No newline at end of file
+        return []  # Return empty list instead of raising
+
+
+def parse_snapshot_buffer(buffer, file_type: str) -> Tuple[np.ndarray, LayoutStats]:
+    """
+    Decompress and decode gzip snapshot data held in any buffer-protocol
+    object (bytes, bytearray, memoryview, mmap) of `file_type`, entirely in memory.
+    """
+    if file_type not in SNAPSHOT_DTYPES:
+        raise ValueError(f"Unrecognized snapshot type: {file_type}")
+    return decode_snapshot(gzip.decompress(buffer), file_type)
+
+
+def parse_snapshot_bytes(data: bytes, filename: str) -> np.ndarray:
+    """
+    Parse downloaded snapshot .gz bytes without a temp-file round trip.
+    `filename` selects the file type. Unlike parse_snapshot, errors are raised.
+    """
+    file_type = snapshot_type(filename)
+    if file_type is None:
+        raise ValueError(f"Unrecognized snapshot type: {filename}")
+    records, _ = parse_snapshot_buffer(data, file_type)
+    return records
+
+
+def parse_snapshot_iter(
+    source: Union[str, bytes],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    filename: Optional[str] = None,
+    stats: Optional[LayoutStats] = None,
+) -> Iterator[np.ndarray]:
+    """
+    Stream a snapshot file as structured-array batches of up to `batch_size` records.
+
+    `source` is a path or the raw .gz bytes; for bytes, `filename` is required
+    to pick the file type. The gzip stream is decompressed incrementally into
+    one reusable buffer, so memory stays bounded by the batch size regardless
+    of file size. Layouts are resolved from each record header; pass `stats`
+    to collect the per-file layout statistics.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        name = filename or os.fspath(source)
+    elif filename is None:
+        raise ValueError("filename is required when parsing snapshot bytes")
+    else:
+        name = filename
+
+    file_type = snapshot_type(name)
+    if file_type is None:
+        raise ValueError(f"Unrecognized snapshot type: {name}")
+    if batch_size <= 0:
+        raise ValueError("batch_size must be positive")
+    if stats is None:
+        stats = LayoutStats(file_type)
+
+    max_record_size = max(record_size for _, record_size in _LAYOUTS[file_type])
+    # Room for the header after the last record, which resolves an ambiguous record length
+    buffer = bytearray(batch_size * max_record_size + HEADER_SIZE)
+    view = memoryview(buffer)
+
+    if isinstance(source, (str, os.PathLike)):
+        stream = gzip.open(source, "rb")
+    else:
+        stream = gzip.GzipFile(fileobj=io.BytesIO(source), mode="rb")
+
+    filled = 0
+    eof = False
+    with stream:
+        while True:
+            while not eof and filled < len(buffer):
+                read = stream.readinto(view[filled:])
+                if not read:
+                    eof = True
+                    break
+                filled += read
+                stats.total_bytes += read
+
+            # Decoding copies records out, so the buffer can be reused for the next batch
+            records, consumed = _decode_segments(view[:filled], file_type, stats, max_records=batch_size, eof=eof)
+            if len(records):
+                yield records
+
+            # Carry the undecoded remainder over to the front of the buffer
+            leftover = filled - consumed
+            buffer[:leftover] = view[consumed:filled].tobytes()
+            filled = leftover
+
+            if stats.unknown_header is not None or (eof and consumed == 0):
+                break
+
+    stats.trailing_bytes = filled
@@ -0,0 +1,66 @@
+from typing import Any, Dict, List
+
+import numpy as np
+
+from utils.parser import CA2_DTYPE, IND_DTYPE, MKT_DTYPE
+
+
+def _python_value(value: Any) -> Any:
+    """Convert a NumPy scalar to the value the parser's dict output would hold"""
+    if isinstance(value, np.bytes_):
+        return value.decode("ascii", "replace").strip() or None
+    return value.item()
+
+
+class SnapshotRecord:
+    """
+    Array-backed view of one parsed snapshot row. Holds only a reference to
+    the parsed array and a row index; fields are read on attribute access.
+    """
+    __slots__ = ("_records", "_index")
+
+    def __init__(self, records: np.ndarray, index: int):
+        self._records = records
+        self._index = index
+
+    @property
+    def fields(self) -> tuple:
+        return self._records.dtype.names
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary for DB inserts and API responses"""
+        row = self._records[self._index]
+        return {name: _python_value(row[name]) for name in self.fields}
+
+    def __repr__(self):
+        return f"<{type(self).__name__}({self.to_dict()})>"
+
+
+def _field(name: str) -> property:
+    return property(lambda self: _python_value(self._records[name][self._index]))
+
+
+def _record_type(class_name: str, dtype: np.dtype) -> type:
+    namespace = {name: _field(name) for name in dtype.names}
+    namespace["__slots__"] = ()
+    return type(class_name, (SnapshotRecord,), namespace)
+
+
+MktRecord = _record_type("MktRecord", MKT_DTYPE)
+IndRecord = _record_type("IndRecord", IND_DTYPE)
+Ca2Record = _record_type("Ca2Record", CA2_DTYPE)
+
+RECORD_TYPES = {"mkt": MktRecord, "ind": IndRecord, "ca2": Ca2Record}
+_TYPES_BY_DTYPE = {MKT_DTYPE: MktRecord, IND_DTYPE: IndRecord, CA2_DTYPE: Ca2Record}
+
+
+def as_records(records: np.ndarray) -> List[SnapshotRecord]:
+    """
+    Wrap a parsed structured array as row objects (MktRecord, IndRecord or
+    Ca2Record, chosen by dtype). Each row is a two-slot view, not a 14-21
+    key dict; bulk consumers should still pass the array itself to to_dicts().
+    """
+    record_type = _TYPES_BY_DTYPE.get(records.dtype)
+    if record_type is None:
+        raise ValueError(f"No record type for dtype {records.dtype}")
+    return [record_type(records, index) for index in range(len(records))]
@@ -1,9 +1,259 @@
+import mmap
 import struct
 import csv
-import pandas as pd
 from datetime import datetime
 import os
 
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Securities.dat record header: transcode (SHORT), timestamp (LONG), message_length (SHORT)
+HEADER_SIZE = 8
+SECURITY_TRANSCODE = 7
+_HEADER = struct.Struct('<HLH')
+
+# Plausible security information record sizes (header included), used to resync after junk
+MIN_SECURITY_LENGTH = 101
+MAX_SECURITY_LENGTH = 199
+RESYNC_WINDOW = 4096
+
+# Version 1.24 security information layout, as (name, format, offset into the record data)
+COMPANY_NAME_OFFSET = 52
+V124_FIELDS = [
+    ('token_number', '<u4', 0),
+    ('symbol', 'S10', 4),
+    ('series', 'S2', 14),
+    ('issued_capital', '<f8', 16),
+    ('settlement_cycle', '<u2', 24),
+    ('company_name', 'S25', COMPANY_NAME_OFFSET),
+    ('permitted_to_trade', '<u2', 111),
+]
+V124_DATA_LENGTH = 113
+COMPANY_NAME_LENGTH = 25
+COMPANY_NAME_SEARCH_START = 40
+COMPANY_NAME_SEARCH_END = 80
+CALIBRATION_SAMPLE = 64
+
+# Description columns stored next to the codes in cm_token_master
+SETTLEMENT_CYCLE_DESC = {0: 'T+0'}
+PERMITTED_TO_TRADE_DESC = {
+    0: 'Listed but not permitted to trade',
+    1: 'Permitted to trade',
+    2: 'BSE listed (BSE exclusive security)',
+}
+
+# Column order of the optional CSV export
+CSV_COLUMNS = [
+    'token_number', 'symbol', 'series', 'issued_capital', 'settlement_cycle', 'company_name',
+    'permitted_to_trade', 'data_length', 'settlement_cycle_desc', 'permitted_to_trade_desc',
+]
+
+
+def describe(security: dict) -> dict:
+    """Add the settlement cycle / permitted to trade description columns to a decoded security"""
+    security['settlement_cycle_desc'] = SETTLEMENT_CYCLE_DESC.get(security['settlement_cycle'], 'T+1')
+    security['permitted_to_trade_desc'] = PERMITTED_TO_TRADE_DESC.get(security['permitted_to_trade'], 'Unknown')
+    return security
+
+
+def v124_dtype(data_length: int) -> np.dtype:
+    """Structured dtype over the data portion of a v1.24 record"""
+    return np.dtype({
+        'names': [name for name, _, _ in V124_FIELDS],
+        'formats': [fmt for _, fmt, _ in V124_FIELDS],
+        'offsets': [offset for _, _, offset in V124_FIELDS],
+        'itemsize': data_length,
+    })
+
+
+def find_company_name(data):
+    """
+    Legacy company name search: the longest printable 25-byte window
+    starting between offsets 40 and 80. Returns (offset, name), offset None
+    if nothing printable was found.
+    """
+    company_name, found_at = "", None
+    for start_pos in range(COMPANY_NAME_SEARCH_START, min(COMPANY_NAME_SEARCH_END, len(data) - COMPANY_NAME_LENGTH)):
+        try:
+            name_candidate = data[start_pos:start_pos+COMPANY_NAME_LENGTH].decode('utf-8', errors='ignore').rstrip('\x00')
+            if len(name_candidate) > len(company_name) and name_candidate.isprintable():
+                company_name, found_at = name_candidate, start_pos
+        except:
+            continue
+    return found_at, company_name
+
+
+def calibrate_company_name_offset(rows: np.ndarray):
+    """
+    Company name offset the legacy search picks most often over an evenly
+    spaced sample of a (records, data_length) byte matrix (smallest offset
+    on a tie). None if no row has a printable name. Only used as a
+    consistency check against COMPANY_NAME_OFFSET, never to decode.
+    """
+    if len(rows) == 0:
+        return None
+    sample = rows[np.linspace(0, len(rows) - 1, min(len(rows), CALIBRATION_SAMPLE)).astype(np.int64)]
+    votes: dict = {}
+    for row in sample:
+        offset, _ = find_company_name(row.tobytes())
+        if offset is not None:
+            votes[offset] = votes.get(offset, 0) + 1
+    if not votes:
+        return None
+    return min(votes, key=lambda offset: (-votes[offset], offset))
+
+
+class ScanStats:
+    """
+    Counters collected while scanning a Securities.dat buffer.
+    """
+
+    def __init__(self):
+        self.total_bytes = 0
+        self.records = 0
+        self.skipped_records = 0
+        self.resyncs = 0
+        self.junk_bytes = 0
+        self.lengths: dict = {}
+
+    def to_dict(self) -> dict:
+        return {
+            'total_bytes': self.total_bytes,
+            'records': self.records,
+            'skipped_records': self.skipped_records,
+            'resyncs': self.resyncs,
+            'junk_bytes': self.junk_bytes,
+            'lengths': dict(sorted(self.lengths.items())),
+        }
+
+
+def _is_security_header(transcode: int, message_length: int) -> bool:
+    return transcode == SECURITY_TRANSCODE and MIN_SECURITY_LENGTH <= message_length <= MAX_SECURITY_LENGTH
+
+
+def _security_header_at(buffer, pos: int, end: int) -> bool:
+    """True if a security record header starts at `pos`, or `pos` is at/after the end of the buffer."""
+    if pos + HEADER_SIZE > end:
+        return True
+    transcode, _, message_length = _HEADER.unpack_from(buffer, pos)
+    return _is_security_header(transcode, message_length)
+
+
+def _resync(raw: np.ndarray, pos: int, end: int) -> int:
+    """
+    Offset of the next plausible security record header at or after `pos`,
+    searched one RESYNC_WINDOW at a time. Returns `end` if there is none.
+    """
+    while pos + HEADER_SIZE <= end:
+        window = raw[pos:min(pos + RESYNC_WINDOW + HEADER_SIZE, end)]
+        if len(window) < HEADER_SIZE:
+            break
+        n = len(window) - HEADER_SIZE + 1
+        lengths = window[6:6 + n].astype(np.uint16) | (window[7:7 + n].astype(np.uint16) << 8)
+        hits = np.flatnonzero(
+            (window[:n] == SECURITY_TRANSCODE) & (window[1:1 + n] == 0)
+            & (lengths >= MIN_SECURITY_LENGTH) & (lengths <= MAX_SECURITY_LENGTH)
+        )
+        if len(hits):
+            return pos + int(hits[0])
+        pos += n
+    return end
+
+
+def scan_records(buffer, stats: ScanStats = None, final: bool = True):
+    """
+    Walk the record boundaries of a Securities.dat buffer in one pass using
+    the header message_length. Returns ({message_length: [offsets]}, consumed)
+    for the security information records found.
+
+    Junk (a header that is not a plausible record) is skipped by searching for
+    the next security record header, a window at a time. With `final=False`
+    an incomplete record at the end is left unconsumed for the next call.
+    """
+    stats = stats if stats is not None else ScanStats()
+    raw = np.frombuffer(buffer, dtype=np.uint8)
+    end = len(raw)
+    offsets: dict = {}
+    pos = 0
+
+    try:
+        while pos + HEADER_SIZE <= end:
+            transcode, _, message_length = _HEADER.unpack_from(buffer, pos)
+
+            if transcode == SECURITY_TRANSCODE:
+                valid = _is_security_header(transcode, message_length)
+            elif not final and pos + message_length + HEADER_SIZE > end:
+                # Can't check the following header yet: wait for more data
+                break
+            else:
+                # Other records are skipped by length, but only when a security record follows:
+                # a junk header would otherwise throw the walk up to 64KB off course
+                valid = message_length >= HEADER_SIZE and _security_header_at(buffer, pos + message_length, end)
+
+            if valid and pos + message_length > end:
+                if not final:
+                    break
+                valid = False
+
+            if not valid:
+                resume = _resync(raw, pos + 1, end)
+                if resume == end and not final:
+                    # Keep a possible partial header for the next buffer
+                    resume = max(pos + 1, end - HEADER_SIZE + 1)
+                stats.resyncs += 1
+                stats.junk_bytes += resume - pos
+                pos = resume
+                continue
+
+            if transcode == SECURITY_TRANSCODE:
+                offsets.setdefault(message_length, []).append(pos)
+                stats.records += 1
+                stats.lengths[message_length] = stats.lengths.get(message_length, 0) + 1
+            else:
+                stats.skipped_records += 1
+            pos += message_length
+
+        if final and pos < end:
+            stats.junk_bytes += end - pos
+            pos = end
+    finally:
+        del raw
+
+    stats.total_bytes += pos
+    return offsets, pos
+
+
+class SecuritiesStreamDecoder:
+    """
+    Incremental Securities.dat decoder: `feed()` chunks as they arrive and
+    get back the securities completed so far; `close()` flushes the rest.
+    Only the unconsumed tail of the stream is buffered.
+    """
+
+    def __init__(self, converter: "SecuritiesConverter" = None, stats: ScanStats = None):
+        self.converter = converter or SecuritiesConverter()
+        self.stats = stats if stats is not None else ScanStats()
+        self._buffer = bytearray()
+        self._checked: set = set()
+
+    def _decode(self, final: bool):
+        buffer = bytes(self._buffer)
+        offsets, consumed = scan_records(buffer, self.stats, final=final)
+        securities = self.converter.decode_records(buffer, offsets, self._checked)
+        del self._buffer[:consumed]
+        return securities
+
+    def feed(self, chunk) -> list:
+        self._buffer += chunk
+        return self._decode(final=False)
+
+    def close(self) -> list:
+        return self._decode(final=True)
+
+
 class SecuritiesConverter:
     def __init__(self):
         # Different possible formats based on NSE versions
@@ -59,47 +309,96 @@ class SecuritiesConverter:
             
         return None
     
-    def extract_securities_dynamic(self, file_path):
-        """Extract securities with dynamic parsing"""
-        securities = []
-        
-        with open(file_path, 'rb') as f:
-            file_size = os.path.getsize(file_path)
-            
-            while f.tell() < file_size:
-                pos = f.tell()
-                try:
-                    # Read header
-                    header_data = f.read(8)
-                    if len(header_data) < 8:
-                        break
-                    
-                    transcode, timestamp, message_length = struct.unpack(self.header_format, header_data)
-                    
-                    if transcode == 7:  # Security information
-                        # Read the data portion
-                        data_size = message_length - 8
-                        data = f.read(data_size)
-                        
-                        if len(data) == data_size:
-                            security = self.parse_security_dynamic(data)
-                            if security:
-                                securities.append(security)
-                        else:
-                            break
-                    else:
-                        # Skip unknown records
-                        remaining = message_length - 8
-                        if remaining > 0:
-                            f.read(remaining)
-                
-                except Exception as e:
-                    # If we can't parse, try moving one byte forward
-                    f.seek(pos + 1)
+    def extract_securities_dynamic(self, file_path, stats: ScanStats = None):
+        """Extract securities with a single memory-mapped pass over the file"""
+        if os.path.getsize(file_path) == 0:
+            return []
+
+        with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return self.decode_securities(buffer, stats)
+
+    def decode_securities(self, buffer, stats: ScanStats = None):
+        """Decode all security information records in a Securities.dat buffer"""
+        offsets, _ = scan_records(buffer, stats)
+        return self.decode_records(buffer, offsets)
+
+    def decode_records(self, buffer, offsets, checked: set = None):
+        """
+        Decode the records found by `scan_records`, in file order, as rows
+        ready for cm_token_master (description columns included). v1.24
+        records of the same length are decoded in bulk with numpy.
+        `checked` holds the data lengths whose company name offset was
+        already checked, so a file decoded in pieces is checked once.
+        """
+        decoded = []
+        raw = np.frombuffer(buffer, dtype=np.uint8)
+        try:
+            for message_length, positions in offsets.items():
+                data_length = message_length - HEADER_SIZE
+                starts = np.asarray(positions, dtype=np.int64)
+
+                if data_length < V124_DATA_LENGTH:
+                    for pos in positions:
+                        security = self.parse_security_dynamic(bytes(buffer[pos + HEADER_SIZE:pos + message_length]))
+                        if security:
+                            decoded.append((pos, describe(security)))
                     continue
-        
-        return securities
-    
+
+                rows = raw[starts[:, None] + np.arange(HEADER_SIZE, message_length)]
+                decoded.extend(zip(positions, self._decode_v124_rows(rows, checked)))
+        finally:
+            del raw
+
+        decoded.sort(key=lambda item: item[0])
+        return [security for _, security in decoded]
+
+    def _decode_v124_rows(self, rows, checked: set = None):
+        """
+        Decode a (records, data_length) byte matrix of v1.24 records at the
+        fixed V124_FIELDS offsets in one vectorized pass.
+        """
+        data_length = rows.shape[1]
+        if checked is None or data_length not in checked:
+            self._check_company_name_offset(rows)
+            if checked is not None:
+                checked.add(data_length)
+        fields = np.ascontiguousarray(rows).view(v124_dtype(data_length)).reshape(-1)
+
+        tokens = fields['token_number'].tolist()
+        symbols = [value.decode('utf-8', errors='ignore').rstrip('\x00') for value in fields['symbol'].tolist()]
+        series = [value.decode('utf-8', errors='ignore').rstrip('\x00') for value in fields['series'].tolist()]
+        capital = fields['issued_capital'].tolist()
+        settlement = fields['settlement_cycle'].tolist()
+        permitted = fields['permitted_to_trade'].tolist()
+        names = [value.decode('utf-8', errors='ignore').rstrip('\x00') for value in fields['company_name'].tolist()]
+        settlement_desc = [SETTLEMENT_CYCLE_DESC.get(code, 'T+1') for code in settlement]
+        permitted_desc = [PERMITTED_TO_TRADE_DESC.get(code, 'Unknown') for code in permitted]
+
+        return [
+            {
+                'token_number': tokens[i],
+                'symbol': symbols[i],
+                'series': series[i],
+                'issued_capital': capital[i],
+                'settlement_cycle': settlement[i],
+                'company_name': names[i],
+                'permitted_to_trade': permitted[i],
+                'data_length': data_length,
+                'settlement_cycle_desc': settlement_desc[i],
+                'permitted_to_trade_desc': permitted_desc[i],
+            }
+            for i in range(len(tokens))
+        ]
+
+    def _check_company_name_offset(self, rows):
+        """Warn when the legacy company name search disagrees with COMPANY_NAME_OFFSET"""
+        found_at = calibrate_company_name_offset(rows)
+        if found_at is not None and found_at != COMPANY_NAME_OFFSET:
+            logger.warning(
+                f"⚠️ Company name search found offset {found_at} in {rows.shape[1]}-byte securities, "
+                f"expected {COMPANY_NAME_OFFSET}; decoding at {COMPANY_NAME_OFFSET}"
+            )
+
     def parse_security_dynamic(self, data):
         """Parse security data dynamically based on data length"""
         try:
@@ -113,7 +412,7 @@ class SecuritiesConverter:
             return None
     
     def parse_v124_format(self, data):
-        """Parse Version 1.24 format (113 bytes)"""
+        """Parse Version 1.24 format (113 bytes), one record at a time with the legacy company name search"""
         try:
             # Token Number (4) + Symbol (10) + Series (2) + Issued Capital (8)
             token_number = struct.unpack('<L', data[0:4])[0]
@@ -125,14 +424,7 @@ class SecuritiesConverter:
             settlement_cycle = struct.unpack('<H', data[24:26])[0] if len(data) >= 26 else 0
             
             # Company name (around position 50-75)
-            company_name = ""
-            for start_pos in range(40, min(80, len(data) - 25)):
-                try:
-                    name_candidate = data[start_pos:start_pos+25].decode('utf-8', errors='ignore').rstrip('\x00')
-                    if len(name_candidate) > len(company_name) and name_candidate.isprintable():
-                        company_name = name_candidate
-                except:
-                    continue
+            _, company_name = find_company_name(data)
             
             # Permitted to trade (last 2 bytes before end)
             permitted_to_trade = 1  # Default
@@ -196,81 +488,87 @@ class SecuritiesConverter:
             pass
         return None
     
-    def convert_to_csv(self, dat_file_path: str, csv_file_path: str) -> pd.DataFrame | None:
+    def extract_securities(self, file_path, stats: ScanStats = None):
         """
-        Convert Securities.dat → CSV, apply formatting, print stats.
-        Returns the DataFrame if successful, else None.
+        Decode Securities.dat into cm_token_master rows, falling back to
+        headerless parsing when no records are found.
         """
-        # 1) Analyze (optional, just prints out)
-        self.analyze_file_structure(dat_file_path)
-
-        # 2) Extract
-        securities = self.extract_securities_dynamic(dat_file_path)
+        securities = self.extract_securities_dynamic(file_path, stats)
         if not securities:
-            securities = self.try_alternative_parsing(dat_file_path)
+            securities = [describe(security) for security in self.try_alternative_parsing(file_path)]
+        return securities
+
+    def write_csv(self, securities, csv_file_path: str) -> None:
+        """Write decoded securities to CSV, sorted by token number"""
+        with open(csv_file_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(sorted(securities, key=lambda security: security['token_number']))
+
+    def convert_to_csv(self, dat_file_path: str, csv_file_path: str) -> list | None:
+        """
+        Convert Securities.dat → CSV, print stats.
+        Returns the decoded securities if successful, else None.
+        """
+        # 1) Extract in a single pass (analyze_file_structure is still available for diagnostics)
+        stats = ScanStats()
+        securities = self.extract_securities(dat_file_path, stats)
+        print(f"📊 Securities scan: {stats.to_dict()}")
 
         if not securities:
             print("❌ No securities parsed.")
             return None
 
-        # 3) Build DataFrame + add desc columns
-        df = pd.DataFrame(securities)
-        df['settlement_cycle_desc'] = df['settlement_cycle'].map({
-            0: 'T+0', 1: 'T+1'
-        }).fillna('Unknown')
-        df['permitted_to_trade_desc'] = df['permitted_to_trade'].map({
-            0: 'Listed but not permitted to trade',
-            1: 'Permitted to trade',
-            2: 'BSE listed (BSE exclusive security)',
-        }).fillna('Unknown')
-
-        # 4) Sort & write
-        df = df.sort_values('token_number')
-        df.to_csv(csv_file_path, index=False)
-
-        # 5) Print sample & stats
-        print(f"✅ Converted {len(df)} records → {csv_file_path}")
-        print(df[['token_number','symbol','series','company_name']].head(5))
-        print(f"Total records: {len(df)} | Unique symbols: {df['symbol'].nunique()}")
-        print(f"Data lengths seen: {sorted(df['data_length'].unique())}")
-
-        return df
+        # 2) Sort & write
+        self.write_csv(securities, csv_file_path)
+
+        # 3) Print sample & stats
+        print(f"✅ Converted {len(securities)} records → {csv_file_path}")
+        for security in sorted(securities, key=lambda security: security['token_number'])[:5]:
+            print(f"{security['token_number']:>8} {security['symbol']:<10} {security['series']:<2} {security['company_name']}")
+        print(f"Total records: {len(securities)} | Unique symbols: {len({security['symbol'] for security in securities})}")
+        print(f"Data lengths seen: {sorted({security['data_length'] for security in securities})}")
+
+        return securities
+
     def try_alternative_parsing(self, file_path):
         """Try parsing without header structure"""
+        with open(file_path, 'rb') as f:
+            return self.parse_without_headers(f.read())
+
+    def parse_without_headers(self, data):
+        """Scan raw Securities.dat bytes for token + symbol patterns"""
         securities = []
         
-        with open(file_path, 'rb') as f:
-            data = f.read()
-            
-            # Try to find token patterns (assuming 4-byte integers)
-            for i in range(0, len(data) - 20, 4):
-                try:
-                    token = struct.unpack('<L', data[i:i+4])[0]
+        # Try to find token patterns (assuming 4-byte integers)
+        for i in range(0, len(data) - 20, 4):
+            try:
+                token = struct.unpack('<L', data[i:i+4])[0]
+                
+                # Valid token numbers are usually reasonable integers
+                if 1 <= token <= 1000000:
+                    # Try to extract symbol
+                    symbol_data = data[i+4:i+14]
+                    symbol = symbol_data.decode('utf-8', errors='ignore').rstrip('\x00')
                     
-                    # Valid token numbers are usually reasonable integers
-                    if 1 <= token <= 1000000:
-                        # Try to extract symbol
-                        symbol_data = data[i+4:i+14]
-                        symbol = symbol_data.decode('utf-8', errors='ignore').rstrip('\x00')
+                    # Check if symbol looks valid (alphabetic characters)
+                    if symbol and len(symbol) >= 2 and symbol.replace('$', '').isalnum():
+                        series_data = data[i+14:i+16]
+                        series = series_data.decode('utf-8', errors='ignore').rstrip('\x00')
                         
-                        # Check if symbol looks valid (alphabetic characters)
-                        if symbol and len(symbol) >= 2 and symbol.replace('$', '').isalnum():
-                            series_data = data[i+14:i+16]
-                            series = series_data.decode('utf-8', errors='ignore').rstrip('\x00')
-                            
-                            securities.append({
-                                'token_number': token,
-                                'symbol': symbol,
-                                'series': series,
-                                'issued_capital': 0,
-                                'settlement_cycle': 0,
-                                'company_name': '',
-                                'permitted_to_trade': 1,
-                                'data_length': 0
-                            })
-                except:
-                    continue
-        
+                        securities.append({
+                            'token_number': token,
+                            'symbol': symbol,
+                            'series': series,
+                            'issued_capital': 0,
+                            'settlement_cycle': 0,
+                            'company_name': '',
+                            'permitted_to_trade': 1,
+                            'data_length': 0
+                        })
+            except:
+                continue
+    
         # Remove duplicates
         seen = set()
         unique_securities = []